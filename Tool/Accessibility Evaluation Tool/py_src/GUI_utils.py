@@ -1,17 +1,35 @@
+import copy
+import hashlib
 import logging
+import os
 import re
+import threading
 import traceback
 from collections import defaultdict, Counter
+from io import BytesIO
 from pathlib import Path
 from typing import Callable, List, Union, Tuple, Dict
 import json
+from cachetools import LRUCache
 from lxml import etree
 import xml.etree.ElementTree  # BlindSimmer
 
+from ad_detection_utils import AdRulePack, get_default_ad_rule_pack
+from consts import PARSED_LAYOUT_CACHE_SIZE
+import geometry_utils
+from fingerprint_utils import FingerprintConfig, FINGERPRINT_ATTRIBUTES, compute_node_fingerprint, \
+    compute_merkle_hash, compute_state_fingerprint
 from json_util import JSONSerializable
 
 logger = logging.getLogger(__name__)
 
+BRACKET_BOUNDS_PATTERN = re.compile(r"\[-?\d+,-?\d+]\[-?\d+,-?\d+]")
+SPACED_BOUNDS_PATTERN = re.compile(r"-?\d+\s-?\d+\s-?\d+\s-?\d")
+XPATH_INDEX_PATTERN = re.compile(r'\[\d+\]')
+# The attributes of Node which are not included in its JSON
+NON_SERIALIZABLE_ATTRIBUTES = ['xml_element', 'parent_node', 'children_nodes', 'visible_descendant_count'] + \
+                              FINGERPRINT_ATTRIBUTES
+
 
 def bounds_included(bounds_parent: Tuple[int, int, int, int], bounds_child: Tuple[int, int, int, int]):
     return bounds_child[2] <= bounds_parent[2] and \
@@ -34,6 +52,110 @@ def calculate_overlap(bounds: Tuple[int, int, int, int],
     return None
 
 
+def simplify_xpath(xpath: str) -> str:
+    """
+    Removes the indices of an xpath, e.g., '/A/B[2]/C[1]' -> '/A/B/C'
+    """
+    return XPATH_INDEX_PATTERN.sub('', xpath)
+
+
+def longest_subsequence_substring(string_1: str, string_2: str) -> int:
+    """
+    The length of the longest subsequence of `string_1` which is a substring of `string_2`. Only the previous row
+    of the dynamic programming table is kept, so it takes O(len(string_1) * len(string_2)) time and
+    O(len(string_1)) memory.
+    """
+    n = len(string_1)
+    previous_row = [0] * (n + 1)
+    result = 0
+    for char_2 in string_2:
+        row = [0] * (n + 1)
+        for j in range(1, n + 1):
+            row[j] = previous_row[j - 1] + 1 if string_1[j - 1] == char_2 else row[j - 1]
+        result = max(result, row[n])
+        previous_row = row
+    return result
+
+
+class RectangleIndex:
+    """
+    A uniform-grid index over rectangles (left, top, right, bottom). Each rectangle is registered in every cell it
+    touches, so a query only checks the rectangles registered in the cells of the query rectangle. Rectangles
+    spanning too many cells are kept in a separate list which is always checked. The queries have the same
+    semantics as `bounds_included` and `calculate_overlap`.
+    """
+    MAX_CELLS_PER_RECTANGLE = 256
+
+    def __init__(self, rectangles: List[Tuple[int, int, int, int]] = None, cell_size: int = 128):
+        self.cell_size = cell_size
+        self.rectangles = []
+        self.cells = defaultdict(list)
+        self.large_rectangle_ids = []
+        self._rectangle_set = set()
+        for rectangle in rectangles if rectangles is not None else []:
+            self.add(rectangle)
+
+    def __len__(self):
+        return len(self.rectangles)
+
+    def _cell_ranges(self, bounds: Tuple[int, int, int, int]) -> Tuple[range, range]:
+        return range(bounds[0] // self.cell_size, bounds[2] // self.cell_size + 1), \
+               range(bounds[1] // self.cell_size, bounds[3] // self.cell_size + 1)
+
+    def add(self, bounds: Tuple[int, int, int, int]) -> None:
+        """
+        Adds a rectangle to the index. A rectangle which is already in the index is ignored, since it does not
+        change the result of any query.
+        """
+        bounds = tuple(bounds)
+        if bounds in self._rectangle_set:
+            return
+        self._rectangle_set.add(bounds)
+        rectangle_id = len(self.rectangles)
+        self.rectangles.append(bounds)
+        x_range, y_range = self._cell_ranges(bounds)
+        if len(x_range) * len(y_range) > self.MAX_CELLS_PER_RECTANGLE:
+            self.large_rectangle_ids.append(rectangle_id)
+            return
+        for x in x_range:
+            for y in y_range:
+                self.cells[(x, y)].append(rectangle_id)
+
+    def covers(self, bounds: Tuple[int, int, int, int]) -> bool:
+        """
+        Returns True if a rectangle in the index includes `bounds`. Such a rectangle includes the top-left corner
+        of `bounds`, so only the cell of that corner is checked.
+        """
+        cell = (bounds[0] // self.cell_size, bounds[1] // self.cell_size)
+        for rectangle_id in self.cells.get(cell, []):
+            if bounds_included(self.rectangles[rectangle_id], bounds):
+                return True
+        for rectangle_id in self.large_rectangle_ids:
+            if bounds_included(self.rectangles[rectangle_id], bounds):
+                return True
+        return False
+
+    def overlaps(self, bounds: Tuple[int, int, int, int]) -> List[Tuple[int, int, int, int]]:
+        """
+        Returns the overlaps of `bounds` with the rectangles in the index, in the order the rectangles are added
+        """
+        x_range, y_range = self._cell_ranges(bounds)
+        if len(x_range) * len(y_range) > len(self.cells):
+            candidate_ids = range(len(self.rectangles))
+        else:
+            candidate_ids = set(self.large_rectangle_ids)
+            for x in x_range:
+                for y in y_range:
+                    candidate_ids.update(self.cells.get((x, y), []))
+            candidate_ids = sorted(candidate_ids)
+        overlaps = []
+        for rectangle_id in candidate_ids:
+            overlap_bounds = calculate_overlap(self.rectangles[rectangle_id], bounds)
+            if overlap_bounds:
+                overlaps.append(overlap_bounds)
+        return overlaps
+
+
 class Node(JSONSerializable):
     @staticmethod
     def createNodeFromDict(attributes: dict) -> 'Node':
@@ -43,12 +165,81 @@ class Node(JSONSerializable):
 
     @staticmethod
     def createNodeFromXmlElement(element: Union[xml.etree.ElementTree.Element, etree.Element]) -> 'Node':
+        """
+        Creates a Node from the attributes of an XML element. It produces the same Node as `Node(**element.attrib)`,
+        but it skips the generic parsing in the constructor, since XML attribute values are always strings.
+        It's called for every element of every parsed layout.
+        """
         if element is None:
             return Node()
-        node = Node(**element.attrib)
-        node.xml_element = element
+        get = dict(element.items()).get
+        node = Node.__new__(Node)
+        attrs = node.__dict__
+        index = get('index')
+        attrs['index'] = -1 if index is None else int(index)
+        attrs['class_name'] = get('class', get('class_name', ""))
+        for attr_name, xml_names in Node._XML_STRING_ATTRIBUTES:
+            value = get(xml_names[0], get(xml_names[-1], ""))
+            attrs[attr_name] = '' if value == 'null' else value
+        for attr_name, xml_names, default in Node._XML_BOOLEAN_ATTRIBUTES:
+            value = get(xml_names[0], get(xml_names[-1]))
+            attrs[attr_name] = default if value is None else value == 'true'
+        bounds = get('bounds')
+        attrs['bounds'] = (0, 0, 0, 0) if bounds is None else Node._parse_bounds(bounds)
+        drawing_order = get('drawingOrder', get('drawing_order'))
+        attrs['drawing_order'] = -1 if drawing_order is None else int(drawing_order)
+        a11y_actions = get('actionList', get('a11y_actions'))
+        attrs['a11y_actions'] = [] if a11y_actions is None or len(a11y_actions.strip()) == 0 \
+            else [int(x) for x in a11y_actions.split("-")]
+        pkg_name = get('package', get('pkg_name', ""))
+        attrs['pkg_name'] = '' if pkg_name == 'null' else pkg_name
+        xpath = get('xpath', "")
+        attrs['xpath'] = xpath[len("/hierarchy"):] if xpath.startswith("/hierarchy") else xpath
+        attrs['located_by'] = 'xpath'
+        attrs['skip'] = False
+        attrs['action'] = 'click'
+        attrs['xml_element'] = element
+        attrs['parent_node'] = None
+        attrs['children_nodes'] = []
+        live_region = get('live-region', get('live_region', ''))
+        attrs['live_region'] = Node._LIVE_REGIONS.get(live_region, live_region)
+        attrs['covered'] = False
+        attrs['is_ad'] = False
+        attrs['fingerprint_key'] = None
+        attrs['fingerprint'] = None
+        attrs['merkle_hash'] = None
+        attrs['visible_descendant_count'] = None
         return node
 
+    # (attribute name, (XML names in order of priority)) for the attributes that are read by createNodeFromXmlElement
+    _XML_STRING_ATTRIBUTES = [('text', ('text',)),
+                              ('resource_id', ('resource-id', 'resource_id')),
+                              ('content_desc', ('content-desc', 'content_desc'))]
+    _XML_BOOLEAN_ATTRIBUTES = [('visible', ('visible',), True),
+                               ('clickable', ('clickable',), False),
+                               ('long_clickable', ('long-clickable', 'long_clickable'), False),
+                               ('checkable', ('checkable',), False),
+                               ('checked', ('checked',), False),
+                               ('enabled', ('enabled',), False),
+                               ('focusable', ('focusable',), False),
+                               ('focused', ('focused',), False),
+                               ('invalid', ('invalid',), False),
+                               ('clickable_span', ('clickableSpan', 'clickable_span'), False),
+                               ('context_clickable', ('contextClickable', 'context_clickable'), False),
+                               ('naf', ('NAF', 'naf'), False),
+                               ('important_for_accessibility',
+                                ('importantForAccessibility', 'important_for_accessibility'), False)]
+    _LIVE_REGIONS = {'0': 'NONE', '1': 'POLITE', '2': 'ASSERTIVE'}
+
+    @staticmethod
+    def _parse_bounds(bounds: str) -> Tuple[int, int, int, int]:
+        bounds = bounds.strip()
+        if BRACKET_BOUNDS_PATTERN.search(bounds):
+            return tuple([int(x) for x in bounds.replace("][", ",")[1:-1].split(",")])
+        elif SPACED_BOUNDS_PATTERN.search(bounds):
+            return tuple([int(x) for x in bounds.split()])
+        raise Exception(f"Problem with bounds! {bounds}")
+
     def __init__(self,
                  index: Union[int, str] = -1,
                  text: str = "",
@@ -125,13 +316,7 @@ class Node(JSONSerializable):
         if isinstance(important_for_accessibility, str):
             important_for_accessibility = important_for_accessibility == 'true'
         if isinstance(bounds, str):
-            bounds = bounds.strip()
-            if re.search(r"\[-?\d+,-?\d+]\[-?\d+,-?\d+]", bounds):
-                bounds = tuple([int(x) for x in bounds.replace("][", ",")[1:-1].split(",")])
-            elif re.search(r"-?\d+\s-?\d+\s-?\d+\s-?\d", bounds):
-                bounds = tuple([int(x) for x in bounds.split()])
-            else:
-                raise Exception(f"Problem with bounds! {bounds}")
+            bounds = Node._parse_bounds(bounds)
 
         if isinstance(drawing_order, str):
             drawing_order = int(drawing_order)
@@ -177,6 +362,10 @@ class Node(JSONSerializable):
         self.live_region = live_region
         self.covered = False
         self.is_ad = False
+        self.fingerprint_key = None
+        self.fingerprint = None
+        self.merkle_hash = None
+        self.visible_descendant_count = None  # The number of visible XML nodes in the subtree, set by NodesFactory
 
 
     def is_none(self) -> bool:
@@ -193,8 +382,10 @@ class Node(JSONSerializable):
     def is_practically_invisible(self):
         if self.covered or not self.visible or not self.is_valid_bounds():
             return True
-        if self.xml_element is not None:
-            if "Layout" in self.class_name or "ViewGroup" in self.class_name:
+        if "Layout" in self.class_name or "ViewGroup" in self.class_name:
+            if self.visible_descendant_count is not None:
+                return self.visible_descendant_count == 0
+            if self.xml_element is not None:
                 return len(self.xml_element.findall('.//node[@visible="true"]')) == 0
         return False
 
@@ -219,6 +410,29 @@ class Node(JSONSerializable):
                 (max_y < self.bounds[1] or self.bounds[1] < min_y) or
                 (max_y < self.bounds[3] or self.bounds[3] < min_y))
 
+    @staticmethod
+    def get_areas(nodes: List['Node']) -> List[int]:
+        """
+        The areas of the nodes (or a NodeTable), computed in batch by geometry_utils
+        """
+        return geometry_utils.areas(geometry_utils.to_bounds_array(nodes)).tolist()
+
+    @staticmethod
+    def get_out_of_bounds_list(nodes: List['Node'], screen_bounds: Tuple[int, int, int, int]) -> List[bool]:
+        """
+        The `is_out_of_bounds` of the nodes (or a NodeTable), computed in batch by geometry_utils
+        """
+        return geometry_utils.out_of_bounds_mask(geometry_utils.to_bounds_array(nodes), screen_bounds).tolist()
+
+    @staticmethod
+    def get_normalized_bounds_list(nodes: List['Node'],
+                                   screen_bounds: Tuple[int, int, int, int]) -> List[Tuple[float, float, float, float]]:
+        """
+        The `get_normalized_bounds` of the nodes (or a NodeTable), computed in batch by geometry_utils
+        """
+        normalized_bounds = geometry_utils.normalized_bounds(geometry_utils.to_bounds_array(nodes), screen_bounds)
+        return [tuple(x) for x in normalized_bounds.tolist()]
+
     def potentially_data(self):
         return self.text or \
                self.content_desc
@@ -261,27 +475,101 @@ class Node(JSONSerializable):
             return False
         if self.xpath == other.xpath:
             return True
-        xpath_num_re_pattern = r'\[\d+\]'
-        self_simple_xpath  = re.sub(xpath_num_re_pattern, '', self.xpath)
-        other_simple_xpath  = re.sub(xpath_num_re_pattern, '', other.xpath)
-        return self_simple_xpath == other_simple_xpath and self.resource_id == other.resource_id
+        return simplify_xpath(self.xpath) == simplify_xpath(other.xpath) and self.resource_id == other.resource_id
 
     def toJSONStr(self, excluded_attributes: List[str] = None) -> str:
         if excluded_attributes is None:
             excluded_attributes = []
-        excluded_attributes.extend(['xml_element', 'parent_node', 'children_nodes'])
+        excluded_attributes.extend(NON_SERIALIZABLE_ATTRIBUTES)
         return super().toJSONStr(excluded_attributes)
 
     def toJSON(self, excluded_attributes: List[str] = None) -> dict:
         if excluded_attributes is None:
             excluded_attributes = []
-        excluded_attributes.extend(['xml_element', 'parent_node', 'children_nodes'])
+        excluded_attributes.extend(NON_SERIALIZABLE_ATTRIBUTES)
         return super().toJSON(excluded_attributes)
 
     def __str__(self):
         return self.toJSONStr(excluded_attributes=['xpath'])
 
 
+class ParsedLayoutCache:
+    """
+    A process-wide, size-bounded LRU cache of the Nodes built by NodesFactory. The entries are keyed by the hash
+    of the layout's content and the keys of the factory's passes, so the same layout read from a string or a
+    file shares the entry. For layout files, the content hash is remembered per (path, mtime, size), so an
+    unchanged file is neither read nor hashed again.
+    NodesFactory returns copies of the cached Nodes (see `copy_nodes`), unless the caller only reads them
+    (see `NodesFactory.with_cache`).
+    """
+
+    def __init__(self, max_size: int = PARSED_LAYOUT_CACHE_SIZE):
+        # The size of an entry is the number of its nodes
+        self.entries = LRUCache(maxsize=max_size, getsizeof=lambda nodes: max(len(nodes), 1))
+        self.path_hashes = LRUCache(maxsize=4096)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def hash_layout(layout: str) -> str:
+        return hashlib.blake2b(layout.encode('utf-8'), digest_size=16).hexdigest()
+
+    def get_path_hash(self, path_key: Tuple[str, int, int]) -> Union[str, None]:
+        with self._lock:
+            return self.path_hashes.get(path_key, None)
+
+    def set_path_hash(self, path_key: Tuple[str, int, int], content_hash: str) -> None:
+        with self._lock:
+            self.path_hashes[path_key] = content_hash
+
+    def get(self, key: Tuple) -> Union[List['Node'], None]:
+        with self._lock:
+            nodes = self.entries.get(key, None)
+            if nodes is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return nodes
+
+    def put(self, key: Tuple, nodes: List['Node']) -> None:
+        with self._lock:
+            if len(nodes) <= self.entries.maxsize:
+                self.entries[key] = nodes
+
+    def clear(self) -> None:
+        with self._lock:
+            self.entries.clear()
+            self.path_hashes.clear()
+
+
+def copy_nodes(nodes: List['Node']) -> List['Node']:
+    """
+    Copies the nodes of a layout (in document order) with their XML tree, so the copies can be modified without
+    changing the original nodes. The parents and children among the given nodes are linked to the copies.
+    """
+    copies = {id(node): copy.copy(node) for node in nodes}
+    element_map = {}
+    for node in nodes:
+        if node.xml_element is not None and node.xml_element not in element_map:
+            root = node.xml_element.getroottree().getroot()
+            element_map.update(zip(root.iter(), copy.deepcopy(root).iter()))
+    for node_copy in copies.values():
+        node_copy.parent_node = copies.get(id(node_copy.parent_node), node_copy.parent_node)
+        node_copy.children_nodes = [copies.get(id(x), x) for x in node_copy.children_nodes]
+        node_copy.a11y_actions = list(node_copy.a11y_actions)
+        if node_copy.xml_element is not None:
+            node_copy.xml_element = element_map[node_copy.xml_element]
+    return [copies[id(node)] for node in nodes]
+
+
+_parsed_layout_cache = ParsedLayoutCache()
+
+
+def get_parsed_layout_cache() -> ParsedLayoutCache:
+    return _parsed_layout_cache
+
+
 class NodesFactory:
     """
         A factory class which inputs XML layout (either by file or string), then traverse the tree
@@ -289,78 +577,83 @@ class NodesFactory:
         passes to augment more information into Nodes. Each pass input the current visiting Node, its
         extra attribute (a dictionary to contain exclusive information for passes), the children, and
         a map from each child node to its extra attribute.
+        Bottom-up passes are run after the (top-down) passes, they input the visiting Node and its children
+        whose bottom-up passes are already done.
+        Each `with_*` pass method adds a key to `pass_keys`, which identifies the built Nodes in the
+        parsed-layout cache (see `with_cache`).
     """
 
     def __init__(self):
         self.layout = None
+        self.layout_path_key = None
         self.passes = []
+        self.bottom_up_passes = []
+        self.pass_keys = []
+        self.cache = None
+        self.shared_cache = False
 
     def with_layout(self, layout: str) -> 'NodesFactory':
         self.layout = layout
+        self.layout_path_key = None
         return self
 
     def with_layout_path(self, layout_path: Union[str, Path]) -> 'NodesFactory':
-        with open(layout_path, "r") as f:
-            self.layout = f.read()
+        """
+        The layout file is read when the Nodes are built, unless they are already in the cache
+        """
+        stat = os.stat(layout_path)  # Raises an error if the file does not exist
+        self.layout = None
+        self.layout_path_key = (os.path.abspath(layout_path), stat.st_mtime_ns, stat.st_size)
+        return self
+
+    def with_cache(self, cache: ParsedLayoutCache = None, shared: bool = False) -> 'NodesFactory':
+        """
+        Reuses the Nodes built from the same layout with the same passes, by default from the process-wide
+        cache. The cached Nodes are copied (see `copy_nodes`), so the returned Nodes can be modified.
+
+        :param shared: If True, the cached Nodes themselves are returned without copying them, the caller should
+                       not modify them (or their XML elements)
+        """
+        self.cache = cache if cache is not None else get_parsed_layout_cache()
+        self.shared_cache = shared
         return self
 
     def with_xpath_pass(self) -> 'NodesFactory':
         """
-        Creates xpath attribute for Nodes
+        Creates xpath attribute for Nodes. The xpaths are looked up in the `XPathIndex` of the layout's XML tree.
         """
+        prefix = self.with_xpath_pass.__name__
+        xpath_index_attr = f"{prefix}_xpath_index"
 
         def create_xpath(node: Node,
                          extra: Dict,
                          children_nodes: List[Node],
                          child_to_extras_map: Dict[Node, Dict]) -> None:
-            total_class_count = Counter([x.class_name for x in children_nodes])
-            class_counter = defaultdict(int)
+            xpath_index = extra.get(xpath_index_attr, None)
+            if xpath_index is None:
+                xpath_index = XPathIndex.of(node.xml_element)
             for child_node in children_nodes:
-                class_counter[child_node.class_name] += 1
-                if class_counter[child_node.class_name] == 1 and total_class_count[child_node.class_name] == 1:
-                    child_node.xpath = "{}/{}".format(node.xpath,
-                                                      child_node.class_name)
-                else:
-                    child_node.xpath = "{}/{}[{}]".format(node.xpath,
-                                                          child_node.class_name,
-                                                          class_counter[child_node.class_name])
+                child_node.xpath = xpath_index.get_xpath(child_node.xml_element)
+                child_to_extras_map[child_node][xpath_index_attr] = xpath_index
 
         self.passes.append(create_xpath)
+        self.pass_keys.append('xpath')
         return self
 
-    def with_ad_detection(self) -> 'NodesFactory':
+    def with_ad_detection(self, rule_pack: AdRulePack = None) -> 'NodesFactory':
         """
         Detecting Ad Nodes through Android Resource IDs. If the parent node is identified as an ad element,
-        all of its child nodes are considered as ad elements as well.
+        all of its child nodes are considered as ad elements as well. The resource ids are checked by
+        the rule pack, by default the shared one with the default rules and the rules in `AD_RULES_PATH`.
         """
+        if rule_pack is None:
+            rule_pack = get_default_ad_rule_pack()
 
         def detect_ad(node: Node,
                       extra: Dict,
                       children_nodes: List[Node],
                       child_to_extras_map: Dict[Node, Dict]) -> None:
-            resource_id = node.resource_id
-            remaining = "" if len(resource_id.split("/")) < 1 else "/".join(resource_id.split("/")[1:])
-            if (resource_id.endswith("_ad") \
-                    or resource_id.endswith("_ads") \
-                    or resource_id.lower() == 'ad' \
-                    or resource_id.lower() == 'abgc'\
-                    or resource_id.lower() == 'cbb' \
-                    or 'fbAd' in resource_id \
-                    or 'ad-container' in resource_id \
-                    or "mrec" in resource_id.lower() \
-                    or "native" in resource_id.lower()\
-                    or '_ad_' in resource_id.lower() \
-                    or '_ad' in resource_id.lower() \
-                    or 'ad_' in resource_id.lower() \
-                    or '_ads_' in resource_id.lower() \
-                    or '_ads' in resource_id.lower()\
-                    or 'ads_' in resource_id.lower()\
-                    or 'banner' in resource_id.lower()\
-                    or 'Ad frame' in resource_id   \
-                    or resource_id.endswith("Ads") \
-                    or remaining.startswith('ad_') \
-                    or 'af' in resource_id.lower() \
-                    or remaining.startswith('ads')) and 'add' not in resource_id.lower():
+            if rule_pack.is_ad_resource_id(node.resource_id):
                 node.is_ad = True
             if not node.is_ad and node.class_name == "android.widget.FrameLayout":
                 flag = False
@@ -374,6 +667,7 @@ class NodesFactory:
                 for child_node in children_nodes:
                     child_node.is_ad = True
         self.passes.append(detect_ad)
+        self.pass_keys.append(('ad', rule_pack))
         return self
 
     def with_covered_pass(self) -> 'NodesFactory':
@@ -394,7 +688,8 @@ class NodesFactory:
             covered bounds of the descendents of the visiting node. If a child node is completely covered by either
             the existing covered bounds (passed from the visiting node) or the new cover bounds (drawn by
             prior siblings), its `covered` attribute becomes true. A covered node pass the covered attribute to its
-            children unless they are practically invisible.
+            children unless they are practically invisible. The covered bounds are kept in a RectangleIndex, so
+            each child is only checked against the covered bounds near it.
 
             :param node: The visiting node
             :param extra: The extra attributes of the visiting node
@@ -409,86 +704,178 @@ class NodesFactory:
                     if not child_node.is_practically_invisible():
                         child_node.covered = True
             else:
-                covered_bounds_so_far = list(extra.get(covered_bounds_list_attr, []))
+                covered_bounds_so_far = RectangleIndex(extra.get(covered_bounds_list_attr, []))
                 for child_node in sorted(children_nodes, key=lambda x: -x.drawing_order):
                     if child_node.is_practically_invisible():
                         continue
-                    for covered_bounds in covered_bounds_so_far:
-                        if bounds_included(covered_bounds, child_node.bounds):
-                            child_node.covered = True
-                            break
-                        else:
-                            overlap_bounds = calculate_overlap(covered_bounds, child_node.bounds)
-                            if overlap_bounds:
-                                child_to_extras_map[child_node][covered_bounds_list_attr].append(overlap_bounds)
-                    if not child_node.covered:
-                        covered_bounds_so_far.append(child_node.bounds)
+                    if covered_bounds_so_far.covers(child_node.bounds):
+                        child_node.covered = True
+                        continue
+                    child_to_extras_map[child_node][covered_bounds_list_attr] = \
+                        covered_bounds_so_far.overlaps(child_node.bounds)
+                    covered_bounds_so_far.add(child_node.bounds)
 
         self.passes.append(calculate_covered)
+        self.pass_keys.append('covered')
+        return self
+
+    def with_fingerprint_pass(self, config: FingerprintConfig = None) -> 'NodesFactory':
+        """
+        Computes the fingerprint (the hash of the attributes) and the merkle hash (the hash of the fingerprints
+        in the subtree) of Nodes. The default configuration is the same as `is_in_same_state_with_nodes`
+        without extra excluded attributes or package. Since it depends on `is_ad`, it should be
+        added after ad detection.
+        """
+        if config is None:
+            config = FingerprintConfig.for_state_comparison()
+
+        def calculate_fingerprint(node: Node, children_nodes: List[Node]) -> None:
+            node.fingerprint_key = config.key()
+            node.fingerprint = compute_node_fingerprint(node, config)
+            node.merkle_hash = compute_merkle_hash(node.fingerprint, [child.merkle_hash for child in children_nodes])
+
+        self.bottom_up_passes.append(calculate_fingerprint)
+        self.pass_keys.append(('fingerprint', config.key()))
         return self
 
     def build(self) -> List[Node]:
+        """
+        Creates the Nodes of the layout in a single streaming pass over the XML (see `stream_nodes`), then runs
+        the passes top-down in document order. Each node's passes are run after its ancestors' passes and
+        before its children's, which is the same order as a recursive traversal would produce. Finally,
+        the bottom-up passes are run in the reverse order.
+        If the factory has a cache, the Nodes are looked up in it first, and stored in it after they're built.
+        """
+        cache_key = None
+        if self.cache is not None:
+            cache_key = (self.get_layout_hash(), tuple(self.pass_keys))
+            cached_nodes = self.cache.get(cache_key)
+            if cached_nodes is not None:
+                return list(cached_nodes) if self.shared_cache else copy_nodes(cached_nodes)
+        if self.layout is None and self.layout_path_key is not None:
+            self.layout = self.read_layout()
         if not self.layout:
             return []
 
-        def dfs(node: Node, extra: Dict) -> List[Node]:
-            nodes = [node]
-            children_xml_elements = node.xml_element.findall("node")
-            children_nodes = [Node.createNodeFromXmlElement(child_element) for child_element in children_xml_elements]
-            child_to_extra_map = defaultdict(dict)
-            for t_pass in self.passes:
-                t_pass(node, extra, children_nodes, child_to_extra_map)
-            for child_node in children_nodes:
-                child_node.parent_node = node
-                node.children_nodes.append(child_node)
-                nodes.extend(dfs(child_node, child_to_extra_map[child_node]))
-            return nodes
-
         try:
-            layout_utf8 = self.layout.encode('utf-8')
-            parser = etree.XMLParser(ns_clean=True, recover=True, encoding='utf-8')
-            dummy_root_xml = etree.fromstring(layout_utf8, parser)
-            dummy_root_node = Node.createNodeFromXmlElement(dummy_root_xml)
-            dummy_root_node.xpath = f""
-            return dfs(dummy_root_node, {})[1:]
+            nodes = self.stream_nodes()
+            pending_extras = {}
+            for node in nodes:
+                extra = pending_extras.pop(node, {})
+                child_to_extra_map = defaultdict(dict)
+                for t_pass in self.passes:
+                    t_pass(node, extra, node.children_nodes, child_to_extra_map)
+                for child_node in node.children_nodes:
+                    pending_extras[child_node] = child_to_extra_map[child_node]
+            if self.bottom_up_passes:
+                for node in reversed(nodes):
+                    for t_pass in self.bottom_up_passes:
+                        t_pass(node, node.children_nodes)
+            if cache_key is not None:
+                self.cache.put(cache_key, nodes[1:] if self.shared_cache else copy_nodes(nodes[1:]))
+            return nodes[1:]
         except Exception as e:
             tb = traceback.format_exc()
             logger.error(f"Exception in building Nodes from Layout: {e} {tb}")
         return []
 
+    def read_layout(self) -> str:
+        with open(self.layout_path_key[0], "r") as f:
+            return f.read()
+
+    def get_layout_hash(self) -> str:
+        """
+        The content hash of the layout. For layout files, the hash is reused if the file has not changed.
+        """
+        if self.layout is None and self.layout_path_key is not None:
+            content_hash = self.cache.get_path_hash(self.layout_path_key) if self.cache is not None else None
+            if content_hash is not None:
+                return content_hash
+            self.layout = self.read_layout()
+            content_hash = ParsedLayoutCache.hash_layout(self.layout)
+            if self.cache is not None:
+                self.cache.set_path_hash(self.layout_path_key, content_hash)
+            return content_hash
+        return ParsedLayoutCache.hash_layout(self.layout if self.layout is not None else "")
+
+    def stream_nodes(self) -> List[Node]:
+        """
+        Parses the layout incrementally and creates a Node for the root element and for each `node` element
+        whose parent is also included. Only the open elements are kept in a stack, so no recursion is needed
+        regardless of the layout's depth. When an element is closed, the number of its visible descendants
+        is known and it's stored in `visible_descendant_count` (used by `is_practically_invisible`).
+
+        :return: The list of nodes in document order (pre-order), starting with the root (dummy) node whose
+                 xpath is empty. The parent and children of each node are linked.
+        """
+        nodes = []
+        open_nodes = []  # One entry per open XML element, None for the excluded ones
+        open_visible_counts = []  # The number of visible `node` descendants of each open XML element
+        events = etree.iterparse(BytesIO(self.layout.encode('utf-8')),
+                                 events=('start', 'end'),
+                                 recover=True,
+                                 encoding='utf-8')
+        for event, element in events:
+            if event == 'end':
+                node = open_nodes.pop()
+                visible_count = open_visible_counts.pop()
+                if node is not None:
+                    node.visible_descendant_count = visible_count
+                if len(open_visible_counts) > 0:
+                    if element.tag == "node" and element.get('visible') == "true":
+                        visible_count += 1
+                    open_visible_counts[-1] += visible_count
+                continue
+            if len(open_nodes) == 0:
+                node = Node.createNodeFromXmlElement(element)
+                node.xpath = ""
+            elif open_nodes[-1] is not None and element.tag == "node":
+                node = Node.createNodeFromXmlElement(element)
+                node.parent_node = open_nodes[-1]
+                node.parent_node.children_nodes.append(node)
+            else:
+                node = None
+            if node is not None:
+                nodes.append(node)
+            open_nodes.append(node)
+            open_visible_counts.append(0)
+        if len(nodes) == 0:
+            raise Exception("The layout does not have any element")
+        return nodes
+
 
 def is_in_same_state_with_nodes(nodes1: List[Node], nodes2: List[Node], extra_excluded_attributes: List[str] = None,
                                 package_name: str = None) -> bool:
-    filter_queries = [lambda node: not node.is_ad]
-    if package_name:
-        filter_queries.append(lambda node: node.belongs(package_name))
-    nodes1 = [x for x in nodes1 if all(query(x) for query in filter_queries)]
-    nodes2 = [x for x in nodes2 if all(query(x) for query in filter_queries)]
-    if len(nodes1) == 0 or len(nodes2) == 0:
-        return False
-    if len(nodes1) != len(nodes2):
+    """
+    Determines if two lists of nodes represent the same state, i.e., the non-ad nodes (that belong to the package,
+    if given) are practically equal in order. It compares the state fingerprints of the nodes, which reuse
+    the fingerprints computed at build time by `with_fingerprint_pass`, if the configurations are the same.
+    """
+    config = FingerprintConfig.for_state_comparison(extra_excluded_attributes=extra_excluded_attributes,
+                                                    package_name=package_name)
+    state1 = compute_state_fingerprint(nodes1, config)
+    if state1 is None:
         return False
-    excluded_attributes = ['xpath', 'naf', 'focused', 'bounds', 'index', 'drawing_order',
-                           'a11y_actions', 'invalid']
-    if extra_excluded_attributes is not None:
-        excluded_attributes.extend(extra_excluded_attributes)
-    for node1, node2 in zip(nodes1, nodes2):
-        if not node1.practically_equal(node2, excluded_attrs=excluded_attributes):
-            return False
-    return True
+    return state1 == compute_state_fingerprint(nodes2, config)
 
 
 def is_in_same_state_layout(layout1: str, layout2: str, extra_excluded_attributes: List[str] = None,
                             package_name: str = None) -> bool:
+    config = FingerprintConfig.for_state_comparison(extra_excluded_attributes=extra_excluded_attributes,
+                                                    package_name=package_name)
     nodes1 = NodesFactory() \
         .with_layout(layout1) \
         .with_xpath_pass() \
         .with_ad_detection() \
+        .with_fingerprint_pass(config) \
+        .with_cache(shared=True) \
         .build()
     nodes2 = NodesFactory() \
         .with_layout(layout2) \
         .with_xpath_pass() \
         .with_ad_detection() \
+        .with_fingerprint_pass(config) \
+        .with_cache(shared=True) \
         .build()
     return is_in_same_state_with_nodes(nodes1, nodes2, extra_excluded_attributes=extra_excluded_attributes,
                                        package_name=package_name)
@@ -497,47 +884,119 @@ def is_in_same_state_layout(layout1: str, layout2: str, extra_excluded_attribute
 def is_in_same_state_with_layout_path(layout_path1: Union[Path, str], layout_path2: Union[Path, str],
                                       extra_excluded_attributes: List[str] = None,
                                       package_name: str = None) -> bool:
+    config = FingerprintConfig.for_state_comparison(extra_excluded_attributes=extra_excluded_attributes,
+                                                    package_name=package_name)
     nodes1 = NodesFactory() \
         .with_layout_path(layout_path1) \
         .with_xpath_pass() \
         .with_ad_detection() \
+        .with_fingerprint_pass(config) \
+        .with_cache(shared=True) \
         .build()
     nodes2 = NodesFactory() \
         .with_layout_path(layout_path2) \
         .with_xpath_pass() \
         .with_ad_detection() \
+        .with_fingerprint_pass(config) \
+        .with_cache(shared=True) \
         .build()
     return is_in_same_state_with_nodes(nodes1, nodes2, extra_excluded_attributes=extra_excluded_attributes,
                                        package_name=package_name)
 
 
+class XPathIndex:
+    """
+    Assigns the xpaths of the GUI elements of an XML tree in one top-down pass, then answers element-to-xpath and
+    xpath-to-elements lookups with dictionaries. Like `NodesFactory`, the root has an empty xpath and only the `node`
+    children of indexed elements are indexed. An xpath is the path of class names from the root, and a class name is
+    followed by its position among the siblings of the same class (e.g., `/android.widget.TextView[2]`) if it's not
+    unique. The indexes are cached per tree (see `XPathIndex.of`) and per layout (see `XPathIndex.of_layout`), the tree
+    should not be modified after it's indexed.
+    """
+
+    def __init__(self, root: etree.Element):
+        self.root = root
+        self.element_to_xpath = {root: ""}
+        self.xpath_to_elements = defaultdict(list)
+        stack = [root]
+        while len(stack) > 0:
+            element = stack.pop()
+            prefix = self.element_to_xpath[element]
+            children = [x for x in element if x.tag == "node"]
+            class_names = [x.get('class', x.get('class_name', "")) for x in children]
+            # For XPATH we have to count only for nodes with same type!
+            total_class_count = Counter(class_names)
+            class_counter = defaultdict(int)
+            for child, class_name in zip(children, class_names):
+                class_counter[class_name] += 1
+                if total_class_count[class_name] == 1:
+                    xpath = f"{prefix}/{class_name}"
+                else:
+                    xpath = f"{prefix}/{class_name}[{class_counter[class_name]}]"
+                self.element_to_xpath[child] = xpath
+                self.xpath_to_elements[xpath].append(child)
+            stack.extend(reversed(children))
+
+    def get_xpath(self, element: etree.Element) -> Union[str, None]:
+        return self.element_to_xpath.get(element, None)
+
+    def get_elements(self, xpath: str) -> List[etree.Element]:
+        return self.xpath_to_elements.get(xpath, [])
+
+    @staticmethod
+    def of(xml_element: etree.Element) -> 'XPathIndex':
+        """
+        Returns the (cached) index of the tree that contains the element
+        """
+        root = xml_element.getroottree().getroot()
+        index = _xpath_indexes.get(id(root), None)
+        if index is None or index.root is not root or xml_element not in index.element_to_xpath:
+            index = XPathIndex(root)
+            _xpath_indexes[id(root)] = index
+        return index
+
+    @staticmethod
+    def of_layout(layout: str) -> Union['XPathIndex', None]:
+        """
+        Returns the (cached) index of the layout, or None if it cannot be parsed. The layout is parsed once and
+        its elements are shared among the callers, so they should not be modified.
+        """
+        layout_hash = ParsedLayoutCache.hash_layout(layout)
+        index = _layout_xpath_indexes.get(layout_hash, None)
+        if index is None:
+            try:
+                parser = etree.XMLParser(ns_clean=True, recover=True, encoding='utf-8')
+                root = etree.fromstring(layout.encode('utf-8'), parser)
+            except etree.XMLSyntaxError:
+                root = None
+            if root is None:
+                return None
+            index = XPathIndex(root)
+            _layout_xpath_indexes[layout_hash] = index
+        return index
+
+
+# The XML elements cannot be weakly referenced, the indexes keep their roots alive so the ids are not reused
+_xpath_indexes = LRUCache(maxsize=16)
+_layout_xpath_indexes = LRUCache(maxsize=16)
+
+
 def get_xpath_from_xml_element(xml_element):
-    def __get_element_class(my_xml_element):
-        # for XPATH we have to count only for nodes with same type!
-        length = 0
-        index = -1
-        if my_xml_element.getparent() is not None:
-            for x in my_xml_element.getparent().getchildren():
-                if my_xml_element.attrib.get('class', 'NONE1') == x.attrib.get('class', 'NONE2'):
-                    length += 1
-                if x == my_xml_element:
-                    index = length
-        if length > 1:
-            return f"{my_xml_element.attrib.get('class', '')}[{index}]"
-        return my_xml_element.attrib.get('class', '')
-
-    node_class_name = __get_element_class(xml_element)
-    path = '/' + node_class_name if node_class_name != "" else ""
-    if xml_element.getparent() is not None and xml_element.getparent().attrib.get('class', 'NONE') != 'hierarchy':
-        path = get_xpath_from_xml_element(xml_element.getparent()) + path
-    return path
+    return XPathIndex.of(xml_element).get_xpath(xml_element)
 
 
 def get_element_from_xpath(layout: str, xpath: str) -> Union[etree.ElementTree, None]:
-    possible_nodes = get_nodes(layout, filter_query=lambda node: node.xpath == xpath)
-    if len(possible_nodes) != 1:
+    """
+    The XML element of the only node with the xpath (see `XPathIndex`). The element is shared among the callers,
+    so it should not be modified.
+    """
+    xpath_index = XPathIndex.of_layout(layout)
+    if xpath_index is None:
+        return None
+    possible_elements = xpath_index.get_elements(xpath)
+    if len(possible_elements) != 1:
         return None
-    return possible_nodes[0].xml_element
+    return possible_elements[0]
 
 
 def is_clickable_element_or_none(dom: str, xpath: str) -> bool:
@@ -565,6 +1024,7 @@ def get_nodes(dom: str, filter_query: Callable[[Node], bool] = None) -> List[Nod
     nodes = NodesFactory() \
         .with_layout(dom) \
         .with_xpath_pass() \
+        .with_cache() \
         .build()
     if filter_query is None:
         filter_query = lambda x: True
@@ -3,7 +3,7 @@ import asyncio
 from typing import List, Union
 from latte_utils import is_latte_live
 from consts import DEVICE_NAME
-from shell_utils import run_bash
+from shell_utils import run_adb_shell
 
 logger = logging.getLogger(__name__)
 
@@ -15,7 +15,7 @@ class A11yServiceManager:
     @staticmethod
     async def get_enabled_services(simplify: bool = False, device_name: str = DEVICE_NAME) -> List[str]:
         _, enabled_services, _ = \
-            await run_bash(f"adb -s {device_name} shell settings get secure enabled_accessibility_services")
+            await run_adb_shell("settings get secure enabled_accessibility_services", device_name=device_name)
         if 'null' in enabled_services:
             return []
         result = []
@@ -53,8 +53,8 @@ class A11yServiceManager:
             return 0
 
         enabled_services_str = ":".join(enabled_services + requested_services)
-        r_code, *_ = await run_bash(
-            f"adb -s {device_name} shell settings put secure enabled_accessibility_services {enabled_services_str}")
+        r_code, *_ = await run_adb_shell(
+            f"settings put secure enabled_accessibility_services {enabled_services_str}", device_name=device_name)
         return len(requested_services) if r_code == 0 else -1
 
     @staticmethod
@@ -67,11 +67,11 @@ class A11yServiceManager:
         enabled_services.remove(A11yServiceManager.services[service_name])
         enabled_services_str = ":".join(enabled_services)
         if len(enabled_services_str) == 0:
-            r_code, *_ = await run_bash(
-                f"adb -s {device_name} shell settings delete secure enabled_accessibility_services")
+            r_code, *_ = await run_adb_shell(
+                "settings delete secure enabled_accessibility_services", device_name=device_name)
         else:
-            r_code, *_ = await run_bash(
-                f"adb -s {device_name} shell settings put secure enabled_accessibility_services {enabled_services_str}")
+            r_code, *_ = await run_adb_shell(
+                f"settings put secure enabled_accessibility_services {enabled_services_str}", device_name=device_name)
         return r_code == 0
 
     @staticmethod
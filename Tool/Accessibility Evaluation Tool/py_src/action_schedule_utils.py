@@ -0,0 +1,153 @@
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+from GUI_utils import Node
+from node_index_utils import get_identifiers
+
+logger = logging.getLogger(__name__)
+
+# An action is the execution of a node's click with a controller mode, e.g., (3, 'touch')
+Action = Tuple[int, str]
+
+
+def get_action_key(node: Node, mode: str) -> str:
+    return json.dumps([mode, *get_identifiers(node)])
+
+
+class ActionOutcomes:
+    """
+    A persistent record of whether the actions of the earlier runs (of all snapshots of an app) preserved the state
+    of the screen. The actions are identified by their controller mode and the identifiers of their nodes, so the
+    outcomes are shared among the snapshots that contain the same widgets.
+    """
+    VERSION = 1
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        # The key of an action to the number of times it preserved and changed the state
+        self.counts: Dict[str, List[int]] = {}
+
+    @staticmethod
+    def load(path: Union[str, Path]) -> 'ActionOutcomes':
+        """
+        :return: The outcomes, or empty outcomes if the file does not exist or cannot be loaded
+        """
+        outcomes = ActionOutcomes(path)
+        try:
+            with open(path) as f:
+                content = json.load(f)
+            if content.get('version', None) == ActionOutcomes.VERSION:
+                outcomes.counts = content['counts']
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"The action outcomes could not be loaded from {path}: {e}")
+        return outcomes
+
+    def save(self) -> None:
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({'version': ActionOutcomes.VERSION, 'counts': self.counts}, f, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def record(self, node: Node, mode: str, state_preserved: bool) -> None:
+        counts = self.counts.setdefault(get_action_key(node, mode), [0, 0])
+        counts[0 if state_preserved else 1] += 1
+
+    def get(self, node: Node, mode: str) -> Union[bool, None]:
+        """
+        :return: Whether the action mostly preserved the state, or None if it has not been observed
+        """
+        counts = self.counts.get(get_action_key(node, mode), None)
+        if counts is None or counts[0] == counts[1]:
+            return None
+        return counts[0] > counts[1]
+
+
+class ActionPlan:
+    """
+    The order of the actions as batches. A batch is performed by one device and it starts with a reload; its actions
+    are predicted to preserve the state except possibly the last one, so they run back to back without reloads.
+    Therefore, the planned reloads do not depend on how the batches are distributed among the devices.
+    """
+
+    def __init__(self, batches: List[List[Action]], predictions: Dict[Action, bool]):
+        self.batches = batches
+        self.predictions = predictions
+
+    @property
+    def actions(self) -> List[Action]:
+        return [action for batch in self.batches for action in batch]
+
+    @property
+    def naive_reload_count(self) -> int:
+        # In the file order, every action is preceded by a reload
+        return len(self.actions)
+
+    @property
+    def planned_reload_count(self) -> int:
+        return len(self.batches)
+
+    def toJSON(self) -> dict:
+        return {'naive_reload_count': self.naive_reload_count,
+                'planned_reload_count': self.planned_reload_count,
+                'batches': [[{'index': index, 'mode': mode, 'state_preserving': self.predictions[(index, mode)]}
+                             for index, mode in batch]
+                            for batch in self.batches]}
+
+    def write(self, path: Union[str, Path]) -> None:
+        with open(path, "w") as f:
+            json.dump(self.toJSON(), f, indent=2)
+
+
+class ActionScheduler:
+    """
+    Orders the actions to minimize the reloads of the snapshot. The actions of a controller mode that are predicted
+    to preserve the state are grouped in batches, since the reload is only skipped between the actions of the same
+    controller, and each state-changing action is isolated at the end of a batch.
+    """
+
+    def __init__(self, outcomes: ActionOutcomes = None):
+        self.outcomes = outcomes
+
+    def predict_state_preserving(self, node: Node, mode: str) -> bool:
+        """
+        Uses the outcome of the same action in the earlier runs if it is known. Otherwise, it is predicted from
+        the layout: only the nodes that do not handle clicks themselves (e.g., a focusable text) are expected to
+        preserve the state, while ads and checkable widgets change it.
+        """
+        if self.outcomes is not None:
+            learned = self.outcomes.get(node, mode)
+            if learned is not None:
+                return learned
+        if node.is_ad or node.checkable:
+            return False
+        return not (node.clickable or node.long_clickable or node.clickable_span)
+
+    def plan(self, nodes: List[Node], actions: List[Action], worker_count: int = 1) -> ActionPlan:
+        """
+        The state-preserving actions of each controller mode are split into `worker_count` batches of consecutive
+        indices, so the devices can perform them in parallel. The batches are ordered by their first index, so the
+        earlier actions are completed first.
+
+        :param nodes: The actionable nodes, which are indexed by the actions
+        :param actions: The actions in the naive order
+        :param worker_count: The number of devices that perform the batches
+        """
+        predictions = {(index, mode): self.predict_state_preserving(nodes[index], mode) for index, mode in actions}
+        batches = []
+        for mode in dict.fromkeys(mode for _, mode in actions):
+            preserving_actions = [action for action in actions if action[1] == mode and predictions[action]]
+            changing_actions = [action for action in actions if action[1] == mode and not predictions[action]]
+            batch_count = min(worker_count, len(preserving_actions))
+            for i in range(batch_count):
+                batch = preserving_actions[i * len(preserving_actions) // batch_count:
+                                           (i + 1) * len(preserving_actions) // batch_count]
+                batches.append(batch + changing_actions[:1])
+                changing_actions = changing_actions[1:]
+            batches.extend([action] for action in changing_actions)
+        batches.sort(key=lambda batch: min(index for index, _ in batch))
+        return ActionPlan(batches, predictions)
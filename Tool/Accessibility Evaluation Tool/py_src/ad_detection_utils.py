@@ -0,0 +1,135 @@
+import hashlib
+import json
+import logging
+import re
+from pathlib import Path
+from typing import List, Union
+
+from cachetools import LRUCache
+
+from consts import AD_RULES_PATH
+
+logger = logging.getLogger(__name__)
+
+# Rule types, each rule is checked against the resource id of a node
+SUFFIX_RULE = "suffix"  # The resource id ends with the pattern
+EQUALS_RULE = "equals"  # The resource id is the pattern
+CONTAINS_RULE = "contains"  # The resource id contains the pattern
+ID_PREFIX_RULE = "id_prefix"  # The part after the first '/' (e.g., 'ad_view' in 'pkg:id/ad_view') starts with the pattern
+RULE_TYPES = [SUFFIX_RULE, EQUALS_RULE, CONTAINS_RULE, ID_PREFIX_RULE]
+
+DEFAULT_AD_RULES = [
+    {"type": SUFFIX_RULE, "pattern": "_ad"},
+    {"type": SUFFIX_RULE, "pattern": "_ads"},
+    {"type": EQUALS_RULE, "pattern": "ad", "ignore_case": True},
+    {"type": EQUALS_RULE, "pattern": "abgc", "ignore_case": True},
+    {"type": EQUALS_RULE, "pattern": "cbb", "ignore_case": True},
+    {"type": CONTAINS_RULE, "pattern": "fbAd"},
+    {"type": CONTAINS_RULE, "pattern": "ad-container"},
+    {"type": CONTAINS_RULE, "pattern": "mrec", "ignore_case": True},
+    {"type": CONTAINS_RULE, "pattern": "native", "ignore_case": True},
+    {"type": CONTAINS_RULE, "pattern": "_ad_", "ignore_case": True},
+    {"type": CONTAINS_RULE, "pattern": "_ad", "ignore_case": True},
+    {"type": CONTAINS_RULE, "pattern": "ad_", "ignore_case": True},
+    {"type": CONTAINS_RULE, "pattern": "_ads_", "ignore_case": True},
+    {"type": CONTAINS_RULE, "pattern": "_ads", "ignore_case": True},
+    {"type": CONTAINS_RULE, "pattern": "ads_", "ignore_case": True},
+    {"type": CONTAINS_RULE, "pattern": "banner", "ignore_case": True},
+    {"type": CONTAINS_RULE, "pattern": "Ad frame"},
+    {"type": SUFFIX_RULE, "pattern": "Ads"},
+    {"type": ID_PREFIX_RULE, "pattern": "ad_"},
+    {"type": CONTAINS_RULE, "pattern": "af", "ignore_case": True},
+    {"type": ID_PREFIX_RULE, "pattern": "ads"},
+]
+# If a resource id matches any of the exclusion rules, it's not an ad
+DEFAULT_AD_EXCLUSION_RULES = [
+    {"type": CONTAINS_RULE, "pattern": "add", "ignore_case": True},
+]
+
+
+def compile_rules(rules: List[dict]) -> Union[re.Pattern, None]:
+    """
+    Compiles the rules into one regular expression which matches (with `search`) a resource id iff one of the
+    rules matches it.
+    """
+    alternatives = []
+    for rule in rules:
+        rule_type = rule.get('type', CONTAINS_RULE)
+        pattern = re.escape(rule['pattern'])
+        if rule_type == SUFFIX_RULE:
+            pattern = f"{pattern}\\Z"
+        elif rule_type == EQUALS_RULE:
+            pattern = f"\\A{pattern}\\Z"
+        elif rule_type == ID_PREFIX_RULE:
+            pattern = f"\\A[^/]*/{pattern}"
+        elif rule_type != CONTAINS_RULE:
+            raise ValueError(f"Unknown ad rule type {rule_type}, the valid types are {RULE_TYPES}")
+        alternatives.append(f"(?i:{pattern})" if rule.get('ignore_case', False) else f"(?:{pattern})")
+    if len(alternatives) == 0:
+        return None
+    return re.compile("|".join(alternatives))
+
+
+class AdRulePack:
+    """
+    Determines if a resource id belongs to an ad element. The rules are compiled once into a single regular
+    expression, and the verdicts are memoized per resource id, since the same ids repeat across snapshots.
+    """
+
+    def __init__(self, rules: List[dict] = None, exclusion_rules: List[dict] = None, cache_size: int = 65536):
+        self.rules = list(rules) if rules is not None else []
+        self.exclusion_rules = list(exclusion_rules) if exclusion_rules is not None else []
+        self.rules_pattern = compile_rules(self.rules)
+        self.exclusion_pattern = compile_rules(self.exclusion_rules)
+        self.verdicts = LRUCache(maxsize=cache_size)
+
+    @staticmethod
+    def create_default(rules_path: Union[str, Path, None] = AD_RULES_PATH) -> 'AdRulePack':
+        """
+        Creates a rule pack with the default rules and the rules in the JSON file at `rules_path`, if given.
+        The file contains a dictionary with optional lists of 'rules' and 'exclusion_rules', e.g.,
+        {"rules": [{"type": "contains", "pattern": "adview", "ignore_case": true}]}
+        """
+        rules = list(DEFAULT_AD_RULES)
+        exclusion_rules = list(DEFAULT_AD_EXCLUSION_RULES)
+        if rules_path:
+            try:
+                with open(rules_path) as f:
+                    extra_rules = json.load(f)
+                rules.extend(extra_rules.get('rules', []))
+                exclusion_rules.extend(extra_rules.get('exclusion_rules', []))
+                logger.info(f"Loaded {len(extra_rules.get('rules', []))} ad rules and "
+                            f"{len(extra_rules.get('exclusion_rules', []))} exclusion rules from {rules_path}")
+            except Exception as e:
+                logger.error(f"The ad rules could not be loaded from {rules_path}: {e}")
+        return AdRulePack(rules=rules, exclusion_rules=exclusion_rules)
+
+    def key(self) -> str:
+        """
+        A hash of the rules, which identifies the verdicts of the rule pack (e.g., in persisted nodes)
+        """
+        content = json.dumps([self.rules, self.exclusion_rules], sort_keys=True)
+        return hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
+
+    def is_ad_resource_id(self, resource_id: str) -> bool:
+        verdict = self.verdicts.get(resource_id, None)
+        if verdict is None:
+            verdict = self.rules_pattern is not None and self.rules_pattern.search(resource_id) is not None
+            if verdict and self.exclusion_pattern is not None and self.exclusion_pattern.search(resource_id):
+                verdict = False
+            self.verdicts[resource_id] = verdict
+        return verdict
+
+
+_default_ad_rule_pack = None
+
+
+def get_default_ad_rule_pack() -> AdRulePack:
+    """
+    The rule pack used by `NodesFactory.with_ad_detection` by default, it's shared in the process so the
+    verdicts are reused across layouts.
+    """
+    global _default_ad_rule_pack
+    if _default_ad_rule_pack is None:
+        _default_ad_rule_pack = AdRulePack.create_default()
+    return _default_ad_rule_pack
@@ -1,17 +1,21 @@
 import logging
 import asyncio
+import math
+import shlex
 from pathlib import Path
 
 import xmlformatter
 import random
 from typing import Optional, Union
-from consts import DEVICE_NAME
-from shell_utils import run_bash
+from consts import DEVICE_NAME, LATTE_FILE_POLL_INTERVAL, LATTE_FILE_MAX_WAIT_TIME, LATTE_FILE_READ_TIMEOUT_MARGIN
+from shell_utils import run_bash, run_adb_shell
 
 logger = logging.getLogger(__name__)
 
 formatter = xmlformatter.Formatter(indent="1", indent_char="\t", encoding_output="UTF-8", preserve=["literal"])
 LATTE_PKG_NAME = "dev.navids.latte"
+# Printed by the on-device loop of `read_local_android_file` if the file is not created in time
+MISSING_FILE_MARKER = "__LATTE_MISSING_FILE__"
 
 
 async def start_adb() -> None:
@@ -23,10 +27,10 @@ async def kill_adb() -> None:
 
 
 async def adb_capture_layout(device_name: str = DEVICE_NAME) -> str:
-    cmd = f"adb -s {device_name} exec-out uiautomator dump /dev/tty"
+    cmd = "uiautomator dump /dev/tty"
     layout = f"PROBLEM_WITH_XML EMPTY {random.random()}"
     for i in range(3):
-        result, stdout, stderr = await run_bash(cmd)
+        result, stdout, stderr = await run_adb_shell(cmd, device_name=device_name)
         layout = stdout.replace("UI hierarchy dumped to: /dev/tty", "")
         try:
             layout = formatter.format_string(layout).decode("utf-8")
@@ -55,20 +59,27 @@ async def save_snapshot(snapshot_name, device_name: str = DEVICE_NAME) -> None:
 
 
 async def get_current_activity_name(device_name: str = DEVICE_NAME) -> str:
-    cmd = f"adb -s {device_name} shell dumpsys window windows  | grep 'mObscuringWindow'"
-    r_code, stdout, stderr = await run_bash(cmd)
+    cmd = "dumpsys window windows | grep 'mObscuringWindow'"
+    r_code, stdout, stderr = await run_adb_shell(cmd, device_name=device_name)
     return stdout
 
 
+def get_activity_name_from_windows(windows: str) -> str:
+    """
+    Extracts the output of `get_current_activity_name` from the output of `get_windows`
+    """
+    return "".join(f"{line}\n" for line in windows.splitlines() if 'mObscuringWindow' in line)
+
+
 async def get_windows(device_name: str = DEVICE_NAME) -> str:
-    cmd = f"adb -s {device_name} shell dumpsys window windows"
-    r_code, stdout, stderr = await run_bash(cmd)
+    cmd = "dumpsys window windows"
+    r_code, stdout, stderr = await run_adb_shell(cmd, device_name=device_name)
     return stdout
 
 
 async def get_activities(device_name: str = DEVICE_NAME) -> str:
-    cmd = f"adb -s {device_name} shell dumpsys activity activities"
-    r_code, stdout, stderr = await run_bash(cmd)
+    cmd = "dumpsys activity activities"
+    r_code, stdout, stderr = await run_adb_shell(cmd, device_name=device_name)
     return stdout
 
 
@@ -84,14 +95,35 @@ async def is_android_activity_on_top(device_name: str = DEVICE_NAME) -> bool:
 async def local_android_file_exists(file_path: str,
                                     pkg_name: str = LATTE_PKG_NAME,
                                     device_name: str = DEVICE_NAME) -> bool:
-    cmd = f"adb -s {device_name} exec-out run-as {pkg_name} ls files/{file_path}"
-    _, stdout, _ = await run_bash(cmd)
+    cmd = f"run-as {pkg_name} ls files/{file_path}"
+    _, stdout, _ = await run_adb_shell(cmd, device_name=device_name)
     return "No such file or directory" not in stdout
 
 
 async def remove_local_android_file(file_path: str, pkg_name: str = LATTE_PKG_NAME, device_name: str = DEVICE_NAME):
-    rm_cmd = f"adb -s {device_name} exec-out run-as {pkg_name} rm files/{file_path}"
-    await run_bash(rm_cmd)
+    rm_cmd = f"run-as {pkg_name} rm files/{file_path}"
+    await run_adb_shell(rm_cmd, device_name=device_name)
+
+
+def get_latte_file_wait_time(wait_time: float) -> float:
+    return wait_time if wait_time > 0 else LATTE_FILE_MAX_WAIT_TIME
+
+
+def create_read_local_android_file_script(file_path: str, wait_time: float = -1, remove_after_read: bool = True) -> str:
+    """
+    A shell script that waits until the file is created, prints its content, and removes it. If the file is not
+    created in `wait_time` seconds (LATTE_FILE_MAX_WAIT_TIME if it is zero or negative), it prints
+    MISSING_FILE_MARKER and fails.
+    """
+    file_path = shlex.quote(f"files/{file_path}")
+    max_polls = math.ceil(get_latte_file_wait_time(wait_time) / LATTE_FILE_POLL_INTERVAL)
+    wait_loop = f"i=0; while [ ! -f {file_path} ]; do " \
+                f"if [ $i -ge {max_polls} ]; then echo {MISSING_FILE_MARKER}; exit 1; fi; " \
+                f"sleep {LATTE_FILE_POLL_INTERVAL}; i=$((i+1)); done"
+    script = f"{wait_loop}; cat {file_path}"
+    if remove_after_read:
+        script += f"; rm {file_path}"
+    return script
 
 
 async def read_local_android_file(file_path: str,
@@ -99,6 +131,34 @@ async def read_local_android_file(file_path: str,
                                   wait_time: int = -1,
                                   remove_after_read: bool = True,
                                   device_name: str = DEVICE_NAME) -> Optional[str]:
+    """
+    Waits for a file in the private directory of the package (e.g., a result of Latte), and reads it. Waiting,
+    reading, and removing the file are done by one shell command on the device.
+
+    :param wait_time: The maximum waiting time in seconds, LATTE_FILE_MAX_WAIT_TIME if it is zero or negative
+    :return: The content of the file, or None if it is not created in time or cannot be read
+    """
+    script = create_read_local_android_file_script(file_path, wait_time, remove_after_read)
+    timeout = get_latte_file_wait_time(wait_time) + LATTE_FILE_READ_TIMEOUT_MARGIN
+    try:
+        r_code, content, _ = await asyncio.wait_for(
+            run_adb_shell(f"run-as {pkg_name} sh -c {shlex.quote(script)}", device_name=device_name), timeout)
+    except asyncio.TimeoutError:
+        logger.error(f"Reading the file {file_path} did not finish in {timeout} seconds")
+        return None
+    if r_code == 0:
+        return content
+    if MISSING_FILE_MARKER not in content:
+        # The file may have been read and removed already, so it is not polled again
+        logger.error(f"The file {file_path} could not be read on the device: {content}")
+    return None
+
+
+async def poll_local_android_file(file_path: str,
+                                  pkg_name: str = LATTE_PKG_NAME,
+                                  wait_time: int = -1,
+                                  remove_after_read: bool = True,
+                                  device_name: str = DEVICE_NAME) -> Optional[str]:
     sleep_time = 0.5
     index = 0
     while not await local_android_file_exists(file_path, pkg_name, device_name=device_name):
@@ -108,8 +168,8 @@ async def read_local_android_file(file_path: str,
         if index % 4 == 0:
             logger.debug(f"Waiting {int(index * sleep_time)} seconds for {file_path}")
         await asyncio.sleep(sleep_time)
-    cmd = f"adb -s {device_name} exec-out run-as {pkg_name} cat files/{file_path}"
-    _, content, _ = await run_bash(cmd)
+    cmd = f"run-as {pkg_name} cat files/{file_path}"
+    _, content, _ = await run_adb_shell(cmd, device_name=device_name)
     if remove_after_read:
         await remove_local_android_file(file_path, pkg_name, device_name=device_name)
     return content
@@ -120,8 +180,8 @@ async def get_file_nums(dir_path: str, device_name: str = DEVICE_NAME) -> int:
         Takes the directory path in Android, returns the number of files in that directory.
        Method uses for Sugilite
    """
-    cmd = f"adb -s {device_name} shell ls sdcard/{dir_path} | adb -s {device_name} shell grep . -c"
-    _, stdout, _ = await run_bash(cmd)
+    cmd = f"ls sdcard/{dir_path} | grep . -c"
+    _, stdout, _ = await run_adb_shell(cmd, device_name=device_name)
     return stdout
 
 
@@ -135,8 +195,8 @@ async def get_most_recent_file(dir_path: str, prev_num: int, sleep_time: int, de
     while (cur_num == prev_num):
         cur_num = await get_file_nums(dir_path)
         await asyncio.sleep(sleep_time)
-    cmd = f"adb -s {device_name} shell ls -t sdcard/{dir_path} | adb -s {device_name} shell head -n1"
-    _, most_recent_name, _ = await run_bash(cmd)
+    cmd = f"ls -t sdcard/{dir_path} | head -n1"
+    _, most_recent_name, _ = await run_adb_shell(cmd, device_name=device_name)
     most_recent_name = most_recent_name.strip()
     return most_recent_name
 
@@ -165,26 +225,26 @@ async def launch_specified_application(pkg_name: str, device_name: str = DEVICE_
     ''' Starts the android application based on the provided package name
         Method uses for Sugilite
     '''
-    cmd = f"adb -s {device_name} shell monkey -p {pkg_name} 1"
-    return_code, _, _ = await run_bash(cmd)
+    cmd = f"monkey -p {pkg_name} 1"
+    return_code, _, _ = await run_adb_shell(cmd, device_name=device_name)
     return return_code == 0
 
 async def disable_talkback(device_name: str = DEVICE_NAME) -> bool:
-    cmd = f"adb -s {device_name} shell settings put secure enabled_accessibility_services dev.navids.latte/dev.navids.latte.app.MyLatteService"
-    return_code, _, _ = await run_bash(cmd)
+    cmd = "settings put secure enabled_accessibility_services dev.navids.latte/dev.navids.latte.app.MyLatteService"
+    return_code, _, _ = await run_adb_shell(cmd, device_name=device_name)
     return return_code == 0
 
 async def enable_talkback(device_name: str = DEVICE_NAME) -> bool:
-    cmd = f"adb -s {device_name} shell settings put secure enabled_accessibility_services com.google.android.marvin.talkback/com.google.android.marvin.talkback.TalkBackService:dev.navids.latte/dev.navids.latte.app.MyLatteService"
-    return_code, _, _ = await run_bash(cmd)
+    cmd = "settings put secure enabled_accessibility_services com.google.android.marvin.talkback/com.google.android.marvin.talkback.TalkBackService:dev.navids.latte/dev.navids.latte.app.MyLatteService"
+    return_code, _, _ = await run_adb_shell(cmd, device_name=device_name)
     return return_code == 0
 
 async def disable_wifi(device_name: str = DEVICE_NAME) -> bool:
-    cmd = f"adb -s {device_name} shell 'svc wifi disable'"
-    return_code, _, _ = await run_bash(cmd)
+    cmd = "svc wifi disable"
+    return_code, _, _ = await run_adb_shell(cmd, device_name=device_name)
     return return_code == 0
 
 async def enable_wifi(device_name: str = DEVICE_NAME) -> bool:
-    cmd = f"adb -s {device_name} shell 'svc wifi enable'"
-    return_code, _, _ = await run_bash(cmd)
+    cmd = "svc wifi enable"
+    return_code, _, _ = await run_adb_shell(cmd, device_name=device_name)
     return return_code == 0
\ No newline at end of file
@@ -1,10 +1,14 @@
+import datetime
+import json
 import logging
+import os
 import shutil
 from pathlib import Path
-from typing import Union, Generator, List
+from typing import Dict, Union, Generator, List
 
 from ppadb.device_async import DeviceAsync
 
+from json_util import JSONSerializable
 from results_utils import AddressBook
 from snapshot import Snapshot, DeviceSnapshot
 from utils import synch_run
@@ -12,7 +16,31 @@ from utils import synch_run
 logger = logging.getLogger(__name__)
 
 
+class SnapshotMetadata(JSONSerializable):
+    """
+    The information of a snapshot that can be listed without loading the snapshot. It's valid as long as the
+    modification time of the snapshot directory does not change.
+    """
+
+    def __init__(self, name: str, mtime_ns: int, finished: bool):
+        self.name = name
+        self.mtime_ns = mtime_ns
+        self.finished = finished
+
+    @staticmethod
+    def createFromDict(metadata_dict: dict) -> 'SnapshotMetadata':
+        return SnapshotMetadata(name=metadata_dict['name'],
+                                mtime_ns=metadata_dict['mtime_ns'],
+                                finished=metadata_dict['finished'])
+
+    @property
+    def last_update(self) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(self.mtime_ns / 1e9)
+
+
 class App:
+    MANIFEST_NAME = "snapshots_manifest.json"
+
     def __init__(self, app_name: str, result_path: Union[str, Path], recreate: bool = False):
         """
 
@@ -30,11 +58,45 @@ class App:
         self.app_path.mkdir(parents=True, exist_ok=True)
         if not self.app_path.exists():
             raise f"The app path {self.app_path} does not exist!"
+        self.snapshot_paths: Dict[str, Path] = {}
+        self.snapshot_metadata: Dict[str, SnapshotMetadata] = {}
         self.snapshot_map = {}
         self.update_snapshots()
 
+    @property
+    def manifest_path(self) -> Path:
+        return self.app_path.joinpath(App.MANIFEST_NAME)
+
+    def _read_manifest(self) -> Dict[str, SnapshotMetadata]:
+        if not self.manifest_path.exists():
+            return {}
+        try:
+            with open(self.manifest_path) as f:
+                return {x['name']: SnapshotMetadata.createFromDict(x) for x in json.load(f)}
+        except Exception as e:
+            logger.warning(f"The snapshots manifest {self.manifest_path} could not be read: {e}")
+            return {}
+
+    def _write_manifest(self) -> None:
+        try:
+            tmp_path = self.manifest_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump([x.toJSON() for x in self.snapshot_metadata.values()], f)
+            os.replace(tmp_path, self.manifest_path)
+        except Exception as e:
+            logger.warning(f"The snapshots manifest {self.manifest_path} could not be written: {e}")
+
     def update_snapshots(self):
+        """
+        Lists the snapshots of the app without loading them. The metadata of the snapshots is read from the
+        manifest of the app, and it's only recomputed for the snapshots whose directories are modified.
+        The snapshots are created on the first access (see `get_snapshot`).
+        """
+        manifest = self._read_manifest()
+        self.snapshot_paths = {}
+        self.snapshot_metadata = {}
         self.snapshot_map = {}
+        manifest_changed = False
         for snapshot_result_path in self.app_path.iterdir():
             if snapshot_result_path.is_dir():
                 snapshot_name = snapshot_result_path.name
@@ -46,20 +108,38 @@ class App:
                     continue
                 if snapshot_name.startswith('TMP'):
                     continue
-                address_book = AddressBook(snapshot_result_path=snapshot_result_path)
-                self.snapshot_map[snapshot_name] = Snapshot(address_book)
+                self.snapshot_paths[snapshot_name] = snapshot_result_path
+                mtime_ns = snapshot_result_path.stat().st_mtime_ns
+                metadata = manifest.get(snapshot_name, None)
+                if metadata is None or metadata.mtime_ns != mtime_ns:
+                    address_book = AddressBook(snapshot_result_path=snapshot_result_path)
+                    metadata = SnapshotMetadata(name=snapshot_name,
+                                                mtime_ns=mtime_ns,
+                                                finished=address_book.finished_path.exists())
+                    manifest_changed = True
+                self.snapshot_metadata[snapshot_name] = metadata
+        if manifest_changed or len(self.snapshot_metadata) != len(manifest):
+            self._write_manifest()
 
-    def get_snapshot(self, name: str) -> Union[Snapshot, None]:
+    def _get_or_create_snapshot(self, name: str) -> Union[Snapshot, None]:
         if name not in self.snapshot_map:
-            return None
-        synch_run(self.snapshot_map[name].setup())
+            if name not in self.snapshot_paths:
+                return None
+            address_book = AddressBook(snapshot_result_path=self.snapshot_paths[name])
+            self.snapshot_map[name] = Snapshot(address_book)
         return self.snapshot_map[name]
 
+    def get_snapshot(self, name: str) -> Union[Snapshot, None]:
+        snapshot = self._get_or_create_snapshot(name)
+        if snapshot is not None:
+            synch_run(snapshot.setup())
+        return snapshot
+
     async def async_get_snapshot(self, name: str) -> Union[Snapshot, None]:
-        if name not in self.snapshot_map:
-            return None
-        await self.snapshot_map[name].setup()
-        return self.snapshot_map[name]
+        snapshot = self._get_or_create_snapshot(name)
+        if snapshot is not None:
+            await snapshot.setup()
+        return snapshot
 
     @property
     def app_name(self) -> str:
@@ -69,28 +149,29 @@ class App:
 
     @property
     def snapshots(self) -> Generator[Snapshot, None, None]:
-        for snapshot_name in self.snapshot_map:
+        for snapshot_name in self.snapshot_paths:
             yield self.get_snapshot(snapshot_name)
 
     async def async_get_snapshots(self) -> Generator[Snapshot, None, None]:
-        for snapshot_name in self.snapshot_map:
+        for snapshot_name in self.snapshot_paths:
             yield await self.async_get_snapshot(snapshot_name)
 
     async def take_snapshot(self, device: DeviceAsync, snapshot_name: str = None,
                             enabled_assistive_services: List[str] = None) -> Snapshot:
         if snapshot_name is None:
             last_index = 0
-            for snapshot_name in self.snapshot_map.keys():
+            for snapshot_name in self.snapshot_paths.keys():
                 if snapshot_name.startswith("S_"):
                     s_index = snapshot_name[len("S_"):]
                     if s_index.isdigit():
                         last_index = max(last_index, int(s_index))
             snapshot_name = f"S_{last_index+1}"
-        if snapshot_name in self.snapshot_map:
+        if snapshot_name in self.snapshot_paths:
             logger.error(f"The snapshot already exists! Return the existing snapshot instead of taking a new snapshot")
             return await self.async_get_snapshot(snapshot_name)
         address_book = AddressBook(self.app_path.joinpath(snapshot_name))
         snapshot = DeviceSnapshot(address_book=address_book, device=device)
         await snapshot.setup(first_setup=True, enabled_assistive_services=enabled_assistive_services)
+        self.snapshot_paths[snapshot_name] = address_book.snapshot_result_path
         self.snapshot_map[snapshot_name] = snapshot
         return snapshot
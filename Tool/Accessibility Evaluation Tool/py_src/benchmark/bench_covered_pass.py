@@ -0,0 +1,106 @@
+"""
+Stress test of the covered pass: compares the RectangleIndex-based pass with the previous list-based pass on
+layouts with many overlapping nodes (e.g., ad overlays and interstitials).
+Usage (from py_src): python benchmark/bench_covered_pass.py [--sizes 1000 10000] [--repeat 3]
+"""
+import argparse
+import pathlib
+import random
+import sys
+import timeit
+from typing import Dict, List
+
+sys.path.append(str(pathlib.Path(__file__).parent.parent.resolve()))
+
+from GUI_utils import Node, NodesFactory, bounds_included, calculate_overlap
+from layout_generator import SCREEN_WIDTH, SCREEN_HEIGHT
+
+COVERED_BOUNDS_LIST_ATTR = "list_covered_bounds_list"
+
+
+def list_calculate_covered(node: Node,
+                           extra: Dict,
+                           children_nodes: List[Node],
+                           child_to_extras_map: Dict[Node, Dict]) -> None:
+    """The covered pass before the RectangleIndex"""
+    for child_node in children_nodes:
+        child_to_extras_map[child_node][COVERED_BOUNDS_LIST_ATTR] = []
+    if node.covered:
+        for child_node in children_nodes:
+            if not child_node.is_practically_invisible():
+                child_node.covered = True
+    else:
+        covered_bounds_so_far = list(extra.get(COVERED_BOUNDS_LIST_ATTR, []))
+        for child_node in sorted(children_nodes, key=lambda x: -x.drawing_order):
+            if child_node.is_practically_invisible():
+                continue
+            for covered_bounds in covered_bounds_so_far:
+                if bounds_included(covered_bounds, child_node.bounds):
+                    child_node.covered = True
+                    break
+                else:
+                    overlap_bounds = calculate_overlap(covered_bounds, child_node.bounds)
+                    if overlap_bounds:
+                        child_to_extras_map[child_node][COVERED_BOUNDS_LIST_ATTR].append(overlap_bounds)
+            if not child_node.covered:
+                covered_bounds_so_far.append(child_node.bounds)
+
+
+def generate_overlapping_layout(node_count: int, seed: int = 0) -> str:
+    """
+    A layout with `node_count` overlapping nodes: overlays with a few children and small overlapping leaves
+    """
+    rnd = random.Random(seed)
+    lines = ['<hierarchy rotation="0">',
+             f'<node class="android.widget.FrameLayout" visible="true" drawingOrder="0" '
+             f'bounds="[0,0][{SCREEN_WIDTH},{SCREEN_HEIGHT}]">']
+    count = 1
+    while count < node_count:
+        width, height = rnd.randint(20, 400), rnd.randint(20, 400)
+        left, top = rnd.randint(0, SCREEN_WIDTH - width), rnd.randint(0, SCREEN_HEIGHT - height)
+        attributes = f'visible="true" drawingOrder="{rnd.randint(0, 10000)}" ' \
+                     f'bounds="[{left},{top}][{left + width},{top + height}]"'
+        if rnd.random() < 0.1:
+            lines.append(f'<node class="android.widget.FrameLayout" {attributes}>')
+            for _ in range(3):
+                child_right, child_bottom = rnd.randint(left + 1, left + width), rnd.randint(top + 1, top + height)
+                lines.append(f'<node class="android.widget.ImageView" visible="true" drawingOrder="1" '
+                             f'bounds="[{left},{top}][{child_right},{child_bottom}]" />')
+            lines.append('</node>')
+            count += 4
+        else:
+            lines.append(f'<node class="android.widget.TextView" {attributes} />')
+            count += 1
+    lines.extend(['</node>', '</hierarchy>'])
+    return "\n".join(lines)
+
+
+def build_with_index(layout: str) -> List[Node]:
+    return NodesFactory().with_layout(layout).with_covered_pass().build()
+
+
+def build_with_list(layout: str) -> List[Node]:
+    factory = NodesFactory().with_layout(layout)
+    factory.passes.append(list_calculate_covered)
+    return factory.build()
+
+
+def main(sizes: List[int], repeat: int):
+    print(f"{'nodes':>8} {'covered':>8} {'list (ms)':>12} {'index (ms)':>12} {'speedup':>8}")
+    for size in sizes:
+        layout = generate_overlapping_layout(size)
+        index_nodes = build_with_index(layout)
+        list_nodes = build_with_list(layout)
+        assert [x.covered for x in index_nodes] == [x.covered for x in list_nodes]
+        list_time = min(timeit.repeat(lambda: build_with_list(layout), number=1, repeat=repeat))
+        index_time = min(timeit.repeat(lambda: build_with_index(layout), number=1, repeat=repeat))
+        print(f"{len(index_nodes):>8} {sum(x.covered for x in index_nodes):>8} {list_time * 1000:>12.1f} "
+              f"{index_time * 1000:>12.1f} {list_time / index_time:>7.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    main(args.sizes, args.repeat)
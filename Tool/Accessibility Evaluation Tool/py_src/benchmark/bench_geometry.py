@@ -0,0 +1,71 @@
+"""
+Micro-benchmark of the bounds operations: compares the per-node Python methods with the batch versions of
+geometry_utils over the nodes of a generated layout (both as Nodes and as a NodeTable).
+Usage (from py_src): python benchmark/bench_geometry.py [--sizes 1000 10000] [--repeat 5]
+"""
+import argparse
+import pathlib
+import sys
+import timeit
+from typing import List
+
+sys.path.append(str(pathlib.Path(__file__).parent.parent.resolve()))
+
+import geometry_utils
+from GUI_utils import Node, NodesFactory, bounds_included
+from layout_generator import SCREEN_WIDTH, SCREEN_HEIGHT, generate_layout
+from node_table import NodeTable
+
+SCREEN_BOUNDS = (0, 0, SCREEN_WIDTH, SCREEN_HEIGHT)
+
+
+def loop_operations(nodes: List[Node]):
+    areas = [node.area() for node in nodes]
+    out_of_bounds = [node.is_out_of_bounds(SCREEN_BOUNDS) for node in nodes]
+    normalized_bounds = [node.get_normalized_bounds(SCREEN_BOUNDS) for node in nodes]
+    return areas, out_of_bounds, normalized_bounds
+
+
+def batch_operations(nodes: List[Node]):
+    bounds = geometry_utils.to_bounds_array(nodes)
+    return geometry_utils.areas(bounds), \
+        geometry_utils.out_of_bounds_mask(bounds, SCREEN_BOUNDS), \
+        geometry_utils.normalized_bounds(bounds, SCREEN_BOUNDS)
+
+
+def loop_containment(nodes: List[Node], others: List[Node]):
+    return [[bounds_included(node.bounds, other.bounds) for other in others] for node in nodes]
+
+
+def batch_containment(nodes: List[Node], others: List[Node]):
+    return geometry_utils.containment_matrix(geometry_utils.to_bounds_array(nodes),
+                                             geometry_utils.to_bounds_array(others))
+
+
+def measure(function, repeat: int) -> float:
+    return min(timeit.repeat(function, number=1, repeat=repeat)) * 1000
+
+
+def main(sizes: List[int], repeat: int):
+    print(f"{'nodes':>8} {'operation':>24} {'loop (ms)':>10} {'batch (ms)':>11} {'table (ms)':>11}")
+    for size in sizes:
+        nodes = NodesFactory().with_layout(generate_layout(size)).with_xpath_pass().build()
+        table = NodeTable.from_nodes(nodes)
+        loop_time = measure(lambda: loop_operations(nodes), repeat)
+        batch_time = measure(lambda: batch_operations(nodes), repeat)
+        table_time = measure(lambda: batch_operations(table), repeat)
+        print(f"{len(nodes):>8} {'area/out/normalized':>24} {loop_time:>10.2f} {batch_time:>11.2f} "
+              f"{table_time:>11.2f}")
+        # The pairwise operations are quadratic, they are measured on a sample
+        sample = nodes[:1000]
+        loop_time = measure(lambda: loop_containment(sample, sample), repeat)
+        batch_time = measure(lambda: batch_containment(sample, sample), repeat)
+        print(f"{len(sample):>8} {'containment matrix':>24} {loop_time:>10.2f} {batch_time:>11.2f} {'-':>11}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    main(args.sizes, args.repeat)
@@ -0,0 +1,58 @@
+"""
+Compares the memory of a layout kept as a list of Nodes with the memory of the same layout kept as a NodeTable.
+Usage (from py_src): python benchmark/bench_node_table.py [--sizes 1000 5000 15000]
+"""
+import argparse
+import gc
+import pathlib
+import sys
+import timeit
+import tracemalloc
+from typing import List
+
+sys.path.append(str(pathlib.Path(__file__).parent.parent.resolve()))
+
+from GUI_utils import NodesFactory
+from layout_generator import generate_layout
+from node_table import NodeTable
+
+
+def build_nodes(layout: str):
+    return NodesFactory() \
+        .with_layout(layout) \
+        .with_xpath_pass() \
+        .with_ad_detection() \
+        .build()
+
+
+def traced_size(create) -> int:
+    gc.collect()
+    tracemalloc.start()
+    result = create()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main(sizes: List[int]):
+    print("The memory of Nodes does not include the lxml tree referenced by each Node (not traced by tracemalloc)")
+    print(f"{'nodes':>8} {'Nodes (B/node)':>15} {'NodeTable (B/node)':>19} {'ratio':>7} {'scan (ms)':>10}")
+    for size in sizes:
+        layout = generate_layout(size)
+        node_count = len(build_nodes(layout))
+        nodes_size = traced_size(lambda: build_nodes(layout))
+        table_size = traced_size(lambda: NodeTable.from_nodes(build_nodes(layout)))
+        table = NodeTable.from_nodes(build_nodes(layout))
+        scan_time = min(timeit.repeat(lambda: [(node.xpath, node.bounds, node.is_ad) for node in table],
+                                      number=1, repeat=3))
+        print(f"{node_count:>8} {nodes_size / node_count:>15.0f} {table_size / node_count:>19.0f} "
+              f"{nodes_size / table_size:>6.1f}x {scan_time * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 15000])
+    args = parser.parse_args()
+    main(args.sizes)
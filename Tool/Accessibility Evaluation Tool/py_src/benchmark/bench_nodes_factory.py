@@ -0,0 +1,103 @@
+"""
+Compares the streaming NodesFactory.build with the previous recursive implementation on synthetic layouts, then
+compares a build that misses the parsed-layout cache with the hits that copy the cached nodes or share them.
+Usage (from py_src): python benchmark/bench_nodes_factory.py [--sizes 1000 5000 15000] [--repeat 5]
+"""
+import argparse
+import pathlib
+import sys
+import timeit
+from collections import defaultdict
+from typing import Dict, List
+
+sys.path.append(str(pathlib.Path(__file__).parent.parent.resolve()))
+
+from lxml import etree
+
+from GUI_utils import Node, NodesFactory, ParsedLayoutCache
+from layout_generator import generate_layout
+
+
+def create_node(element) -> Node:
+    """Node creation from an XML element before the dedicated fast path"""
+    node = Node(**element.attrib)
+    node.xml_element = element
+    return node
+
+
+def recursive_build(factory: NodesFactory) -> List[Node]:
+    """The recursive implementation of NodesFactory.build before the streaming parser"""
+
+    def dfs(node: Node, extra: Dict) -> List[Node]:
+        nodes = [node]
+        children_xml_elements = node.xml_element.findall("node")
+        children_nodes = [create_node(child_element) for child_element in children_xml_elements]
+        child_to_extra_map = defaultdict(dict)
+        for t_pass in factory.passes:
+            t_pass(node, extra, children_nodes, child_to_extra_map)
+        for child_node in children_nodes:
+            child_node.parent_node = node
+            node.children_nodes.append(child_node)
+            nodes.extend(dfs(child_node, child_to_extra_map[child_node]))
+        return nodes
+
+    parser = etree.XMLParser(ns_clean=True, recover=True, encoding='utf-8')
+    dummy_root_xml = etree.fromstring(factory.layout.encode('utf-8'), parser)
+    dummy_root_node = create_node(dummy_root_xml)
+    dummy_root_node.xpath = f""
+    return dfs(dummy_root_node, {})[1:]
+
+
+def create_factory(layout: str) -> NodesFactory:
+    return NodesFactory() \
+        .with_layout(layout) \
+        .with_xpath_pass() \
+        .with_ad_detection() \
+        .with_covered_pass()
+
+
+def bench_cache(layout: str, repeat: int) -> Dict[str, float]:
+    """The minimum build times (in seconds) of a cache miss, a copied hit, and a shared hit"""
+    def build(cache: ParsedLayoutCache, shared: bool) -> List[Node]:
+        return create_factory(layout).with_cache(cache, shared=shared).build()
+
+    times = {}
+    for shared in [False, True]:
+        misses = []
+        for _ in range(repeat):
+            cache = ParsedLayoutCache()
+            misses.append(min(timeit.repeat(lambda: build(cache, shared), number=1, repeat=1)))
+        times['shared miss' if shared else 'miss'] = min(misses)
+        times['shared hit' if shared else 'copied hit'] = min(timeit.repeat(lambda: build(cache, shared),
+                                                                            number=1, repeat=repeat))
+    return times
+
+
+def main(sizes: List[int], repeat: int):
+    sys.setrecursionlimit(10000)
+    print(f"{'nodes':>8} {'recursive (ms)':>15} {'streaming (ms)':>15} {'speedup':>8}")
+    for size in sizes:
+        layout = generate_layout(size)
+        recursive_nodes = recursive_build(create_factory(layout))
+        streaming_nodes = create_factory(layout).build()
+        assert [x.toJSONStr() for x in recursive_nodes] == [x.toJSONStr() for x in streaming_nodes]
+        recursive_time = min(timeit.repeat(lambda: recursive_build(create_factory(layout)), number=1, repeat=repeat))
+        streaming_time = min(timeit.repeat(lambda: create_factory(layout).build(), number=1, repeat=repeat))
+        print(f"{len(streaming_nodes):>8} {recursive_time * 1000:>15.1f} {streaming_time * 1000:>15.1f} "
+              f"{recursive_time / streaming_time:>7.2f}x")
+    print()
+    print(f"{'nodes':>8} {'miss (ms)':>10} {'copied hit (ms)':>16} {'shared miss (ms)':>17} {'shared hit (ms)':>16}")
+    for size in sizes:
+        layout = generate_layout(size)
+        times = bench_cache(layout, repeat)
+        print(f"{len(create_factory(layout).build()):>8} {times['miss'] * 1000:>10.1f} "
+              f"{times['copied hit'] * 1000:>16.1f} {times['shared miss'] * 1000:>17.1f} "
+              f"{times['shared hit'] * 1000:>16.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 15000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    main(args.sizes, args.repeat)
@@ -0,0 +1,99 @@
+import random
+from xml.sax.saxutils import quoteattr
+
+SCREEN_WIDTH = 1080
+SCREEN_HEIGHT = 2220
+PACKAGE_NAME = "com.example.feed"
+
+_LEAF_CLASSES = ["android.widget.TextView", "android.widget.ImageView", "android.widget.Button",
+                 "android.widget.CheckBox", "android.view.View"]
+_CONTAINER_CLASSES = ["android.widget.LinearLayout", "android.widget.FrameLayout", "android.view.ViewGroup",
+                      "android.widget.RelativeLayout"]
+_AD_RESOURCE_IDS = [f"{PACKAGE_NAME}:id/banner_ad", f"{PACKAGE_NAME}:id/native_ad_container",
+                    "com.google.android.gms.ads:id/adView", f"{PACKAGE_NAME}:id/mrec_slot", "fbAdContainer"]
+
+
+def _attributes(rnd: random.Random, class_name: str, index: int, bounds, is_ad: bool) -> str:
+    resource_id = ""
+    if is_ad:
+        resource_id = rnd.choice(_AD_RESOURCE_IDS)
+    elif rnd.random() < 0.5:
+        resource_id = f"{PACKAGE_NAME}:id/{class_name.split('.')[-1].lower()}_{rnd.randint(0, 40)}"
+    text = f"Item {rnd.randint(0, 10000)}" if class_name.endswith("TextView") and rnd.random() < 0.8 else ""
+    content_desc = f"Picture {rnd.randint(0, 300)}" if class_name.endswith("ImageView") and rnd.random() < 0.5 else ""
+    clickable = rnd.random() < 0.3
+    attributes = {
+        "importantForAccessibility": "true",
+        "supportsWebAction": "false",
+        "actionList": "4-8-64-16" if clickable else "4-8-64",
+        "clickableSpan": "false",
+        "drawingOrder": str(rnd.randint(0, 5)),
+        "visible": "false" if rnd.random() < 0.1 else "true",
+        "invalid": "false",
+        "contextClickable": "false",
+        "live-region": "0",
+        "index": str(index),
+        "text": text,
+        "resource-id": resource_id,
+        "class": class_name,
+        "package": PACKAGE_NAME,
+        "content-desc": content_desc,
+        "checkable": "false",
+        "checked": "false",
+        "clickable": "true" if clickable else "false",
+        "enabled": "true",
+        "focusable": "true" if clickable else "false",
+        "focused": "false",
+        "scrollable": "false",
+        "long-clickable": "false",
+        "password": "false",
+        "selected": "false",
+        "bounds": "[{},{}][{},{}]".format(*bounds),
+    }
+    return " ".join(f"{key}={quoteattr(value)}" for key, value in attributes.items())
+
+
+def generate_layout(node_count: int, seed: int = 0, max_children: int = 6, ad_ratio: float = 0.1) -> str:
+    """
+    Generates a synthetic Latte layout with roughly `node_count` nodes. The layout mimics a scrolling feed:
+    nested containers with overlapping children, repeated sibling classes and ad containers.
+
+    :param node_count: The approximate number of nodes in the generated layout
+    :param seed: The seed of the random generator, the same seed always generates the same layout
+    :param max_children: The maximum number of children of a container
+    :param ad_ratio: The probability of a container being an ad container
+    :return: The XML layout as a string
+    """
+    rnd = random.Random(seed)
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<hierarchy rotation="0">']
+    remaining = [node_count]
+
+    def generate(index: int, bounds, depth: int, is_ad: bool):
+        remaining[0] -= 1
+        is_container = depth < 2 or (depth < 12 and remaining[0] > 0 and rnd.random() < 0.45)
+        class_name = rnd.choice(_CONTAINER_CLASSES if is_container else _LEAF_CLASSES)
+        is_ad = is_ad or (is_container and rnd.random() < ad_ratio)
+        attributes = _attributes(rnd, class_name, index, bounds, is_ad)
+        if not is_container:
+            lines.append(f"{'  ' * depth}<node {attributes} />")
+            return
+        lines.append(f"{'  ' * depth}<node {attributes}>")
+        children_count = rnd.randint(1, max_children)
+        left, top, right, bottom = bounds
+        height = max(1, (bottom - top) // children_count)
+        for child_index in range(children_count):
+            if remaining[0] <= 0:
+                break
+            child_top = top + child_index * height
+            # Some children overflow their slot to create overlapping regions
+            child_bottom = min(bottom, child_top + height + rnd.choice([0, 0, height // 2]))
+            child_left = left + rnd.choice([0, 0, 10])
+            generate(child_index, (child_left, child_top, right, child_bottom), depth + 1, is_ad)
+        lines.append(f"{'  ' * depth}</node>")
+
+    root_index = 0
+    while remaining[0] > 0:
+        generate(root_index, (0, 0, SCREEN_WIDTH, SCREEN_HEIGHT), 1, False)
+        root_index += 1
+    lines.append('</hierarchy>')
+    return "\n".join(lines)
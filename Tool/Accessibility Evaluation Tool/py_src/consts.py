@@ -8,14 +8,32 @@ TB_NAVIGATE_TIMEOUT = 4
 TB_SELECT_TIMEOUT = 4
 REGULAR_EXECUTE_TIMEOUT_TIME = 6
 IS_LIVE_TIMEOUT_TIME = 1
+# The interval of checking the result files of Latte on the device (see adb_utils.read_local_android_file)
+LATTE_FILE_POLL_INTERVAL = 0.1
+# The waiting time for a result file of Latte when the caller gives no limit, so the device never waits forever
+LATTE_FILE_MAX_WAIT_TIME = 600
+# The time the host waits for the command reading a result file of Latte, beyond its waiting time on the device
+LATTE_FILE_READ_TIMEOUT_MARGIN = 10
 # Delays
 CAPTURE_SCREENSHOT_DELAY = 0.5
 CAPTURE_STATE_DELAY = 0.5
+LOG_FLUSH_DELAY = 1
+EMULATOR_SNAPSHOT_DELAY = 3
+SAVE_SNAPSHOT_DELAY = 5
+SEARCH_RESULTS_DELAY = 1
+# Adaptive waits (see ui_idle_utils): the delays are the timeouts of waiting until the UI is idle, they are
+# fixed sleeps if ADAPTIVE_WAIT is disabled
+ADAPTIVE_WAIT = os.getenv('ADAPTIVE_WAIT', 'true').lower() == 'true'
+UI_IDLE_POLL_INTERVAL = 0.2
+UI_IDLE_STABLE_POLLS = 2  # The number of consecutive polls with unchanged signals
+UI_IDLE_HASH_DISTANCE = 2  # The maximum number of different bits of the screenshot hashes of an unchanged screen
 REGULAR_EXECUTOR_INTERVAL = 1000
 TB_EXECUTOR_INTERVAL = 1000
 # Retry
 TB_NAVIGATE_RETRY_COUNT = 3
 ACTION_EXECUTION_RETRY_COUNT = 2
+# The controllers that perform each action of PerformActionsTask
+CONTROLLER_MODES = ['tb_touch', 'a11y_api', 'touch']
 # Tags
 BLIND_MONKEY_TAG = "LATTE_SERVICE"
 BLIND_MONKEY_EVENTS_TAG = "LATTE_A11Y_EVENT_TAG"
@@ -31,6 +49,11 @@ SCREEN_BOUNDS = [0, 0, 1080, 1920]
 DEVICE_NAME = "14061JEC203474"
 ADB_HOST = "127.0.0.1"
 ADB_PORT = 5037
+# Send the shell commands to the ADB server through ppadb instead of spawning adb processes (see shell_utils)
+ADB_SERVER_SHELL = os.getenv('ADB_SERVER_SHELL', 'true').lower() == 'true'
 WS_IP = "0.0.0.0"
 WS_PORT = 8765
-UIED_PATH = os.getenv('UIED_PATH', None)
\ No newline at end of file
+UIED_PATH = os.getenv('UIED_PATH', None)
+# The maximum total number of Nodes kept by the parsed-layout cache
+PARSED_LAYOUT_CACHE_SIZE = int(os.getenv('PARSED_LAYOUT_CACHE_SIZE', 200000))
+AD_RULES_PATH = os.getenv('AD_RULES_PATH', None)  # A JSON file with extra ad detection rules
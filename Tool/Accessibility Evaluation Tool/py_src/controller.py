@@ -13,12 +13,13 @@ from a11y_service import A11yServiceManager
 from adb_utils import read_local_android_file
 from command import Command, CommandResponse, create_command_response_from_dict, SleepCommand, InfoCommand, \
     LocatableCommand, ClickCommand, TypeCommand, SelectCommand
-from consts import ACTION_EXECUTION_RETRY_COUNT, REGULAR_EXECUTE_TIMEOUT_TIME, DEVICE_NAME
+from consts import ACTION_EXECUTION_RETRY_COUNT, REGULAR_EXECUTE_TIMEOUT_TIME, DEVICE_NAME, SEARCH_RESULTS_DELAY
 from latte_executor_utils import latte_capture_layout
 from latte_utils import send_commands_sequence_to_latte, send_command_to_latte
 from results_utils import AddressBook, capture_current_state
-from shell_utils import run_bash
+from shell_utils import run_adb_shell
 from snapshot import DeviceSnapshot
+from ui_idle_utils import screenshot_hash_signal, wait_for_ui_idle
 
 logger = logging.getLogger(__name__)
 
@@ -98,8 +99,8 @@ class EnlargedDisplayController(TouchController):
 
     async def setup(self):
         await super().setup()
-        await run_bash(f"adb -s {self.device.serial} shell wm density 546")
-        await run_bash(f"adb -s {self.device.serial} shell settings put system font_scale 1.3")
+        await run_adb_shell("wm density 546", device_name=self.device.serial)
+        await run_adb_shell("settings put system font_scale 1.3", device_name=self.device.serial)
 
 
 class A11yAPIController(Controller):
@@ -204,7 +205,8 @@ class TalkBackSearchController(Controller):
                                    text=text_word_list[0])
         type_response = await super().execute(command=type_command)
         logger.info(f"Type Response: {type_response}")
-        await asyncio.sleep(1)
+        await wait_for_ui_idle(SEARCH_RESULTS_DELAY, signals=[screenshot_hash_signal(self.device)],
+                               name="search_results")
         # Find a candidate to click
         snapshot = await self._make_tmp_device_snapshot()
         if address_book is not None:
@@ -190,10 +190,8 @@ class ReplayDataManager:
                 step_info['bounds'] = str(list(response.acted_node.get_normalized_bounds(screen_bounds)))
             else:
                 step_info['bounds'] = "[0.0,0.0,0.0,0.0]"
-            step_info['atf_issues'] = []
-            for atf_issue in self.get_atf_problems(step=index):
-                node = Node.createNodeFromDict(atf_issue)
-                step_info['atf_issues'].append(str(list(node.get_normalized_bounds(screen_bounds))))
+            atf_nodes = [Node.createNodeFromDict(atf_issue) for atf_issue in self.get_atf_problems(step=index)]
+            step_info['atf_issues'] = [str(list(x)) for x in Node.get_normalized_bounds_list(atf_nodes, screen_bounds)]
 
             step_info['logs'] = snapshot.address_book.get_log_path(mode=self.controller_mode, index=0)
             step_info['event_logs'] = snapshot.address_book.get_log_path(mode=self.controller_mode, index=0,
@@ -0,0 +1,81 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, TypeVar, Union
+
+from ppadb.client_async import ClientAsync as AdbClient
+from ppadb.device_async import DeviceAsync
+
+logger = logging.getLogger(__name__)
+
+Job = TypeVar('Job')
+Result = TypeVar('Result')
+
+
+class DevicePool:
+    """
+    A pool of devices (e.g., the emulators 'emulator-5554' and 'emulator-5556' running the same AVD) that execute
+    independent jobs in parallel. Each device executes one job at a time, and the next job is dispatched to the first
+    device that becomes idle.
+    """
+
+    def __init__(self, devices: List[DeviceAsync]):
+        if len(devices) == 0:
+            raise Exception("The device pool should have at least one device!")
+        self.devices = devices
+
+    @staticmethod
+    async def connect(serials: List[str], adb_host: str, adb_port: int) -> 'DevicePool':
+        client = AdbClient(host=adb_host, port=adb_port)
+        devices = []
+        for serial in serials:
+            device = await client.device(serial)
+            if device is None:
+                raise Exception(f"The device {serial} is not connected!")
+            devices.append(device)
+        return DevicePool(devices)
+
+    def __len__(self):
+        return len(self.devices)
+
+    @property
+    def serials(self) -> List[str]:
+        return [device.serial for device in self.devices]
+
+    async def run(self,
+                  function: Callable[[DeviceAsync, Job], Awaitable[Result]],
+                  jobs: List[Job],
+                  on_result: Callable[[int, Result], Union[Awaitable[None], None]] = None) -> List[Result]:
+        """
+        Executes `function(device, job)` for all jobs on the devices of the pool. If a job fails, the other jobs
+        are cancelled and the exception is raised.
+
+        :param function: The job executor, it only uses the given device
+        :param jobs: The jobs
+        :param on_result: Called with the position of the job and its result once it is finished, not necessarily
+                          in the order of the jobs
+        :return: The results in the order of the jobs
+        """
+        queue = asyncio.Queue()
+        for position, job in enumerate(jobs):
+            queue.put_nowait((position, job))
+        results = [None] * len(jobs)
+
+        async def worker(device: DeviceAsync):
+            while not queue.empty():
+                position, job = queue.get_nowait()
+                logger.debug(f"Executing job {position} on {device.serial}")
+                results[position] = await function(device, job)
+                if on_result is not None:
+                    callback_result = on_result(position, results[position])
+                    if asyncio.iscoroutine(callback_result):
+                        await callback_result
+
+        workers = [asyncio.ensure_future(worker(device)) for device in self.devices]
+        try:
+            await asyncio.gather(*workers)
+        except BaseException:
+            for worker_future in workers:
+                worker_future.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            raise
+        return results
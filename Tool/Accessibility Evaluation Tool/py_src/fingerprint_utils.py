@@ -0,0 +1,248 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, List, Tuple, Union
+
+if TYPE_CHECKING:
+    from GUI_utils import Node
+
+logger = logging.getLogger(__name__)
+
+# The attributes that are always excluded when the states of two screens are compared
+STATE_EXCLUDED_ATTRIBUTES = ['xpath', 'naf', 'focused', 'bounds', 'index', 'drawing_order', 'a11y_actions',
+                             'invalid']
+# The node attributes which are set by the fingerprint pass
+FINGERPRINT_ATTRIBUTES = ['fingerprint_key', 'fingerprint', 'merkle_hash']
+# The fingerprint of nodes which are filtered out (e.g., ads)
+EXCLUDED_FINGERPRINT = ""
+
+
+def _hash(content: str) -> str:
+    return hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class FingerprintConfig:
+    """
+    Determines how the fingerprints of nodes are computed: the attributes that are ignored, whether ad nodes are
+    ignored, and the package that nodes should belong to (other nodes are ignored).
+    """
+
+    def __init__(self,
+                 excluded_attributes: List[str] = None,
+                 ignore_ads: bool = True,
+                 package_name: str = None):
+        self.excluded_attributes = sorted(set(excluded_attributes if excluded_attributes is not None else []))
+        self.ignore_ads = ignore_ads
+        self.package_name = package_name if package_name else None
+
+    @staticmethod
+    def for_state_comparison(extra_excluded_attributes: List[str] = None,
+                             package_name: str = None) -> 'FingerprintConfig':
+        """
+        The configuration which corresponds to `is_in_same_state_with_nodes`
+        """
+        excluded_attributes = list(STATE_EXCLUDED_ATTRIBUTES)
+        if extra_excluded_attributes is not None:
+            excluded_attributes.extend(extra_excluded_attributes)
+        return FingerprintConfig(excluded_attributes=excluded_attributes, package_name=package_name)
+
+    @staticmethod
+    def for_exact_state() -> 'FingerprintConfig':
+        """
+        The configuration of screens that an action cannot tell apart, e.g., to skip restoring a screen that
+        is not changed. Unlike `for_state_comparison`, the ads, bounds, indices, and the focus are considered.
+        """
+        return FingerprintConfig(excluded_attributes=['xpath', 'naf', 'drawing_order', 'a11y_actions'],
+                                 ignore_ads=False)
+
+    def key(self) -> Tuple:
+        return tuple(self.excluded_attributes), self.ignore_ads, self.package_name
+
+    def includes(self, node: 'Node') -> bool:
+        if self.ignore_ads and node.is_ad:
+            return False
+        if self.package_name and not node.belongs(self.package_name):
+            return False
+        return True
+
+    def __eq__(self, other):
+        return isinstance(other, FingerprintConfig) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+
+def compute_node_fingerprint(node: 'Node', config: FingerprintConfig) -> str:
+    """
+    The hash of the attributes of the node (except the excluded ones), or EXCLUDED_FINGERPRINT if the node
+    is filtered out. Two included nodes have the same fingerprint iff they are `practically_equal`.
+    """
+    if not config.includes(node):
+        return EXCLUDED_FINGERPRINT
+    return _hash(node.toJSONStr(list(config.excluded_attributes)))
+
+
+def compute_merkle_hash(fingerprint: str, children_merkle_hashes: Iterable[str]) -> str:
+    return _hash(fingerprint + "|" + ",".join(children_merkle_hashes))
+
+
+def get_node_fingerprint(node: 'Node', config: FingerprintConfig) -> str:
+    """
+    Returns the fingerprint computed by the fingerprint pass if it has the same configuration, otherwise
+    computes the fingerprint.
+    """
+    if getattr(node, 'fingerprint_key', None) == config.key():
+        return node.fingerprint
+    return compute_node_fingerprint(node, config)
+
+
+def get_merkle_hashes(nodes: List['Node'], config: FingerprintConfig) -> Dict[int, str]:
+    """
+    Returns a map from the id of each node to its merkle hash, i.e., the hash of its fingerprint and the merkle
+    hashes of its children. The hashes computed by the fingerprint pass are reused if they have the same
+    configuration.
+
+    :param nodes: The nodes of the layout in document order, including all descendants of each node
+    :param config: The fingerprint configuration
+    """
+    nodes = list(nodes)  # The nodes should be alive, since the map is keyed by id
+    merkle_hashes = {}
+    for node in reversed(nodes):
+        if getattr(node, 'fingerprint_key', None) == config.key():
+            merkle_hashes[id(node)] = node.merkle_hash
+            continue
+        children_merkle_hashes = [merkle_hashes[id(child)] for child in node.children_nodes]
+        merkle_hashes[id(node)] = compute_merkle_hash(get_node_fingerprint(node, config), children_merkle_hashes)
+    return merkle_hashes
+
+
+def compute_state_fingerprint(nodes: Iterable['Node'], config: FingerprintConfig) -> Union[str, None]:
+    """
+    The fingerprint of a screen. It is the hash of the ordered fingerprints of the included nodes, therefore two
+    screens have the same state fingerprint iff `is_in_same_state_with_nodes` considers them in the same state.
+
+    :param nodes: The nodes of the layout in document order
+    :param config: The fingerprint configuration
+    :return: The state fingerprint, or None if no node is included (such states are not equal to any state)
+    """
+    fingerprints = [get_node_fingerprint(node, config) for node in nodes]
+    fingerprints = [x for x in fingerprints if x != EXCLUDED_FINGERPRINT]
+    if len(fingerprints) == 0:
+        return None
+    return _hash(",".join(fingerprints))
+
+
+def find_different_subtrees(nodes1: List['Node'], nodes2: List['Node'],
+                            config: FingerprintConfig) -> List[Tuple[Union['Node', None], Union['Node', None]]]:
+    """
+    Finds the top-most subtrees that are different in two layouts using the merkle hashes. Children are matched
+    by xpath; the subtrees of the matched nodes with the same merkle hash are skipped.
+
+    :param nodes1: The nodes of the first layout in document order
+    :param nodes2: The nodes of the second layout in document order
+    :param config: The fingerprint configuration
+    :return: A list of pairs of the roots of the different subtrees. A pair contains None if the subtree
+             only exists in one of the layouts.
+    """
+    result = []
+    nodes1, nodes2 = list(nodes1), list(nodes2)
+    merkle_hashes = get_merkle_hashes(nodes1, config)
+    merkle_hashes.update(get_merkle_hashes(nodes2, config))
+
+    def top_nodes(nodes: List['Node']) -> List['Node']:
+        node_ids = set(id(node) for node in nodes)
+        return [node for node in nodes if node.parent_node is None or id(node.parent_node) not in node_ids]
+
+    stack = [(top_nodes(nodes1), top_nodes(nodes2))]
+    while len(stack) > 0:
+        children1, children2 = stack.pop()
+        xpath_to_child2 = {child.xpath: child for child in children2}
+        matched_xpaths = set()
+        pairs = []
+        for child1 in children1:
+            child2 = xpath_to_child2.get(child1.xpath, None)
+            if child2 is not None:
+                matched_xpaths.add(child1.xpath)
+            pairs.append((child1, child2))
+        pairs.extend((None, child2) for child2 in children2 if child2.xpath not in matched_xpaths)
+        next_level = []
+        for child1, child2 in pairs:
+            if child1 is None or child2 is None:
+                result.append((child1, child2))
+            elif merkle_hashes[id(child1)] == merkle_hashes[id(child2)]:
+                continue
+            elif get_node_fingerprint(child1, config) != get_node_fingerprint(child2, config):
+                result.append((child1, child2))
+            else:
+                next_level.append((child1.children_nodes, child2.children_nodes))
+        stack.extend(reversed(next_level))
+    return result
+
+
+class StateFingerprintIndex:
+    """
+    A persistent map from the names of snapshots to the state fingerprints of their initial layouts, so a snapshot
+    in the same state as a new screen is found with one lookup. The fingerprints are only valid for one
+    configuration (and the ad rules), which is identified by `key`; a file with another key is ignored.
+    """
+    VERSION = 1
+
+    def __init__(self, path: Union[str, Path], key: str):
+        self.path = Path(path)
+        self.key = key
+        self.fingerprints: Dict[str, Union[str, None]] = {}
+        self._fingerprint_to_names: Dict[str, set] = {}
+
+    @staticmethod
+    def load(path: Union[str, Path], key: str) -> Union['StateFingerprintIndex', None]:
+        """
+        :return: The index, or None if the file does not exist, is corrupted, or has another version or key
+        """
+        try:
+            with open(path) as f:
+                content = json.load(f)
+            if content.get('version', None) != StateFingerprintIndex.VERSION or content.get('key', None) != key:
+                return None
+            index = StateFingerprintIndex(path, key)
+            for name, fingerprint in content['fingerprints'].items():
+                index.add(name, fingerprint)
+            return index
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"The fingerprint index could not be loaded from {path}: {e}")
+            return None
+
+    def save(self) -> None:
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({'version': StateFingerprintIndex.VERSION,
+                       'key': self.key,
+                       'fingerprints': self.fingerprints}, f, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.fingerprints
+
+    def add(self, name: str, fingerprint: Union[str, None]) -> None:
+        self.remove(name)
+        self.fingerprints[name] = fingerprint
+        if fingerprint is not None:
+            self._fingerprint_to_names.setdefault(fingerprint, set()).add(name)
+
+    def remove(self, name: str) -> None:
+        fingerprint = self.fingerprints.pop(name, None)
+        if fingerprint is not None:
+            self._fingerprint_to_names[fingerprint].discard(name)
+            if len(self._fingerprint_to_names[fingerprint]) == 0:
+                del self._fingerprint_to_names[fingerprint]
+
+    def find(self, fingerprint: Union[str, None]) -> Union[str, None]:
+        """
+        :return: The (alphabetically first) name with the fingerprint, or None if there is no such name. A None
+                 fingerprint (a state without any included node) is not equal to any state.
+        """
+        names = self._fingerprint_to_names.get(fingerprint, None) if fingerprint is not None else None
+        return min(names) if names else None
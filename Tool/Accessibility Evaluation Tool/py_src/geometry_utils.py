@@ -0,0 +1,119 @@
+from typing import TYPE_CHECKING, Iterable, Sequence, Tuple, Union
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from GUI_utils import Node
+
+# The batch versions of the bounds operations of GUI_utils and Node. The bounds are given as an Nx4 array of
+# (left, top, right, bottom) rows, the results are the same as calling the single-bounds versions on each row.
+
+Bounds = Tuple[int, int, int, int]
+
+
+def to_bounds_array(items: Union[np.ndarray, Iterable[Bounds], Iterable['Node']]) -> np.ndarray:
+    """
+    Converts bounds, Nodes, or a NodeTable (without copying its bounds column) to an Nx4 array
+    """
+    if isinstance(items, np.ndarray):
+        return items.reshape(-1, 4)
+    if hasattr(items, 'bounds_array'):
+        return items.bounds_array()
+    rows = [x.bounds if hasattr(x, 'bounds') else x for x in items]
+    if len(rows) == 0:
+        return np.zeros((0, 4), dtype=np.int64)
+    return np.asarray(rows, dtype=np.int64).reshape(-1, 4)
+
+
+def areas(bounds: np.ndarray) -> np.ndarray:
+    """
+    The batch version of `Node.area`
+    """
+    bounds = bounds.astype(np.int64)
+    return (bounds[:, 2] - bounds[:, 0]) * (bounds[:, 3] - bounds[:, 1])
+
+
+def valid_bounds_mask(bounds: np.ndarray) -> np.ndarray:
+    """
+    The batch version of `Node.is_valid_bounds`
+    """
+    bounds = bounds.astype(np.int64)
+    widths = bounds[:, 2] - bounds[:, 0]
+    heights = bounds[:, 3] - bounds[:, 1]
+    return (widths * heights > 0) & (widths > 0) & (heights > 0)
+
+
+def containment_matrix(parent_bounds: np.ndarray, child_bounds: np.ndarray) -> np.ndarray:
+    """
+    The batch version of `bounds_included`: the item (i, j) is True iff child_bounds[j] is included in
+    parent_bounds[i].
+    """
+    parents = parent_bounds[:, None, :]
+    children = child_bounds[None, :, :]
+    return (children[..., 2] <= parents[..., 2]) & \
+           (children[..., 3] <= parents[..., 3]) & \
+           (children[..., 1] >= parents[..., 1]) & \
+           (children[..., 0] >= parents[..., 0])
+
+
+def overlap_matrix(bounds1: np.ndarray, bounds2: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The batch version of `calculate_overlap` between each pair of bounds1[i] and bounds2[j].
+
+    :return: An NxMx4 array of the overlaps, and an NxM mask of the pairs that overlap (where
+             `calculate_overlap` does not return None)
+    """
+    first = bounds1[:, None, :]
+    second = bounds2[None, :, :]
+    overlaps = np.concatenate([np.maximum(first[..., :2], second[..., :2]),
+                               np.minimum(first[..., 2:], second[..., 2:])], axis=-1)
+    mask = (overlaps[..., 0] < overlaps[..., 2]) & (overlaps[..., 1] < overlaps[..., 3])
+    return overlaps, mask
+
+
+def out_of_bounds_mask(bounds: np.ndarray, screen_bounds: Bounds) -> np.ndarray:
+    """
+    The batch version of `Node.is_out_of_bounds`
+    """
+    min_x, min_y, max_x, max_y = screen_bounds
+    xs = bounds[:, [0, 2]]
+    ys = bounds[:, [1, 3]]
+    return ((xs > max_x) | (xs < min_x)).any(axis=1) | ((ys > max_y) | (ys < min_y)).any(axis=1)
+
+
+def normalized_bounds(bounds: np.ndarray, screen_bounds: Bounds) -> np.ndarray:
+    """
+    The batch version of `Node.get_normalized_bounds`, the rows of out-of-screen or all-zero bounds are zero
+    """
+    width_divisor = screen_bounds[2] - screen_bounds[0]
+    height_divisor = screen_bounds[3] - screen_bounds[1]
+    result = np.empty(bounds.shape, dtype=np.float64)
+    result[:, [0, 2]] = (bounds[:, [0, 2]] - screen_bounds[0]) / width_divisor
+    result[:, [1, 3]] = (bounds[:, [1, 3]] - screen_bounds[1]) / height_divisor
+    result[out_of_bounds_mask(bounds, screen_bounds) | (bounds == 0).all(axis=1)] = 0.0
+    return result
+
+
+def find_largest_rectangle(rectangles: Sequence[Tuple[int, int, int, int]]) -> Union[int, None]:
+    """
+    Finds the rectangle, represented as (x, y, width, height), with the largest area.
+
+    :return: The index of the first largest rectangle, or None if there is no rectangle
+    """
+    if len(rectangles) == 0:
+        return None
+    rectangles = np.asarray(rectangles, dtype=np.int64).reshape(-1, 4)
+    return int(np.argmax(rectangles[:, 2] * rectangles[:, 3]))
+
+
+def outside_mask(rectangle: Tuple[int, int, int, int], other_rectangles: np.ndarray) -> np.ndarray:
+    """
+    Determines which of the other rectangles are completely outside the rectangle. The rectangles are
+    represented as (x, y, width, height).
+    """
+    right = rectangle[0] + rectangle[2]
+    bottom = rectangle[1] + rectangle[3]
+    other_rights = other_rectangles[:, 0] + other_rectangles[:, 2]
+    other_bottoms = other_rectangles[:, 1] + other_rectangles[:, 3]
+    return (other_rectangles[:, 0] > right) | (other_rectangles[:, 1] > bottom) | \
+           (other_rights < rectangle[0]) | (other_bottoms < rectangle[1])
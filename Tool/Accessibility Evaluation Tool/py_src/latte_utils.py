@@ -6,7 +6,7 @@ from typing import Union, Tuple, List
 
 from adb_utils import read_local_android_file
 from consts import IS_LIVE_TIMEOUT_TIME, DEVICE_NAME
-from shell_utils import run_bash
+from shell_utils import run_adb_shell
 
 logger = logging.getLogger(__name__)
 
@@ -34,8 +34,8 @@ def _encode_latte_message(message: str) -> str:
 async def send_command_to_latte(command: str, extra: str = "NONE", device_name: str = DEVICE_NAME) -> bool:
     logger.debug(f"Sending command {command} with extra {extra} to Latte!")
     extra = _encode_latte_message(extra)
-    bash_cmd = f'adb -s {device_name} shell am broadcast -a {LATTE_INTENT} --es command "{command}" --es extra "{extra}"'
-    r_code, stdout, stderr = await run_bash(bash_cmd)
+    shell_cmd = f'am broadcast -a {LATTE_INTENT} --es command "{command}" --es extra "{extra}"'
+    r_code, stdout, stderr = await run_adb_shell(shell_cmd, device_name=device_name)
     if r_code != 0:
         logger.error(f"Error in sending command {command} with extra {extra}! STDOUT: {stdout} STDERR: {stderr}")
     return r_code == 0
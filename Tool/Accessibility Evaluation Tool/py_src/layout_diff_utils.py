@@ -0,0 +1,250 @@
+import hashlib
+import json
+import logging
+import os
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+from GUI_utils import Node, NodesFactory, ParsedLayoutCache
+from fingerprint_utils import FingerprintConfig, get_merkle_hashes, get_node_fingerprint
+from json_util import JSONSerializable
+
+logger = logging.getLogger(__name__)
+
+# The version of the diff algorithm and format, the cached diffs of other versions are ignored
+LAYOUT_DIFF_VERSION = 2
+# The attributes that are not compared by default, the xpaths are compared by matching the nodes
+DIFF_EXCLUDED_ATTRIBUTES = ['xpath', 'located_by', 'skip', 'action']
+
+
+def get_default_diff_config() -> FingerprintConfig:
+    return FingerprintConfig(excluded_attributes=DIFF_EXCLUDED_ATTRIBUTES, ignore_ads=False)
+
+
+class LayoutDiff(JSONSerializable):
+    """
+    The changes from one layout to another:
+    - inserted: the JSON of the nodes that only exist in the second layout
+    - removed: the JSON of the nodes that only exist in the first layout
+    - moved: the nodes whose xpaths are changed, matched by their identifiers, as dictionaries of
+      'from_xpath', 'to_xpath', and 'changed_attributes'
+    - changed: the nodes with the same xpath whose attributes are changed, as dictionaries of 'xpath' and
+      'changed_attributes'
+    - reordered: the parents whose matched children are in a different order, as dictionaries of 'xpath',
+      'from_order', and 'to_order' (the xpaths of the children)
+    - no_state: whether a layout has no compared node (e.g., it only contains ads); like
+      `is_in_same_state_with_nodes`, such a layout is not in the same state as any layout
+    The changed attributes are maps from the attribute name to the pair of the old and new values.
+    """
+
+    def __init__(self,
+                 inserted: List[dict] = None,
+                 removed: List[dict] = None,
+                 moved: List[dict] = None,
+                 changed: List[dict] = None,
+                 reordered: List[dict] = None,
+                 no_state: bool = False):
+        self.inserted = inserted if inserted is not None else []
+        self.removed = removed if removed is not None else []
+        self.moved = moved if moved is not None else []
+        self.changed = changed if changed is not None else []
+        self.reordered = reordered if reordered is not None else []
+        self.no_state = no_state
+
+    @staticmethod
+    def createFromDict(diff_dict: dict) -> 'LayoutDiff':
+        return LayoutDiff(inserted=diff_dict.get('inserted', []),
+                          removed=diff_dict.get('removed', []),
+                          moved=diff_dict.get('moved', []),
+                          changed=diff_dict.get('changed', []),
+                          reordered=diff_dict.get('reordered', []),
+                          no_state=diff_dict.get('no_state', False))
+
+    def is_empty(self) -> bool:
+        """
+        :return: Whether the layouts are in the same state, i.e., it agrees with `is_in_same_state_with_nodes`
+                 for the same configuration
+        """
+        if self.no_state:
+            return False
+        return sum(self.change_count().values()) == 0
+
+    def change_count(self) -> Dict[str, int]:
+        return {'inserted': len(self.inserted),
+                'removed': len(self.removed),
+                'moved': len(self.moved),
+                'changed': len(self.changed),
+                'reordered': len(self.reordered)}
+
+
+def _changed_attributes(node1: Node, node2: Node, config: FingerprintConfig) -> Dict[str, list]:
+    attributes1 = node1.toJSON(list(config.excluded_attributes) + ['xpath'])
+    attributes2 = node2.toJSON(list(config.excluded_attributes) + ['xpath'])
+    return {key: [attributes1.get(key, None), attributes2.get(key, None)]
+            for key in sorted(set(attributes1) | set(attributes2))
+            if attributes1.get(key, None) != attributes2.get(key, None)}
+
+
+def _identifiers(node: Node) -> Union[Tuple[str, str, str, str], None]:
+    """
+    The key that matches a node to its moved version, or None if the node cannot be identified without its xpath
+    """
+    if not (node.resource_id or node.text or node.content_desc):
+        return None
+    return node.class_name, node.resource_id, node.text, node.content_desc
+
+
+def _subtree(node: Node) -> List[Node]:
+    result = []
+    stack = [node]
+    while len(stack) > 0:
+        current = stack.pop()
+        result.append(current)
+        stack.extend(reversed(current.children_nodes))
+    return result
+
+
+def diff_nodes(nodes1: List[Node], nodes2: List[Node], config: FingerprintConfig = None) -> LayoutDiff:
+    """
+    Computes the changes between the nodes of two layouts (the output of `NodesFactory.build` with xpath pass).
+    The trees are traversed from the top and the children are matched by xpath. A matched pair of nodes with
+    the same merkle hash is an unchanged subtree, so it's skipped, otherwise their fingerprints are compared.
+    Finally, the unmatched nodes (i.e., removed and inserted) with the same identifiers are reported as moved.
+    Therefore, the running time is linear in the size of the changed parts of the layouts. Since the state of
+    a layout is the ordered list of its nodes, swapped siblings (which keep their xpaths if their classes are
+    different) are reported as reordered.
+
+    :param nodes1: The nodes of the first layout in document order
+    :param nodes2: The nodes of the second layout in document order
+    :param config: The fingerprint configuration which determines the compared attributes and the ignored nodes
+    """
+    if config is None:
+        config = get_default_diff_config()
+    nodes1, nodes2 = list(nodes1), list(nodes2)
+    merkle_hashes = get_merkle_hashes(nodes1, config)
+    merkle_hashes.update(get_merkle_hashes(nodes2, config))
+    result = LayoutDiff()
+    result.no_state = not any(config.includes(node) for node in nodes1) \
+        or not any(config.includes(node) for node in nodes2)
+    removed_nodes, inserted_nodes = [], []
+
+    def top_nodes(nodes: List[Node]) -> List[Node]:
+        node_ids = set(id(node) for node in nodes)
+        return [node for node in nodes if node.parent_node is None or id(node.parent_node) not in node_ids]
+
+    stack = [(top_nodes(nodes1), top_nodes(nodes2))]
+    while len(stack) > 0:
+        children1, children2 = stack.pop()
+        xpath_to_child2 = {}
+        for child2 in children2:
+            xpath_to_child2.setdefault(child2.xpath, child2)
+        matched_child2_ids = set()
+        matched_pairs = []
+        next_level = []
+        for child1 in children1:
+            child2 = xpath_to_child2.get(child1.xpath, None)
+            if child2 is None or id(child2) in matched_child2_ids:
+                removed_nodes.extend(_subtree(child1))
+                continue
+            matched_child2_ids.add(id(child2))
+            matched_pairs.append((child1, child2))
+            if merkle_hashes[id(child1)] == merkle_hashes[id(child2)]:
+                continue
+            included1, included2 = config.includes(child1), config.includes(child2)
+            if included1 and included2:
+                if get_node_fingerprint(child1, config) != get_node_fingerprint(child2, config):
+                    result.changed.append({'xpath': child1.xpath,
+                                           'changed_attributes': _changed_attributes(child1, child2, config)})
+            elif included1:
+                removed_nodes.append(child1)
+            elif included2:
+                inserted_nodes.append(child2)
+            next_level.append((child1.children_nodes, child2.children_nodes))
+        for child2 in children2:
+            if id(child2) not in matched_child2_ids:
+                inserted_nodes.extend(_subtree(child2))
+        from_order = [child1.xpath for child1, _ in matched_pairs]
+        to_order = [child2.xpath for child2 in children2 if id(child2) in matched_child2_ids]
+        if from_order != to_order:
+            parent = matched_pairs[0][0].parent_node
+            result.reordered.append({'xpath': parent.xpath if parent is not None else None,
+                                     'from_order': from_order,
+                                     'to_order': to_order})
+        stack.extend(reversed(next_level))
+
+    removed_nodes = [node for node in removed_nodes if config.includes(node)]
+    inserted_nodes = [node for node in inserted_nodes if config.includes(node)]
+    identifiers_to_removed = defaultdict(list)
+    for node in removed_nodes:
+        identifiers = _identifiers(node)
+        if identifiers is not None:
+            identifiers_to_removed[identifiers].append(node)
+    moved_node_ids = set()
+    for node in inserted_nodes:
+        candidates = identifiers_to_removed.get(_identifiers(node), None)
+        if candidates:
+            removed_node = candidates.pop(0)
+            moved_node_ids.add(id(removed_node))
+            result.moved.append({'from_xpath': removed_node.xpath,
+                                 'to_xpath': node.xpath,
+                                 'changed_attributes': _changed_attributes(removed_node, node, config)})
+        else:
+            result.inserted.append(node.toJSON())
+    result.removed = [node.toJSON() for node in removed_nodes if id(node) not in moved_node_ids]
+    return result
+
+
+def build_diff_nodes(layout: str, config: FingerprintConfig) -> List[Node]:
+    return NodesFactory() \
+        .with_layout(layout) \
+        .with_xpath_pass() \
+        .with_ad_detection() \
+        .with_fingerprint_pass(config) \
+        .with_cache(shared=True) \
+        .build()
+
+
+def diff_layouts(layout1: str, layout2: str, config: FingerprintConfig = None) -> LayoutDiff:
+    if config is None:
+        config = get_default_diff_config()
+    return diff_nodes(build_diff_nodes(layout1, config), build_diff_nodes(layout2, config), config)
+
+
+def diff_layout_paths(layout_path1: Union[str, Path],
+                      layout_path2: Union[str, Path],
+                      config: FingerprintConfig = None,
+                      cache_dir: Union[str, Path] = None) -> LayoutDiff:
+    """
+    Computes the diff of two layout files. If `cache_dir` is given, the diff is stored in it, keyed by the
+    content hashes of the layouts and the configuration, and it's reused for the same pair of layouts.
+    """
+    if config is None:
+        config = get_default_diff_config()
+    with open(layout_path1, "r") as f:
+        layout1 = f.read()
+    with open(layout_path2, "r") as f:
+        layout2 = f.read()
+    cache_path = None
+    if cache_dir is not None:
+        key = f"{LAYOUT_DIFF_VERSION}|{ParsedLayoutCache.hash_layout(layout1)}|" \
+              f"{ParsedLayoutCache.hash_layout(layout2)}|{json.dumps(config.key())}"
+        key_hash = hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+        cache_path = Path(cache_dir).joinpath(f"{key_hash}.json")
+        if cache_path.exists():
+            try:
+                with open(cache_path) as f:
+                    return LayoutDiff.createFromDict(json.load(f))
+            except Exception as e:
+                logger.warning(f"The cached layout diff {cache_path} could not be loaded: {e}")
+    layout_diff = diff_layouts(layout1, layout2, config)
+    if cache_path is not None:
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "w") as f:
+                f.write(layout_diff.toJSONStr())
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            logger.warning(f"The layout diff could not be cached in {cache_path}: {e}")
+    return layout_diff
@@ -0,0 +1,104 @@
+import json
+import logging
+from pathlib import Path
+from typing import List, Tuple, Union
+
+from GUI_utils import Node, NodesFactory
+
+logger = logging.getLogger(__name__)
+
+# The attributes of a node that can be patched from the Element of a WindowContentChange event, and their keys
+# in the Element's JSON
+PATCHABLE_ATTRIBUTES = {'text': ['text'],
+                        'content_desc': ['content_desc', 'content-desc'],
+                        'bounds': ['bounds']}
+
+
+def get_window_content_changes(event_log_message: str) -> Union[List[dict], None]:
+    """
+    Extracts the changed Elements of the active window from the WindowContentChange events of the log.
+
+    :return: The JSON of the changed Elements, or None if a change of the active window does not have an
+             Element or cannot be parsed (i.e., the changes are not known)
+    """
+    elements = []
+    for line in event_log_message.split("\n"):
+        if "WindowContentChange:" not in line:
+            continue
+        try:
+            change_part = json.loads(line.split("WindowContentChange:")[1].strip())
+        except Exception as e:
+            logger.warning(f"Problem in parsing WindowContentChange: '{e}'")
+            return None
+        if not change_part or change_part.get('changedWindowId', -2) != change_part.get('activeWindowId', -3):
+            continue
+        if not change_part.get('Element', None):
+            return None
+        elements.append(change_part['Element'])
+    return elements
+
+
+class LiveLayout:
+    """
+    A mutable, in-memory copy of the nodes of the current screen, which is kept up to date by patching the nodes
+    with the Elements of WindowContentChange events instead of capturing and parsing the whole layout again.
+    An Element only contains the attributes of one widget, so only the leaves whose class and resource id
+    are unchanged can be patched; other changes require a full capture (see `apply_changes`).
+    """
+
+    def __init__(self, nodes: List[Node]):
+        self.nodes = nodes
+        self.xpath_to_node = {}
+        for node in nodes:
+            self.xpath_to_node.setdefault(node.xpath, node)
+        self.patch_count = 0
+
+    @staticmethod
+    def from_layout(layout: str) -> 'LiveLayout':
+        # The cache returns copies of the nodes, so they can be patched
+        return LiveLayout(NodesFactory()
+                          .with_layout(layout)
+                          .with_xpath_pass()
+                          .with_ad_detection()
+                          .with_cache()
+                          .build())
+
+    @staticmethod
+    def from_layout_path(layout_path: Union[str, Path]) -> 'LiveLayout':
+        with open(layout_path, encoding='utf-8') as f:
+            return LiveLayout.from_layout(f.read())
+
+    def _match(self, element: dict) -> Union[Tuple[Node, Node], None]:
+        changed_node = Node.createNodeFromDict(element)
+        node = self.xpath_to_node.get(changed_node.xpath, None) if changed_node.xpath else None
+        if node is None or len(node.children_nodes) > 0:
+            return None
+        if node.class_name != changed_node.class_name or node.resource_id != changed_node.resource_id:
+            return None
+        return node, changed_node
+
+    def apply_changes(self, elements: List[dict]) -> Union[List[Node], None]:
+        """
+        Patches the nodes with the changed Elements. The patch is applied only if all Elements can be applied,
+        otherwise the nodes are not changed.
+
+        :param elements: The output of `get_window_content_changes`
+        :return: The patched nodes, or None if the changes cannot be applied and the layout should be captured
+        """
+        if elements is None or len(elements) == 0:
+            return None
+        matches = []
+        for element in elements:
+            match = self._match(element)
+            if match is None:
+                logger.debug(f"The change cannot be patched: {element}")
+                return None
+            matches.append((element, match))
+        patched_nodes = []
+        for element, (node, changed_node) in matches:
+            for attr, keys in PATCHABLE_ATTRIBUTES.items():
+                if any(key in element for key in keys):
+                    setattr(node, attr, getattr(changed_node, attr))
+            patched_nodes.append(node)
+        self.patch_count += 1
+        return patched_nodes
@@ -11,6 +11,7 @@ from consts import DEVICE_NAME, ADB_HOST, ADB_PORT
 from ppadb.client_async import ClientAsync as AdbClient
 
 from controller import create_controller
+from device_pool import DevicePool
 from results_utils import AddressBook
 from logger_utils import ColoredFormatter, initialize_logger
 from snapshot import EmulatorSnapshot, DeviceSnapshot, Snapshot
@@ -22,6 +23,7 @@ from task.far_off_elements_task import AnalyzeSnapshotActionTask
 from task.perform_actions_task import PerformActionsTask
 from task.process_screenshot_task import ProcessScreenshotTask
 from task.analyze_snapshot import AnalyzeSnapshotIssuesTask
+from ui_idle_utils import get_wait_report, reset_wait_report
 from utils import synch_run
 
 logger = logging.getLogger(__name__)
@@ -49,7 +51,16 @@ async def execute_snapshot_task(args, address_book: AddressBook):
             await ExtractActionsTask(snapshot).execute()
         elif args.snapshot_task == "perform_actions":
             logger.info("Snapshot Task: Perform Actions")
-            await PerformActionsTask(snapshot).execute()
+            device_pool = None
+            if args.devices:
+                serials = [args.device] + [x for x in args.devices.split(",") if x and x != args.device]
+                if not args.initial_load:
+                    logger.warning("The other devices load the AVD snapshot, use --initial-load to have the same state")
+                device_pool = await DevicePool.connect(serials, adb_host=args.adb_host, adb_port=args.adb_port)
+            await PerformActionsTask(snapshot,
+                                     device_pool=device_pool,
+                                     resume=args.resume,
+                                     strict_reload=args.strict_reload).execute()
         elif args.snapshot_task == "create_action_gif":
             logger.info("Snapshot Task: Create Action Gif")
             await CreateActionGifTask(snapshot).execute()
@@ -58,14 +69,14 @@ async def execute_snapshot_task(args, address_book: AddressBook):
             await ProcessScreenshotTask(snapshot).execute()
         elif args.snapshot_task == "analyze_adscreen":
             logger.info("Snapshot Task: Analyze Ad Screen")
-            await AnalyzeAdScreenTask(snapshot).execute(args.har_path)
+            await AnalyzeAdScreenTask(snapshot, incremental=args.incremental).execute(args.har_path)
         elif args.snapshot_task == 'analyze_snapshot':
             if args.extra is not None:
-                await AnalyzeSnapshotIssuesTask(snapshot).execute(mode=args.extra)
+                await AnalyzeSnapshotIssuesTask(snapshot, incremental=args.incremental).execute(mode=args.extra)
                 specified_index = list(map(int, args.extra.split(",")))
-                await AnalyzeSnapshotIssuesTask(snapshot).execute(required_actions = specified_index)
+                await AnalyzeSnapshotIssuesTask(snapshot, incremental=args.incremental).execute(required_actions = specified_index)
             else:
-                await AnalyzeSnapshotIssuesTask(snapshot).execute()
+                await AnalyzeSnapshotIssuesTask(snapshot, incremental=args.incremental).execute()
 
     except Exception as e:
         logger.error("Exception happened in analyzing the snapshot", exc_info=e)
@@ -115,7 +126,11 @@ if __name__ == "__main__":
     parser.add_argument('--initial-load', action='store_true', help='If the device is an emulator, loads the snapshot initially')
     parser.add_argument('--no-save-snapshot', action='store_true', help='If the device is an emulator, does not save any extra snapshot')
     parser.add_argument('--device', type=str, default=DEVICE_NAME, help='The device name')
+    parser.add_argument('--devices', type=str, default=None, help='Comma-separated names of other emulators of the same AVD to perform the actions in parallel')
+    parser.add_argument('--resume', action='store_true', help='Continue the perform actions task from the first incomplete action of the previous execution')
+    parser.add_argument('--strict-reload', action='store_true', help='Reload the snapshot before every action, even if the previous action did not change the state')
     parser.add_argument('--extra', type=str, default=None, help='Extra information for tasks')
+    parser.add_argument('--incremental', action='store_true', help='Patch the nodes from window content changes instead of capturing the state when possible')
     parser.add_argument('--adb-host', type=str, default=ADB_HOST, help='The host address of ADB')
     parser.add_argument('--adb-port', type=int, default=ADB_PORT, help='The port number of ADB')
     parser.add_argument('--debug', action='store_true')
@@ -140,13 +155,20 @@ if __name__ == "__main__":
             exit(1)
         for snapshot_result_path in snapshot_result_paths:
             snapshot_name = snapshot_result_path.name
+            if args.resume and args.snapshot_task == "perform_actions":
+                progress = AddressBook(snapshot_result_path).read_perform_actions_progress()
+                if progress is not None and progress['finished']:
+                    print(f"The actions of Snapshot '{snapshot_name}' are already performed!")
+                    continue
             log_path_name = f"{snapshot_name}_{args.snapshot_task}.log"
             log_path = app_result_path.joinpath(log_path_name)
 
             initialize_logger(log_path=log_path, quiet=args.quiet, debug=args.debug)
             logger.info(f"Executing {args.snapshot_task} for Snapshot '{snapshot_name}' in app '{args.app_name}'...")
             address_book = AddressBook(snapshot_result_path)
+            reset_wait_report()
             synch_run(execute_snapshot_task(args=args, address_book=address_book))
+            logger.info(f"UI waiting times: {get_wait_report()}")
             logger.info(f"Done executing {args.snapshot_task} for Snapshot '{snapshot_name}' in app '{args.app_name}'")
     elif args.app_task is not None:
         if not app_result_path.exists() or not app_result_path.is_dir():
@@ -154,7 +176,9 @@ if __name__ == "__main__":
         log_path = app_result_path.joinpath(f"app_{args.app_task}.log")
         initialize_logger(log_path=log_path, quiet=args.quiet, debug=args.debug)
         logger.info(f"Executing {args.app_task} for app '{args.app_name}'...")
+        reset_wait_report()
         synch_run(execute_app_task(args=args, app_path=app_result_path))
+        logger.info(f"UI waiting times: {get_wait_report()}")
         logger.info(f"Done executing {args.app_task}  in app '{args.app_name}'")
     else:
         print("Either app_task or snapshot_task should be provided!")
@@ -0,0 +1,118 @@
+from collections import defaultdict
+from typing import Dict, List, Sequence, Tuple
+
+from GUI_utils import Node, simplify_xpath
+
+Identifiers = Tuple[str, str, str, str]
+
+
+def get_identifiers(node: Node) -> Identifiers:
+    """
+    The attributes that identify a node regardless of its position, used to match the nodes reported by TalkBack
+    """
+    return node.class_name, node.resource_id, node.content_desc, node.text
+
+
+class XPathTrie:
+    """
+    A trie over the segments of xpaths (e.g., '/A/B[2]' has the segments 'A' and 'B[2]'). Each trie node keeps the
+    positions of the nodes with its xpath, so the nodes under an xpath are found without scanning all xpaths.
+    """
+
+    def __init__(self):
+        self.children: Dict[str, 'XPathTrie'] = {}
+        self.positions: List[int] = []
+
+    def add(self, xpath: str, position: int) -> None:
+        trie = self
+        for segment in xpath[1:].split("/") if xpath.startswith("/") else [xpath]:
+            if segment not in trie.children:
+                trie.children[segment] = XPathTrie()
+            trie = trie.children[segment]
+        trie.positions.append(position)
+
+    def _subtree_positions(self) -> List[int]:
+        positions = []
+        stack = [self]
+        while len(stack) > 0:
+            trie = stack.pop()
+            positions.extend(trie.positions)
+            stack.extend(trie.children.values())
+        return positions
+
+    def find_prefix(self, prefix: str) -> List[int]:
+        """
+        The positions of the xpaths that start with `prefix`, in no specific order. The prefix does not need to
+        end at a segment boundary, e.g., '/A/B[' matches '/A/B[1]/C' and '/A/B[2]'.
+        """
+        if not prefix.startswith("/"):
+            return [] if prefix else self._subtree_positions()
+        *segments, last_segment = prefix[1:].split("/")
+        trie = self
+        for segment in segments:
+            trie = trie.children.get(segment, None)
+            if trie is None:
+                return []
+        positions = []
+        for segment, child in trie.children.items():
+            if segment.startswith(last_segment):
+                positions.extend(child._subtree_positions())
+        return positions
+
+
+class NodeIndexes:
+    """
+    Secondary indexes over the nodes of a layout (e.g., the nodes of a Snapshot) in document order. Each index is
+    built on its first query, and the query results are in document order.
+    """
+
+    def __init__(self, nodes: Sequence[Node]):
+        self.nodes = nodes
+        self._identifiers_index = None
+        self._simplified_xpath_index = None
+        self._resource_id_index = None
+        self._xpath_trie = None
+
+    def _build_index(self, key_function) -> Dict[object, List[int]]:
+        index = defaultdict(list)
+        for position, node in enumerate(self.nodes):
+            index[key_function(node)].append(position)
+        return dict(index)
+
+    def _get_nodes(self, positions: List[int]) -> List[Node]:
+        return [self.nodes[position] for position in positions]
+
+    def get_nodes_by_identifiers(self, class_name: str, resource_id: str, content_desc: str, text: str) \
+            -> List[Node]:
+        if self._identifiers_index is None:
+            self._identifiers_index = self._build_index(get_identifiers)
+        return self._get_nodes(self._identifiers_index.get((class_name, resource_id, content_desc, text), []))
+
+    def get_nodes_by_simplified_xpath(self, xpath: str) -> List[Node]:
+        """
+        The nodes whose xpaths are the same as `xpath` without the indices (see `simplify_xpath`)
+        """
+        if self._simplified_xpath_index is None:
+            self._simplified_xpath_index = self._build_index(lambda node: simplify_xpath(node.xpath))
+        return self._get_nodes(self._simplified_xpath_index.get(simplify_xpath(xpath), []))
+
+    def get_nodes_by_resource_id(self, resource_id: str) -> List[Node]:
+        if self._resource_id_index is None:
+            self._resource_id_index = self._build_index(lambda node: node.resource_id)
+        return self._get_nodes(self._resource_id_index.get(resource_id, []))
+
+    def get_nodes_with_xpath_prefix(self, prefix: str) -> List[Node]:
+        """
+        The nodes whose xpaths start with `prefix`
+        """
+        if self._xpath_trie is None:
+            self._xpath_trie = XPathTrie()
+            for position, node in enumerate(self.nodes):
+                self._xpath_trie.add(node.xpath, position)
+        return self._get_nodes(sorted(self._xpath_trie.find_prefix(prefix)))
+
+    def get_similar_nodes(self, node: Node) -> List[Node]:
+        """
+        The nodes with the same simplified xpath and resource id as `node` (see `Node.almost_same_xpath`)
+        """
+        return [x for x in self.get_nodes_by_simplified_xpath(node.xpath) if x.resource_id == node.resource_id]
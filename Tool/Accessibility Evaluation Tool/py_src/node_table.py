@@ -0,0 +1,568 @@
+import json
+import logging
+import struct
+import sys
+import weakref
+from array import array
+from pathlib import Path
+from collections.abc import MutableMapping, Sequence
+from typing import Dict, Iterable, Iterator, List, Set, Tuple, Union
+
+import numpy as np
+from cachetools import LRUCache
+
+from GUI_utils import Node
+
+logger = logging.getLogger(__name__)
+
+# The boolean attributes of Node which are stored as bits in NodeTable's flags column
+FLAG_ATTRIBUTES = ['visible', 'clickable', 'long_clickable', 'checkable', 'checked', 'enabled', 'focusable',
+                   'focused', 'invalid', 'clickable_span', 'context_clickable', 'naf', 'important_for_accessibility',
+                   'covered', 'is_ad']
+FLAG_BITS = {attr: 1 << i for i, attr in enumerate(FLAG_ATTRIBUTES)}
+PRACTICALLY_INVISIBLE_BIT = 1 << len(FLAG_ATTRIBUTES)
+# The xpath of the node is not an extension of its parent's xpath, the segment column contains the whole xpath
+FULL_XPATH_BIT = PRACTICALLY_INVISIBLE_BIT << 1
+
+# The attributes of Node which are used by Latte commands and can be changed, with their default values. They are
+# kept by NodeTable only for the nodes whose values are changed.
+COMMAND_ATTRIBUTES = {'located_by': 'xpath', 'skip': False, 'action': 'click'}
+
+# The string attributes of Node which are stored as indices to NodeTable's string pool
+STRING_ATTRIBUTES = ['class_name', 'text', 'resource_id', 'content_desc', 'pkg_name', 'live_region']
+
+# The persisted NodeTable file starts with the magic, the format version, and the (16 bytes) hash of its source.
+# Then, the numbers of nodes, strings, action lists, and text description lists are followed by the little-endian
+# columns.
+NODE_TABLE_MAGIC = b"LTNT"
+NODE_TABLE_VERSION = 2
+NODE_TABLE_HEADER = struct.Struct("<4sI16sIIII")
+
+
+class NodeTable(Sequence):
+    """
+    A compact, read-only representation of the Nodes of one layout. Instead of one Python object per node, the
+    attributes are kept in typed columns (bounds as an Nx4 int32 array, boolean attributes as a bitfield,
+    parent/children as indices, and strings as indices to an interned pool). The xpath of a node is stored as
+    the last segment of the xpath, the full xpath is constructed from the parent. The text description of each
+    node (see `get_text_description`) and the height of its subtree are computed once when the table is created.
+    Accessing an item creates a :class:`NodeView`, which behaves like a `Node`.
+    """
+
+    def __init__(self):
+        self.bounds = array('i')
+        self.flags = array('I')
+        self.parents = array('i')
+        self.first_children = array('i')
+        self.next_siblings = array('i')
+        self.indices = array('i')
+        self.drawing_orders = array('i')
+        self.a11y_actions = array('i')
+        self.xpath_segments = array('i')
+        self.heights = array('i')
+        self.text_descriptions = array('i')
+        self.string_columns = {attr: array('i') for attr in STRING_ATTRIBUTES}
+        self.strings = []
+        self.action_lists = []
+        self.description_lists = []
+        self._string_ids = {}
+        self._action_list_ids = {}
+        self._description_list_ids = {}
+        self._full_xpaths = {}
+        self._blocked_positions = LRUCache(maxsize=8)
+        self._views = weakref.WeakValueDictionary()
+        # The changed command attributes (see COMMAND_ATTRIBUTES) of the nodes by their positions
+        self.command_attributes: Dict[int, Dict[str, object]] = {}
+        self._xpath_to_node = None
+
+    @staticmethod
+    def from_nodes(nodes: List[Node]) -> 'NodeTable':
+        """
+        Creates a NodeTable from the output of `NodesFactory.build`, i.e., a list of nodes in document order
+        where the parent of each node (if it is in the list) comes before the node.
+        """
+        table = NodeTable()
+        position_map = {}
+        last_children = {}
+        for position, node in enumerate(nodes):
+            position_map[id(node)] = position
+            parent_position = position_map.get(id(node.parent_node), -1)
+            table.parents.append(parent_position)
+            table.first_children.append(-1)
+            table.next_siblings.append(-1)
+            if parent_position in last_children:
+                table.next_siblings[last_children[parent_position]] = position
+            elif parent_position != -1:
+                table.first_children[parent_position] = position
+            last_children[parent_position] = position
+
+            table.bounds.extend(node.bounds)
+            table.indices.append(node.index)
+            table.drawing_orders.append(node.drawing_order)
+            table.a11y_actions.append(table._intern_action_list(node.a11y_actions))
+            for attr in STRING_ATTRIBUTES:
+                table.string_columns[attr].append(table._intern(getattr(node, attr)))
+            flags = 0
+            for attr, bit in FLAG_BITS.items():
+                if getattr(node, attr):
+                    flags |= bit
+            if node.is_practically_invisible():
+                flags |= PRACTICALLY_INVISIBLE_BIT
+            parent_xpath = nodes[parent_position].xpath if parent_position != -1 else ""
+            if node.xpath.startswith(parent_xpath + "/") and "/" not in node.xpath[len(parent_xpath) + 1:]:
+                table.xpath_segments.append(table._intern(node.xpath[len(parent_xpath) + 1:]))
+            else:
+                flags |= FULL_XPATH_BIT
+                table.xpath_segments.append(table._intern(node.xpath))
+                table._full_xpaths[node.xpath] = position
+            table.flags.append(flags)
+        table._compute_text_descriptions()
+        # The interning maps are only needed while building the table
+        table._string_ids = {}
+        table._action_list_ids = {}
+        table._description_list_ids = {}
+        return table
+
+    def _compute_text_descriptions(self) -> None:
+        """
+        Computes the heights and the (unlimited depth) text descriptions of all nodes bottom-up. The children
+        come after their parent in document order, so they're computed before the parent in the reverse order.
+        """
+        node_count = len(self)
+        self.heights = array('i', [0] * node_count)
+        descriptions = [()] * node_count
+        for position in range(node_count - 1, -1, -1):
+            content_desc = self.get_string('content_desc', position)
+            text = self.get_string('text', position)
+            children = self.get_children_positions(position)
+            if children:
+                self.heights[position] = 1 + max(self.heights[child] for child in children)
+            if content_desc:
+                descriptions[position] = (content_desc,)
+            elif text:
+                descriptions[position] = (text,)
+            else:
+                descriptions[position] = tuple(x.strip() for child in children for x in descriptions[child]
+                                               if len(x.strip()) > 0)
+        self.text_descriptions = array('i', [self._intern_description_list(x) for x in descriptions])
+
+    def _columns(self) -> List[array]:
+        """
+        The columns in the order they're persisted
+        """
+        return [self.bounds, self.flags, self.parents, self.first_children, self.next_siblings, self.indices,
+                self.drawing_orders, self.a11y_actions, self.xpath_segments, self.heights, self.text_descriptions] + \
+               [self.string_columns[attr] for attr in STRING_ATTRIBUTES]
+
+    def save(self, path: Union[str, Path], source_hash: bytes) -> None:
+        """
+        Writes the table to a binary file, which can be loaded by `NodeTable.load` as long as the source
+        (e.g., the layout and the passes) has the same hash.
+
+        :param path: The path of the file
+        :param source_hash: 16 bytes that identify the source of the table
+        """
+        encoded_strings = [x.encode('utf-8') for x in self.strings]
+        string_lengths = array('I', [len(x) for x in encoded_strings])
+        action_list_lengths = array('I', [len(x) for x in self.action_lists])
+        action_list_values = array('i', [action for x in self.action_lists for action in x])
+        description_list_lengths = array('I', [len(x) for x in self.description_lists])
+        description_list_values = array('i', [string_id for x in self.description_lists for string_id in x])
+        arrays = self._columns() + [string_lengths, action_list_lengths, action_list_values,
+                                    description_list_lengths, description_list_values]
+        with open(path, "wb") as f:
+            f.write(NODE_TABLE_HEADER.pack(NODE_TABLE_MAGIC, NODE_TABLE_VERSION, source_hash, len(self),
+                                           len(self.strings), len(self.action_lists), len(self.description_lists)))
+            for column in arrays:
+                if sys.byteorder == 'big':
+                    column = array(column.typecode, column)
+                    column.byteswap()
+                f.write(column.tobytes())
+            f.write(b"".join(encoded_strings))
+
+    @staticmethod
+    def load(path: Union[str, Path], source_hash: bytes) -> Union['NodeTable', None]:
+        """
+        Reads a table written by `save`.
+
+        :return: The table, or None if the file does not exist, is corrupted, has another version,
+                 or its source hash is different
+        """
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+            magic, version, saved_hash, node_count, string_count, action_list_count, description_list_count = \
+                NODE_TABLE_HEADER.unpack_from(content)
+            if magic != NODE_TABLE_MAGIC or version != NODE_TABLE_VERSION or saved_hash != source_hash:
+                return None
+            table = NodeTable()
+            string_lengths = array('I')
+            action_list_lengths = array('I')
+            action_list_values = array('i')
+            description_list_lengths = array('I')
+            description_list_values = array('i')
+            offset = NODE_TABLE_HEADER.size
+
+            def read_array(column: array, count: int) -> None:
+                nonlocal offset
+                end = offset + count * column.itemsize
+                if end > len(content):
+                    raise ValueError("The file is truncated")
+                column.frombytes(content[offset:end])
+                if sys.byteorder == 'big':
+                    column.byteswap()
+                offset = end
+
+            read_array(table.bounds, 4 * node_count)
+            for column in table._columns()[1:]:
+                read_array(column, node_count)
+            read_array(string_lengths, string_count)
+            read_array(action_list_lengths, action_list_count)
+            read_array(action_list_values, sum(action_list_lengths))
+            read_array(description_list_lengths, description_list_count)
+            read_array(description_list_values, sum(description_list_lengths))
+            for length in string_lengths:
+                table.strings.append(content[offset:offset + length].decode('utf-8'))
+                offset += length
+            if offset != len(content):
+                raise ValueError("The file has extra content")
+            start = 0
+            for length in action_list_lengths:
+                table.action_lists.append(tuple(action_list_values[start:start + length]))
+                start += length
+            start = 0
+            for length in description_list_lengths:
+                table.description_lists.append(tuple(description_list_values[start:start + length]))
+                start += length
+            for position in range(node_count):
+                if table.has_flag(position, FULL_XPATH_BIT):
+                    table._full_xpaths[table.strings[table.xpath_segments[position]]] = position
+            return table
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"The node table could not be loaded from {path}: {e}")
+            return None
+
+    def _intern(self, value: str) -> int:
+        if value not in self._string_ids:
+            self._string_ids[value] = len(self.strings)
+            self.strings.append(value)
+        return self._string_ids[value]
+
+    def _intern_action_list(self, a11y_actions: List[int]) -> int:
+        key = tuple(a11y_actions)
+        if key not in self._action_list_ids:
+            self._action_list_ids[key] = len(self.action_lists)
+            self.action_lists.append(key)
+        return self._action_list_ids[key]
+
+    def _intern_description_list(self, description: Tuple[str, ...]) -> int:
+        key = tuple(self._intern(x) for x in description)
+        if key not in self._description_list_ids:
+            self._description_list_ids[key] = len(self.description_lists)
+            self.description_lists.append(key)
+        return self._description_list_ids[key]
+
+    def __len__(self) -> int:
+        return len(self.parents)
+
+    def __getitem__(self, position: Union[int, slice]) -> Union['NodeView', List['NodeView']]:
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if position < 0 or position >= len(self):
+            raise IndexError(f"NodeTable index out of range: {position}")
+        view = self._views.get(position)
+        if view is None:
+            view = NodeView(self, position)
+            self._views[position] = view
+        return view
+
+    def __iter__(self) -> Iterator['NodeView']:
+        for position in range(len(self)):
+            yield self[position]
+
+    def get_string(self, attr: str, position: int) -> str:
+        return self.strings[self.string_columns[attr][position]]
+
+    def get_bounds(self, position: int) -> Tuple[int, int, int, int]:
+        return tuple(self.bounds[4 * position: 4 * position + 4])
+
+    def bounds_array(self) -> np.ndarray:
+        """
+        The bounds column as an Nx4 array (a read-only view, without copying), to be used by geometry_utils
+        """
+        return np.frombuffer(self.bounds, dtype=np.int32).reshape(-1, 4)
+
+    def has_flag(self, position: int, bit: int) -> bool:
+        return (self.flags[position] & bit) != 0
+
+    def get_children_positions(self, position: int) -> List[int]:
+        children = []
+        child = self.first_children[position] if position != -1 else (0 if len(self) > 0 else -1)
+        while child != -1:
+            children.append(child)
+            child = self.next_siblings[child]
+        return children
+
+    def get_xpath(self, position: int) -> str:
+        segments = []
+        while position != -1:
+            segment = self.strings[self.xpath_segments[position]]
+            if self.has_flag(position, FULL_XPATH_BIT):
+                segments.append(segment)
+                break
+            segments.append("/" + segment)
+            position = self.parents[position]
+        return "".join(reversed(segments))
+
+    def find_xpath(self, xpath: str) -> int:
+        """
+        Finds the position of the node with the given xpath by following the xpath's segments from the top.
+
+        :return: The position of the node, or -1 if there is no such node
+        """
+        if xpath in self._full_xpaths:
+            return self._full_xpaths[xpath]
+        if not xpath.startswith("/"):
+            return -1
+        position = -1
+        for segment in xpath[1:].split("/"):
+            next_position = -1
+            for child in self.get_children_positions(position):
+                if not self.has_flag(child, FULL_XPATH_BIT) and self.strings[self.xpath_segments[child]] == segment:
+                    next_position = child
+                    break
+            if next_position == -1:
+                return -1
+            position = next_position
+        return position
+
+    def _get_blocked_positions(self, excluded_xpaths: Set[str]) -> Set[int]:
+        """
+        The positions of the nodes that have an excluded descendant, i.e., whose precomputed text descriptions
+        cannot be used when the xpaths are excluded
+        """
+        key = frozenset(excluded_xpaths)
+        if key not in self._blocked_positions:
+            blocked_positions = set()
+            for position in range(len(self)):
+                if self.get_xpath(position) in key:
+                    parent = self.parents[position]
+                    while parent != -1 and parent not in blocked_positions:
+                        blocked_positions.add(parent)
+                        parent = self.parents[parent]
+            self._blocked_positions[key] = blocked_positions
+        return self._blocked_positions[key]
+
+    def get_text_description(self, position: int, depth: int = 1000, excluded_xpaths: Iterable[str] = None) \
+            -> List[str]:
+        """
+        The text description of a node like TalkBack: its content description, otherwise its text, otherwise the
+        text descriptions of its children up to `depth` levels, skipping the children with excluded xpaths.
+        The precomputed description is returned if neither the depth limit nor the excluded xpaths affect it.
+        """
+        excluded_xpaths = set(excluded_xpaths) if excluded_xpaths else set()
+        blocked_positions = self._get_blocked_positions(excluded_xpaths) if excluded_xpaths else set()
+        return self._get_text_description(position, depth, excluded_xpaths, blocked_positions)
+
+    def _get_text_description(self, position: int, depth: int, excluded_xpaths: Set[str],
+                              blocked_positions: Set[int]) -> List[str]:
+        if depth <= 0:
+            return []
+        if depth > self.heights[position] and position not in blocked_positions:
+            return [self.strings[x] for x in self.description_lists[self.text_descriptions[position]]]
+        content_desc = self.get_string('content_desc', position)
+        if content_desc:
+            return [content_desc]
+        text = self.get_string('text', position)
+        if text:
+            return [text]
+        text_description = []
+        for child in self.get_children_positions(position):
+            if excluded_xpaths and self.get_xpath(child) in excluded_xpaths:
+                continue
+            text_description.extend(self._get_text_description(child, depth - 1, excluded_xpaths, blocked_positions))
+        return [x.strip() for x in text_description if len(x.strip()) > 0]
+
+    @property
+    def xpath_to_node(self) -> 'XPathToNodeMap':
+        if self._xpath_to_node is None:
+            self._xpath_to_node = XPathToNodeMap(self)
+        return self._xpath_to_node
+
+    def memory_size(self) -> int:
+        """
+        The approximate number of bytes used by the columns and the pools (excluding views)
+        """
+        size = sum(column.itemsize * len(column) for column in self._columns())
+        size += sum(len(x) + 49 for x in self.strings) + 8 * len(self.strings)
+        size += sum(8 * len(x) + 40 for x in self.action_lists) + 8 * len(self.action_lists)
+        size += sum(8 * len(x) + 40 for x in self.description_lists) + 8 * len(self.description_lists)
+        return size
+
+
+class XPathToNodeMap(MutableMapping):
+    """
+    A map from xpath to NodeView, backed by a NodeTable. Like the dict it replaces, items can be assigned and
+    deleted; the changes are kept in the map and the table is not modified.
+    """
+
+    def __init__(self, table: NodeTable):
+        self.table = table
+        self._assigned: Dict[str, Node] = {}
+        self._deleted: Set[str] = set()
+
+    def __getitem__(self, xpath: str) -> Node:
+        if xpath in self._assigned:
+            return self._assigned[xpath]
+        position = self.table.find_xpath(xpath) if xpath not in self._deleted else -1
+        if position == -1:
+            raise KeyError(xpath)
+        return self.table[position]
+
+    def __setitem__(self, xpath: str, node: Node) -> None:
+        self._assigned[xpath] = node
+
+    def __delitem__(self, xpath: str) -> None:
+        if xpath not in self:
+            raise KeyError(xpath)
+        self._assigned.pop(xpath, None)
+        if self.table.find_xpath(xpath) != -1:
+            self._deleted.add(xpath)
+
+    def __contains__(self, xpath) -> bool:
+        if not isinstance(xpath, str):
+            return False
+        return xpath in self._assigned or (xpath not in self._deleted and self.table.find_xpath(xpath) != -1)
+
+    def __iter__(self) -> Iterator[str]:
+        seen = set()
+        for position in range(len(self.table)):
+            xpath = self.table.get_xpath(position)
+            if xpath not in seen and xpath not in self._deleted:
+                seen.add(xpath)
+                yield xpath
+        for xpath in self._assigned:
+            if xpath not in seen:
+                seen.add(xpath)
+                yield xpath
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+def _string_property(attr: str) -> property:
+    return property(lambda self: self.table.get_string(attr, self.position))
+
+
+def _flag_property(bit: int) -> property:
+    return property(lambda self: self.table.has_flag(self.position, bit))
+
+
+def _command_property(attr: str) -> property:
+    def getter(self):
+        return self.table.command_attributes.get(self.position, {}).get(attr, COMMAND_ATTRIBUTES[attr])
+
+    def setter(self, value):
+        self.table.command_attributes.setdefault(self.position, {})[attr] = value
+
+    return property(getter, setter)
+
+
+class NodeView(Node):
+    """
+    A Node facade over one row of a NodeTable. The layout attributes are read-only, the attributes used
+    by Latte commands (`located_by`, `skip`, and `action`) can be changed on the view; they are stored in the
+    table, so they outlive the view.
+    """
+
+    def __init__(self, table: NodeTable, position: int):
+        # Node's constructor is not called, the attributes are provided by the table
+        self.table = table
+        self.position = position
+
+    index = property(lambda self: self.table.indices[self.position])
+    drawing_order = property(lambda self: self.table.drawing_orders[self.position])
+    bounds = property(lambda self: self.table.get_bounds(self.position))
+    a11y_actions = property(lambda self: list(self.table.action_lists[self.table.a11y_actions[self.position]]))
+    xpath = property(lambda self: self.table.get_xpath(self.position))
+    located_by = _command_property('located_by')
+    skip = _command_property('skip')
+    action = _command_property('action')
+    class_name = _string_property('class_name')
+    text = _string_property('text')
+    resource_id = _string_property('resource_id')
+    content_desc = _string_property('content_desc')
+    pkg_name = _string_property('pkg_name')
+    live_region = _string_property('live_region')
+    visible = _flag_property(FLAG_BITS['visible'])
+    clickable = _flag_property(FLAG_BITS['clickable'])
+    long_clickable = _flag_property(FLAG_BITS['long_clickable'])
+    checkable = _flag_property(FLAG_BITS['checkable'])
+    checked = _flag_property(FLAG_BITS['checked'])
+    enabled = _flag_property(FLAG_BITS['enabled'])
+    focusable = _flag_property(FLAG_BITS['focusable'])
+    focused = _flag_property(FLAG_BITS['focused'])
+    invalid = _flag_property(FLAG_BITS['invalid'])
+    clickable_span = _flag_property(FLAG_BITS['clickable_span'])
+    context_clickable = _flag_property(FLAG_BITS['context_clickable'])
+    naf = _flag_property(FLAG_BITS['naf'])
+    important_for_accessibility = _flag_property(FLAG_BITS['important_for_accessibility'])
+    covered = _flag_property(FLAG_BITS['covered'])
+    is_ad = _flag_property(FLAG_BITS['is_ad'])
+    # The XML elements and the fingerprints of the build passes are not kept
+    xml_element = None
+    fingerprint_key = None
+    fingerprint = None
+    merkle_hash = None
+    visible_descendant_count = None
+
+    @property
+    def parent_node(self) -> Union['NodeView', None]:
+        parent_position = self.table.parents[self.position]
+        return self.table[parent_position] if parent_position != -1 else None
+
+    @property
+    def children_nodes(self) -> List['NodeView']:
+        return [self.table[child] for child in self.table.get_children_positions(self.position)]
+
+    def is_practically_invisible(self):
+        return self.table.has_flag(self.position, PRACTICALLY_INVISIBLE_BIT)
+
+    def _attributes(self) -> Dict:
+        """
+        The attributes of the node in the same form that they appear in the JSON of a Node
+        """
+        attributes = {'index': self.index,
+                      'bounds': self.bounds,
+                      'drawing_order': self.drawing_order,
+                      'a11y_actions': self.a11y_actions,
+                      'xpath': self.xpath,
+                      'located_by': self.located_by,
+                      'skip': self.skip,
+                      'action': self.action}
+        for attr in STRING_ATTRIBUTES:
+            attributes[attr] = self.table.get_string(attr, self.position)
+        for attr, bit in FLAG_BITS.items():
+            attributes[attr] = self.table.has_flag(self.position, bit)
+        return attributes
+
+    def toJSONStr(self, excluded_attributes: List[str] = None) -> str:
+        if excluded_attributes is None:
+            excluded_attributes = []
+        attributes = {k: v for (k, v) in self._attributes().items() if k not in excluded_attributes}
+        return json.dumps(attributes, sort_keys=True)
+
+    def toJSON(self, excluded_attributes: List[str] = None) -> dict:
+        return json.loads(self.toJSONStr(excluded_attributes))
+
+    def __eq__(self, other):
+        if not isinstance(other, NodeView):
+            return NotImplemented
+        return self.table is other.table and self.position == other.position
+
+    def __hash__(self):
+        return hash((id(self.table), self.position))
@@ -2,7 +2,8 @@ import logging
 from typing import Any, List, Union
 import asyncio
 import aiofiles
-from consts import BLIND_MONKEY_TAG, CAPTURE_SCREENSHOT_DELAY
+from consts import BLIND_MONKEY_TAG, CAPTURE_SCREENSHOT_DELAY, LOG_FLUSH_DELAY
+from ui_idle_utils import log_signal, wait_for_ui_idle
 
 logger = logging.getLogger(__name__)
 
@@ -10,7 +11,7 @@ logger = logging.getLogger(__name__)
 async def save_screenshot(device, file_name) -> None:
     try:
         result = await device.screencap()
-        await asyncio.sleep(CAPTURE_SCREENSHOT_DELAY)
+        await wait_for_ui_idle(CAPTURE_SCREENSHOT_DELAY, name="capture_screenshot")
         async with aiofiles.open(file_name, mode='wb') as f:
             await f.write(result)
     except Exception as e:
@@ -47,7 +48,8 @@ class ParallelADBLogger:
             self.log_message = ""
             ll_task = await self._logcat()
             coroutine_result = await coroutine_obj
-            await asyncio.sleep(1)
+            # Wait for the remaining logs, e.g., the accessibility events of the executed command
+            await wait_for_ui_idle(LOG_FLUSH_DELAY, signals=[log_signal(lambda: self.log_message)], name="log_flush")
             ll_task.cancel()
             self.lock = None
             if tags is None:
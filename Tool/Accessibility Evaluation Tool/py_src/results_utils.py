@@ -1,21 +1,26 @@
-import logging
 import asyncio
+import logging
 import json
+import time
 import datetime
 import os
 import shutil
 from collections import defaultdict
 from enum import Enum
 from pathlib import Path
-from typing import Optional, Union, Dict, List, Tuple
+from typing import Awaitable, Optional, Union, Dict, List, Tuple
 
 from GUI_utils import Node, bounds_included, is_in_same_state_with_layout_path, NodesFactory
-from adb_utils import get_current_activity_name, get_windows, get_activities, adb_capture_layout
+from fingerprint_utils import FingerprintConfig, compute_state_fingerprint
+from layout_diff_utils import LayoutDiff, diff_layout_paths
+from adb_utils import get_current_activity_name, get_windows, get_activities, adb_capture_layout, \
+    get_activity_name_from_windows
 from command import LocatableCommandResponse
-from consts import BLIND_MONKEY_TAG, BLIND_MONKEY_EVENTS_TAG, CAPTURE_STATE_DELAY
+from consts import BLIND_MONKEY_TAG, BLIND_MONKEY_EVENTS_TAG, CAPTURE_STATE_DELAY, CONTROLLER_MODES
 from json_util import JSONSerializable
 from latte_executor_utils import latte_capture_layout
 from padb_utils import ParallelADBLogger, save_screenshot
+from ui_idle_utils import screenshot_hash_signal, wait_for_ui_idle
 from utils import annotate_rectangle
 
 logger = logging.getLogger(__name__)
@@ -199,6 +204,15 @@ class WebHelper:
         layout_path2 = self.address_book.get_layout_path(mode2, index2)
         return is_in_same_state_with_layout_path(layout_path1, layout_path2)
 
+    def get_layout_diff(self, mode1, index1, mode2, index2, config: FingerprintConfig = None) -> LayoutDiff:
+        """
+        The structured diff of two layouts of the snapshot, which is cached in the snapshot's directory
+        """
+        layout_path1 = self.address_book.get_layout_path(mode1, index1)
+        layout_path2 = self.address_book.get_layout_path(mode2, index2)
+        return diff_layout_paths(layout_path1, layout_path2, config=config,
+                                 cache_dir=self.address_book.layout_diffs_path)
+
     def get_events_info(self, mode, index) -> dict:
         event_log_path = self.address_book.get_log_path(mode, index, extension=BLIND_MONKEY_EVENTS_TAG)
         with open(event_log_path) as f:
@@ -322,8 +336,10 @@ class WebHelper:
             summary[f'exact_same_layout_{mode}_{AddressBook.BASE_MODE}'] = base_layout == mode_layout
             summary[f'exact_same_layout_{AddressBook.BASE_MODE}_{mode}'] = summary[
                 f'exact_same_layout_{mode}_{AddressBook.BASE_MODE}']
-            same_layout = summary[f"same_layout_{mode}_{AddressBook.BASE_MODE}"]
-            summary[f"{mode}_change_xml"] = (not same_layout)
+            layout_diff = self.get_layout_diff(AddressBook.BASE_MODE, index, mode, index,
+                                               config=FingerprintConfig.for_state_comparison())
+            summary[f"{mode}_xml_changes"] = layout_diff.change_count()
+            summary[f"{mode}_change_xml"] = not layout_diff.is_empty()
             if len(summary[f"changed_elements_{mode}"]) > 0:
                 if mode != "a11y_api":
                     if len(summary[f"changed_elements_{mode}"]) > 3:
@@ -513,6 +529,7 @@ class WebHelper:
             .with_layout_path(self.address_book.get_layout_path(AddressBook.BASE_MODE, AddressBook.INITIAL)) \
             .with_xpath_pass() \
             .with_ad_detection() \
+            .with_cache() \
             .build()
         return [node for node in nodes if node.clickable_span and not node.clickable and node.text and node.visible]
 
@@ -643,6 +660,15 @@ class AddressBook:
             "atf_elements.png")
         self.perform_actions_summary = self.audit_path_map[AddressBook.PERFORM_ACTIONS].joinpath(
             "summary_of_actions_v2.jsonl")
+        self.perform_actions_progress_path = self.audit_path_map[AddressBook.PERFORM_ACTIONS].joinpath(
+            "progress.json")
+        self.perform_actions_plan_path = self.audit_path_map[AddressBook.PERFORM_ACTIONS].joinpath(
+            "action_plan.json")
+        # The results of the controllers are written once they are captured, results.jsonl needs all controllers
+        self.perform_actions_mode_results_path = self.audit_path_map[AddressBook.PERFORM_ACTIONS].joinpath(
+            "mode_results.jsonl")
+        # The outcomes of the actions are shared among the snapshots of the app
+        self.action_outcomes_path = self.snapshot_result_path.parent.joinpath("action_outcomes.json")
         # ----------- Audit: execute_single_action ----------
         self.audit_path_map[AddressBook.EXECUTE_SINGLE_ACTION] = self.snapshot_result_path.joinpath("ExecuteSingleAction")
         self.execute_single_action_results_path = self.audit_path_map[AddressBook.EXECUTE_SINGLE_ACTION].joinpath("result.jsonl")
@@ -674,6 +700,7 @@ class AddressBook:
         self.visited_elements_path = self.snapshot_result_path.joinpath("visited.jsonl")
         # self.valid_elements_path = self.snapshot_result_path.joinpath("valid_elements.jsonl")
         self.tags_path = self.snapshot_result_path.joinpath("tags.jsonl")
+        self.layout_diffs_path = self.snapshot_result_path.joinpath("LayoutDiffs")
         self.note_path = self.snapshot_result_path.joinpath("note.txt")
         # self.s_possible_action_path = self.snapshot_result_path.joinpath("s_possible_action.jsonl")
         self.s_action_path = self.snapshot_result_path.joinpath("s_action.jsonl")
@@ -710,17 +737,100 @@ class AddressBook:
             shutil.rmtree(self.audit_path_map[AddressBook.EXTRACT_ACTIONS].resolve())
         self.audit_path_map[AddressBook.EXTRACT_ACTIONS].mkdir()
 
-    def initiate_perform_actions_task(self):
+    def initiate_perform_actions_task(self, resume: bool = False) -> int:
+        """
+        :param resume: If True, the completed actions of the previous execution are kept
+        :return: The number of completed actions, the task continues from this index
+        """
+        if resume and self.perform_actions_results_path.exists():
+            completed_count = self.get_completed_action_count()
+            logger.info(f"Resuming the perform actions task from action {completed_count}")
+            return completed_count
         if self.audit_path_map[AddressBook.PERFORM_ACTIONS].exists():
             shutil.rmtree(self.audit_path_map[AddressBook.PERFORM_ACTIONS].resolve())
         self.audit_path_map[AddressBook.PERFORM_ACTIONS].mkdir()
         self.perform_actions_results_path.touch()
-        modes = ["tb_touch", "touch", "a11y_api"]
-        for mode in modes:
+        for mode in CONTROLLER_MODES:
             path = self.mode_path_map[mode]
             if path.exists():
                 shutil.rmtree(path.resolve())
             path.mkdir()
+        return 0
+
+    def is_action_completed(self, index: int) -> bool:
+        for mode in CONTROLLER_MODES:
+            if self.get_screenshot_path(mode, index, should_exists=True) is None or \
+                    self.get_layout_path(mode, index, should_exists=True) is None:
+                return False
+        return True
+
+    def get_completed_action_count(self) -> int:
+        """
+        The number of the first actions that are completed, i.e., the action is in results.jsonl and the states of
+        all controllers are captured. results.jsonl is truncated to these actions, e.g., a line that is partially
+        written when the previous execution crashed is removed.
+        """
+        completed_lines = []
+        with open(self.perform_actions_results_path) as f:
+            for line in f.readlines():
+                try:
+                    result_json = json.loads(line.strip())
+                except json.JSONDecodeError:
+                    break
+                if result_json.get('index', None) != len(completed_lines) or \
+                        not self.is_action_completed(len(completed_lines)):
+                    break
+                completed_lines.append(line if line.endswith("\n") else line + "\n")
+        tmp_path = self.perform_actions_results_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            f.writelines(completed_lines)
+        os.replace(tmp_path, self.perform_actions_results_path)
+        return len(completed_lines)
+
+    def write_mode_result(self, index: int, mode: str, mode_result: dict) -> None:
+        with open(self.perform_actions_mode_results_path, "a") as f:
+            f.write(f"{json.dumps({'index': index, 'mode': mode, 'result': mode_result})}\n")
+
+    def read_mode_results(self, first_index: int = 0) -> Dict[int, Dict[str, dict]]:
+        """
+        The results of the controllers whose states are captured for the actions that are not completed yet, e.g.,
+        when the previous execution crashed before the other controllers of the action were performed.
+
+        :param first_index: The index of the first action that is not completed
+        :return: A map from the index of an action to the map of its controller modes to their results
+        """
+        mode_results = defaultdict(dict)
+        if not self.perform_actions_mode_results_path.exists():
+            return mode_results
+        with open(self.perform_actions_mode_results_path) as f:
+            for line in f.readlines():
+                try:
+                    line_json = json.loads(line.strip())
+                except json.JSONDecodeError:
+                    continue
+                index, mode = line_json['index'], line_json['mode']
+                if index < first_index or \
+                        self.get_screenshot_path(mode, index, should_exists=True) is None or \
+                        self.get_layout_path(mode, index, should_exists=True) is None:
+                    continue
+                mode_results[index][mode] = line_json['result']
+        return mode_results
+
+    def write_perform_actions_progress(self, completed_count: int, total_count: int) -> None:
+        progress = {'completed': completed_count,
+                    'total': total_count,
+                    'finished': completed_count >= total_count,
+                    'last_update': datetime.datetime.now().isoformat()}
+        tmp_path = self.perform_actions_progress_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(progress, f)
+        os.replace(tmp_path, self.perform_actions_progress_path)
+
+    def read_perform_actions_progress(self) -> Union[dict, None]:
+        if not self.perform_actions_progress_path.exists():
+            return None
+        with open(self.perform_actions_progress_path) as f:
+            return json.load(f)
 
     def initiate_execute_single_action_task(self):
         if self.audit_path_map[AddressBook.EXECUTE_SINGLE_ACTION].exists():
@@ -786,6 +896,39 @@ class AddressBook:
     def get_activity_name_path(self, mode: str, index: int, should_exists: bool = False):
         return self._get_path(mode, f"{index}_activity_name.txt", should_exists)
 
+    def get_capture_timing_path(self, mode: str, index: Union[int, str], should_exists: bool = False):
+        return self._get_path(mode, f"{index}_capture_timing.json", should_exists)
+
+    def get_state_fingerprint(self, mode: str, index: Union[int, str],
+                              config: FingerprintConfig = None) -> Union[str, None]:
+        """
+        The fingerprint of a captured state, i.e., its activity name and the state fingerprint of its layout
+
+        :return: The fingerprint, or None if the state is not captured or its layout is empty
+        """
+        layout_path = self.get_layout_path(mode, index, should_exists=True)
+        activity_name_path = self.get_activity_name_path(mode, index, should_exists=True)
+        if layout_path is None or activity_name_path is None:
+            return None
+        if config is None:
+            config = FingerprintConfig.for_exact_state()
+        with open(activity_name_path) as f:
+            activity_name = f.read().strip()
+        try:
+            nodes = NodesFactory() \
+                .with_layout_path(layout_path) \
+                .with_xpath_pass() \
+                .with_ad_detection() \
+                .with_fingerprint_pass(config) \
+                .build()
+        except Exception as e:
+            logger.warning(f"The layout {layout_path} cannot be parsed: {e}")
+            return None
+        state_fingerprint = compute_state_fingerprint(nodes, config)
+        if state_fingerprint is None:
+            return None
+        return f"{activity_name}:{state_fingerprint}"
+
     def _get_path(self, mode: str, file_name_with_extension: str, should_exists: bool):
         if mode not in self.mode_path_map:
             return None
@@ -903,6 +1046,25 @@ async def capture_layout(device) -> Tuple[str, dict]:
     return await padb_logger.execute_async_with_log(latte_capture_layout(device_name=device.serial))
 
 
+async def gather_or_cancel(coroutines: Dict[str, Awaitable]) -> dict:
+    """
+    Runs the coroutines concurrently. Unlike `asyncio.gather`, if one of them fails, the others are cancelled
+    (e.g., a layout capture does not keep running on the device) before the exception is raised.
+
+    :return: A map from the names of the coroutines to their results
+    """
+    tasks = {name: asyncio.ensure_future(coroutine) for name, coroutine in coroutines.items()}
+    done, pending = await asyncio.wait(tasks.values(), return_when=asyncio.FIRST_EXCEPTION)
+    for task in pending:
+        task.cancel()
+    if len(pending) > 0:
+        await asyncio.wait(pending)
+    for task in tasks.values():
+        if task in done and task.exception() is not None:
+            raise task.exception()
+    return {name: task.result() for name, task in tasks.items()}
+
+
 async def capture_current_state(address_book: AddressBook, device,
                                 mode: str,
                                 index: Union[int, str],
@@ -910,18 +1072,40 @@ async def capture_current_state(address_book: AddressBook, device,
                                 dumpsys: bool = False,
                                 log_message_map: Optional[dict] = None,
                                 use_adb_layout: bool = False) -> str:
-    await asyncio.sleep(CAPTURE_STATE_DELAY)
-    await save_screenshot(device, address_book.get_screenshot_path(mode, index))
-    activity_name = await get_current_activity_name(device_name=device.serial)
+    timing = {}
+
+    async def timed(name: str, coroutine):
+        start_time = time.monotonic()
+        result = await coroutine
+        timing[name] = round(time.monotonic() - start_time, 3)
+        return result
+
+    start = time.monotonic()
+    await timed("wait", wait_for_ui_idle(CAPTURE_STATE_DELAY, signals=[screenshot_hash_signal(device)],
+                                         name="capture_state"))
+    # The independent parts of the state are captured concurrently. If dumpsys is requested, the activity name is
+    # extracted from the windows instead of dumping them twice.
+    components = {'screenshot': save_screenshot(device, address_book.get_screenshot_path(mode, index))}
+    if dumpsys:
+        components['windows'] = get_windows(device_name=device.serial)
+        components['activities'] = get_activities(device_name=device.serial)
+    else:
+        components['activity_name'] = get_current_activity_name(device_name=device.serial)
+    if has_layout:
+        components['layout'] = adb_capture_layout(device_name=device.serial) if use_adb_layout \
+            else capture_layout(device)
+    results = await gather_or_cancel({name: timed(name, coroutine) for name, coroutine in components.items()})
+
+    activity_name = get_activity_name_from_windows(results['windows']) if dumpsys else results['activity_name']
     with open(address_book.get_activity_name_path(mode, index), mode='w') as f:
         f.write(activity_name + "\n")
 
     layout = ""
     if has_layout:
         if use_adb_layout:
-            layout = await adb_capture_layout(device_name=device.serial)
+            layout = results['layout']
         else:
-            log_map, layout = await capture_layout(device)
+            log_map, layout = results['layout']
             with open(address_book.get_log_path(mode, index, extension="layout"), mode='w') as f:
                 f.write(log_map[BLIND_MONKEY_TAG])
         logger.info("The layout path is: " + address_book.get_layout_path(mode,index).__str__())
@@ -934,13 +1118,14 @@ async def capture_current_state(address_book: AddressBook, device,
                 f.write(log_message)
 
     if dumpsys:
-        windows = await get_windows(device_name=device.serial)
         with open(address_book.get_log_path(mode, index, extension="WINDOWS"), mode='w') as f:
-            f.write(windows + "\n")
-        activities = await get_activities(device_name=device.serial)
+            f.write(results['windows'] + "\n")
         with open(address_book.get_log_path(mode, index, extension="ACTIVITIES"), mode='w') as f:
-            f.write(activities + "\n")
+            f.write(results['activities'] + "\n")
 
+    timing['total'] = round(time.monotonic() - start, 3)
+    with open(address_book.get_capture_timing_path(mode, index), mode='w') as f:
+        json.dump(timing, f)
 
 
 class ResultWriter:
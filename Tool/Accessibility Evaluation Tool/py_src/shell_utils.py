@@ -1,4 +1,18 @@
 import asyncio
+import logging
+import shlex
+from typing import Dict
+
+from ppadb.client_async import ClientAsync as AdbClient
+from ppadb.connection_async import ConnectionAsync
+from ppadb.device_async import DeviceAsync
+
+from consts import ADB_HOST, ADB_PORT, ADB_SERVER_SHELL, DEVICE_NAME
+
+logger = logging.getLogger(__name__)
+
+# Printed after the output of a command sent through ADBShellClient, followed by the exit code of the command
+EXIT_CODE_MARKER = "__LATTE_EXIT_CODE__"
 
 
 async def run_bash(cmd) -> (int, str, str):
@@ -10,3 +24,76 @@ async def run_bash(cmd) -> (int, str, str):
     stdout, stderr = await proc.communicate()
 
     return proc.returncode, stdout.decode() if stdout else "", stderr.decode() if stderr else ""
+
+
+class ADBShellClient:
+    """
+    Sends the shell commands to the running ADB server through ppadb, instead of spawning a shell and an adb client
+    process per command. The ADB server closes the connection of a shell command once it exits, so each command
+    opens its own connection.
+    """
+
+    def __init__(self, host: str = ADB_HOST, port: int = ADB_PORT):
+        self.client = AdbClient(host=host, port=port)
+        self.devices: Dict[str, DeviceAsync] = {}
+
+    def get_device(self, serial: str) -> DeviceAsync:
+        if serial not in self.devices:
+            self.devices[serial] = DeviceAsync(self.client, serial)
+        return self.devices[serial]
+
+    async def connect(self, serial: str) -> ConnectionAsync:
+        """
+        Opens a connection to the ADB server and selects the device, nothing is executed on the device yet.
+        Raises RuntimeError, OSError or asyncio.TimeoutError if the ADB server or the device cannot be reached.
+        """
+        return await self.get_device(serial).create_connection()
+
+    async def execute(self, connection: ConnectionAsync, command: str) -> (int, str, str):
+        """
+        Executes the command through a connection returned by `connect`, and closes it.
+
+        :return: The exit code and the output of the command. The shell service of ADB merges stderr into stdout,
+                 so stderr is always empty.
+        """
+        async with connection:
+            await connection.send(f"shell:{command}; echo {EXIT_CODE_MARKER}$?")
+            output = (await connection.read_all()).decode('utf-8', errors='replace')
+        marker_index = output.rfind(EXIT_CODE_MARKER)
+        if marker_index < 0:
+            return -1, output, ""
+        try:
+            exit_code = int(output[marker_index + len(EXIT_CODE_MARKER):].strip())
+        except ValueError:
+            exit_code = -1
+        return exit_code, output[:marker_index], ""
+
+    async def shell(self, command: str, serial: str) -> (int, str, str):
+        return await self.execute(await self.connect(serial), command)
+
+
+_shell_client = None
+
+
+async def run_adb_shell(command: str, device_name: str = DEVICE_NAME) -> (int, str, str):
+    """
+    Executes a shell command on the device, like `adb -s <device_name> shell <command>`. The command is sent to the
+    ADB server through ADBShellClient, and it is executed by the adb client if ADBShellClient is disabled
+    (ADB_SERVER_SHELL) or cannot reach the ADB server. Once the command is sent, it is not executed again: if reading
+    its output fails, the exit code is -1 and stderr is the error.
+    """
+    global _shell_client
+    if not ADB_SERVER_SHELL:
+        return await run_bash(f"adb -s {device_name} shell {shlex.quote(command)}")
+    if _shell_client is None:
+        _shell_client = ADBShellClient()
+    try:
+        connection = await _shell_client.connect(device_name)
+    except (RuntimeError, OSError, asyncio.TimeoutError) as e:
+        logger.warning(f"The ADB server could not be reached through ppadb, using adb instead: {e}")
+        return await run_bash(f"adb -s {device_name} shell {shlex.quote(command)}")
+    try:
+        return await _shell_client.execute(connection, command)
+    except (RuntimeError, OSError, asyncio.TimeoutError) as e:
+        logger.error(f"The output of '{command}' could not be read from the ADB server: {e}")
+        return -1, "", str(e)
@@ -1,4 +1,4 @@
-import asyncio
+import hashlib
 import logging
 import shutil
 from pathlib import Path
@@ -6,25 +6,39 @@ from typing import Union, Callable, List
 from ppadb.client_async import ClientAsync as AdbClient
 from ppadb.device_async import DeviceAsync
 
-from GUI_utils import NodesFactory, Node, is_in_same_state_with_nodes
+from ad_detection_utils import get_default_ad_rule_pack
+from GUI_utils import NodesFactory, Node, longest_subsequence_substring
+from fingerprint_utils import FingerprintConfig, compute_state_fingerprint
+from node_index_utils import NodeIndexes
+from node_table import NodeTable, NodeView, XPathToNodeMap
 from a11y_service import A11yServiceManager
 from adb_utils import save_snapshot, load_snapshot
-from consts import DEVICE_NAME, ADB_HOST, ADB_PORT
+from consts import DEVICE_NAME, ADB_HOST, ADB_PORT, EMULATOR_SNAPSHOT_DELAY
 from results_utils import AddressBook, capture_current_state
+from ui_idle_utils import activity_signal, screenshot_hash_signal, wait_for_ui_idle
 from utils import synch_run
 
 logger = logging.getLogger(__name__)
 
 
 class Snapshot:
+    """
+    The snapshot is loaded lazily in tiers: the constructor and `setup` only locate the files, the initial layout
+    is read and its nodes are loaded (or built) on the first access to `nodes`, and the path of the initial
+    screenshot is resolved on the first access to `initial_screenshot`.
+    """
+
     def __init__(self, address_book: AddressBook):
         address_book.initiate()
         self.address_book = address_book
         self.name = address_book.snapshot_name()
-        self.initial_layout = None
-        self.initial_screenshot = None
-        self.nodes = []
-        self.xpath_to_node = {}
+        self._layout_path = None
+        self._initial_layout = None
+        self._initial_screenshot = None
+        self._default_screenshot = False
+        self._nodes = None
+        self._indexes = None
+        self._state_fingerprints = {}
         self._setup_completed = False
 
     async def setup(self,
@@ -38,32 +52,78 @@ class Snapshot:
             layout_path = self.address_book.get_layout_path(mode=AddressBook.BASE_MODE,
                                                             index=AddressBook.INITIAL,
                                                             should_exists=True)
-            screenshot = self.address_book.get_screenshot_path(mode=AddressBook.BASE_MODE,
-                                                               index=AddressBook.INITIAL,
-                                                               should_exists=True)
+            self._default_screenshot = True
             if layout_path is None:
                 raise Exception(f"The layout is not provided for snapshot {self.name}!")
-        if layout_path is not None:
-            with open(layout_path) as f:
-                layout = f.read()
-        self.initial_layout = layout
-        self.initial_screenshot = screenshot
-        self.nodes = NodesFactory() \
-            .with_layout(self.initial_layout) \
-            .with_xpath_pass() \
-            .with_ad_detection() \
-            .build()
-
-        for node in self.nodes:
-            self.xpath_to_node[node.xpath] = node
-
-        if not self.address_book.snapshot_result_path.joinpath("nodes.jsonl").exists():
-            with open(self.address_book.snapshot_result_path.joinpath("nodes.jsonl"), "w") as f:
-                for node in self.nodes:
-                    f.write(f"{node.toJSONStr()}\n")
-
+        self._layout_path = layout_path if layout is None else None
+        self._initial_layout = layout
+        self._initial_screenshot = screenshot
+        self._nodes = None
+        self._indexes = None
+        self._state_fingerprints = {}
         self._setup_completed = True
 
+    @property
+    def initial_layout(self) -> Union[str, None]:
+        if self._initial_layout is None and self._layout_path is not None:
+            with open(self._layout_path) as f:
+                self._initial_layout = f.read()
+        return self._initial_layout
+
+    @property
+    def initial_screenshot(self) -> Union[str, Path, None]:
+        if self._default_screenshot:
+            self._initial_screenshot = self.address_book.get_screenshot_path(mode=AddressBook.BASE_MODE,
+                                                                             index=AddressBook.INITIAL,
+                                                                             should_exists=True)
+            self._default_screenshot = False
+        return self._initial_screenshot
+
+    @property
+    def nodes(self) -> NodeTable:
+        if self._nodes is None:
+            if not self._setup_completed:
+                return NodeTable()
+            self._nodes = self._load_or_build_nodes()
+            if not self.address_book.snapshot_result_path.joinpath("nodes.jsonl").exists():
+                with open(self.address_book.snapshot_result_path.joinpath("nodes.jsonl"), "w") as f:
+                    for node in self._nodes:
+                        f.write(f"{node.toJSONStr()}\n")
+        return self._nodes
+
+    @property
+    def xpath_to_node(self) -> XPathToNodeMap:
+        return self.nodes.xpath_to_node
+
+    @property
+    def indexes(self) -> NodeIndexes:
+        if self._indexes is None or self._indexes.nodes is not self.nodes:
+            self._indexes = NodeIndexes(self.nodes)
+        return self._indexes
+
+    def _load_or_build_nodes(self) -> NodeTable:
+        """
+        Loads the nodes of the initial layout from the binary sidecar (nodes.bin), if it's built from the same
+        layout and ad rules. Otherwise, parses the layout and writes the sidecar.
+        """
+        rule_pack = get_default_ad_rule_pack()
+        source_hash = hashlib.blake2b((self.initial_layout + rule_pack.key()).encode('utf-8'),
+                                      digest_size=16).digest()
+        nodes_path = self.address_book.snapshot_result_path.joinpath("nodes.bin")
+        table = NodeTable.load(nodes_path, source_hash)
+        if table is not None:
+            return table
+        table = NodeTable.from_nodes(NodesFactory()
+                                     .with_layout(self.initial_layout)
+                                     .with_xpath_pass()
+                                     .with_ad_detection(rule_pack)
+                                     .build())
+        try:
+            table.save(nodes_path, source_hash)
+        except Exception as e:
+            logger.warning(f"The nodes of snapshot {self.name} could not be saved: {e}")
+        return table
+
     def clone(self, target_address_book: AddressBook) -> 'Snapshot':
         shutil.copytree(self.address_book.snapshot_result_path, target_address_book.snapshot_result_path, )
         return Snapshot(target_address_book)
@@ -75,66 +135,39 @@ class Snapshot:
         return [node for node in self.nodes if filter_query(node)]
 
     def get_text_description(self, node: Node, depth: int = 1000, excluded_xpaths: List[str] = None) -> List[str]:
-        def max_subsequenc_substring(string_1, string_2, n, m) -> int:
-            # Copied from https://www.geeksforgeeks.org/find-length-longest-subsequence-one-string-substring-another-string/
-            MAX_LENGTH = 1000
-            dp = [[0 for i in range(MAX_LENGTH)]
-                  for i in range(MAX_LENGTH)]
-
-            # Initialize the dp[][] to 0.
-
-            # Calculating value for each element.
-            for i in range(1, m + 1):
-                for j in range(1, n + 1):
-
-                    # If alphabet of string
-                    # X and Y are equal make
-                    # dp[i][j] = 1 + dp[i-1][j-1]
-                    if(string_1[j - 1] == string_2[i - 1]):
-                        dp[i][j] = 1 + dp[i - 1][j - 1]
-
-                    # Else copy the previous value
-                    # in the row i.e dp[i-1][j-1]
-                    else:
-                        dp[i][j] = dp[i][j - 1]
-
-            # Finding the maximum length
-            ans = 0
-            for i in range(1, m + 1):
-                ans = max(ans, dp[i][n])
-            return ans
+        """
+        The text description of the node of the snapshot which matches `node` by xpath, or by the most similar
+        xpath. The descriptions are precomputed in the node table (see `NodeTable.get_text_description`).
+        """
         if depth <= 0:
             return []
         my_node: Node = None
-        if node.xml_element is not None:
+        if isinstance(node, NodeView) and node.table is self.nodes:
             my_node = node
         else:
-            for t_node in self.nodes:
-                if t_node.xpath == node.xpath:
-                    my_node = t_node
-                    break
+            if node.xpath in self.xpath_to_node:
+                my_node = self.xpath_to_node[node.xpath]
             if my_node is None:
-                similar_nodes = []
-                for t_node in self.nodes:
-                    if t_node.almost_same_xpath(node):
-                        sim = max_subsequenc_substring(node.xpath, t_node.xpath, len(node.xpath), len(t_node.xpath))
-                        similar_nodes.append((t_node, sim))
+                similar_nodes = [(t_node, longest_subsequence_substring(node.xpath, t_node.xpath))
+                                 for t_node in self.indexes.get_similar_nodes(node)]
                 if len(similar_nodes) > 0:
                     my_node = max(similar_nodes, key=lambda x: x[1])[0]
         if my_node is None:
             return []
-        if my_node.content_desc:
-            return [my_node.content_desc]
-        if my_node.text:
-            return [my_node.text]
-        text_description = []
-        for child in my_node.children_nodes:
-            if excluded_xpaths is not None and child.xpath in excluded_xpaths:
-                continue
-            text_description.extend(self.get_text_description(child, depth=depth-1, excluded_xpaths=excluded_xpaths))
-        text_description = [x.strip() for x in text_description if len(x.strip()) > 0]
-        return text_description
+        return self.nodes.get_text_description(my_node.position, depth=depth, excluded_xpaths=excluded_xpaths)
+
+    def state_fingerprint(self, config: FingerprintConfig) -> Union[str, None]:
+        """
+        The state fingerprint of the initial layout, computed once per configuration
+        """
+        if config.key() not in self._state_fingerprints:
+            self._state_fingerprints[config.key()] = compute_state_fingerprint(self.nodes, config)
+        return self._state_fingerprints[config.key()]
 
+    def state_comparison_config(self) -> FingerprintConfig:
+        return FingerprintConfig.for_state_comparison(extra_excluded_attributes=['checked', 'selected', 'text',
+                                                                                 'content_desc', 'visible'],
+                                                      package_name=self.address_book.package_name())
 
     def is_in_same_state_as(self, other_snapshot: 'Snapshot') -> bool:
         logger.debug(f"Comparing with {other_snapshot.address_book.snapshot_name()}")
@@ -145,10 +178,9 @@ class Snapshot:
                          f"First Path: {self.address_book.snapshot_result_path}, "
                          f"Second Path: {other_snapshot.address_book.snapshot_result_path}")
             return False
-        return is_in_same_state_with_nodes(self.nodes, other_snapshot.nodes,
-                                           extra_excluded_attributes=['checked', 'selected', 'text', 'content_desc',
-                                                                      'visible'],
-                                           package_name=self.address_book.package_name())
+        config = self.state_comparison_config()
+        state_fingerprint = self.state_fingerprint(config)
+        return state_fingerprint is not None and state_fingerprint == other_snapshot.state_fingerprint(config)
 
 
 class DeviceSnapshot(Snapshot):
@@ -183,6 +215,9 @@ class EmulatorSnapshot(DeviceSnapshot):
         self.tmp_snapshot = self.address_book.snapshot_name() + "_TMP"
         self.no_save_snapshot = no_save_snapshot
 
+    def _ui_signals(self) -> list:
+        return [screenshot_hash_signal(self.device), activity_signal(self.device)]
+
     async def setup(self, first_setup: bool = True, initial_emulator_load: bool = False, **kwargs):
         if initial_emulator_load:
             if not await load_snapshot(self.address_book.snapshot_name(), device_name=self.device.serial):
@@ -190,14 +225,14 @@ class EmulatorSnapshot(DeviceSnapshot):
 
         await super().setup(first_setup=first_setup, **kwargs)
         if first_setup and not self.no_save_snapshot:
-            await asyncio.sleep(3)
+            await wait_for_ui_idle(EMULATOR_SNAPSHOT_DELAY, signals=self._ui_signals(), name="emulator_snapshot")
             await save_snapshot(self.tmp_snapshot, device_name=self.device.serial)
 
     async def reload(self, hard: bool = False) -> bool:
         if hard:
             if not await load_snapshot(self.address_book.snapshot_name(), device_name=self.device.serial):
                 return False
-            await asyncio.sleep(3)
+            await wait_for_ui_idle(EMULATOR_SNAPSHOT_DELAY, signals=self._ui_signals(), name="emulator_snapshot")
             if not self.no_save_snapshot:
                 await save_snapshot(self.tmp_snapshot, device_name=self.device.serial)
             return True
@@ -205,5 +240,17 @@ class EmulatorSnapshot(DeviceSnapshot):
             logger.error("There is no temporary snapshot saved!")
             return False
         result = await load_snapshot(self.tmp_snapshot, device_name=self.device.serial)
-        await asyncio.sleep(3)
+        await wait_for_ui_idle(EMULATOR_SNAPSHOT_DELAY, signals=self._ui_signals(), name="emulator_snapshot")
         return result
+
+    async def replicate(self, device: DeviceAsync) -> 'EmulatorSnapshot':
+        """
+        Loads this snapshot on another emulator of the same AVD, so the actions can be performed on both in parallel.
+        The replica shares the address book and its initial state is not captured again.
+        """
+        replica = EmulatorSnapshot(address_book=self.address_book,
+                                   device=device,
+                                   no_save_snapshot=self.no_save_snapshot)
+        if not await replica.reload(hard=True):
+            raise Exception(f"Error in loading snapshot on {device.serial}")
+        return replica
@@ -8,17 +8,18 @@ from task.snapshot_task import SnapshotTask
 
 logger = logging.getLogger(__name__)
 class AnalyzeAdScreenTask(SnapshotTask):
-    def __init__(self, snapshot: EmulatorSnapshot):
+    def __init__(self, snapshot: EmulatorSnapshot, incremental: bool = False):
         if not isinstance(snapshot, EmulatorSnapshot):
             raise Exception("This task requires a UISnapshot!")
         super().__init__(snapshot)
+        self.incremental = incremental
 
     async def execute(self, har_path:str):
         snapshot: EmulatorSnapshot = self.snapshot
         device = snapshot.device
         ad_library, ad_type = await find_first_ad_library_and_format(har_path)
         await ExtractActionsTask(snapshot).execute()
-        await AnalyzeSnapshotIssuesTask(snapshot).execute(ad_library=ad_library, ad_type=ad_type)
+        await AnalyzeSnapshotIssuesTask(snapshot, incremental=self.incremental).execute(ad_library=ad_library, ad_type=ad_type)
         if not snapshot.address_book.audit_path_map[AddressBook.EXTRACT_ACTIONS].exists():
             logger.error("The actions should be extracted first!")
             return
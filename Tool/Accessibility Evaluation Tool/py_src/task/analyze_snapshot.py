@@ -5,7 +5,11 @@ import xml.etree.ElementTree as ET
 from collections import defaultdict
 from pathlib import Path
 from random import random
+from typing import List, Tuple
 
+import numpy as np
+
+import geometry_utils
 from GUI_utils import Node, NodesFactory
 from adb_utils import read_local_android_file, disable_talkback, enable_talkback
 from command import InfoCommand, ClickCommand, LocatableCommandResponse, InfoCommandResponse, NextCommand, \
@@ -14,6 +18,7 @@ from consts import BLIND_MONKEY_EVENTS_TAG, BLIND_MONKEY_TAG, REGULAR_EXECUTE_TI
 from controller import TalkBackAPIController, TalkBackDirectionalController, TalkBackTouchController, A11yAPIController, \
     TouchController, Controller
 from latte_executor_utils import report_atf_issues
+from layout_patch_utils import LiveLayout, get_window_content_changes
 from padb_utils import ParallelADBLogger
 from results_utils import AddressBook, Actionables, capture_current_state
 from snapshot import Snapshot, EmulatorSnapshot, DeviceSnapshot
@@ -52,10 +57,15 @@ def is_window_changed(log_message_map):
 
 
 class AnalyzeSnapshotIssuesTask(SnapshotTask):
-    def __init__(self, snapshot: EmulatorSnapshot):
+    def __init__(self, snapshot: EmulatorSnapshot, incremental: bool = False):
+        """
+        :param incremental: If True, the nodes of the current screen are patched with the changed elements of
+                            WindowContentChange events, and the state is captured only if they cannot be patched
+        """
         if not isinstance(snapshot, EmulatorSnapshot):
             raise Exception("Perform Actions task requires a EmulatorSnapshot!")
         super().__init__(snapshot)
+        self.incremental = incremental
 
     async def execute(self, ad_library: str, ad_type: str):
         snapshot: EmulatorSnapshot = self.snapshot
@@ -86,10 +96,7 @@ class AnalyzeSnapshotIssuesTask(SnapshotTask):
         selected_nodes_copy = []
         if len(assertive_nodes) != 0:
             assertive_num += len(assertive_nodes)
-            annotate_elements(self.snapshot.initial_screenshot,
-                              self.snapshot.address_book.audit_path_map[AddressBook.UNLOCATABLE].joinpath(
-                                  'assertive_nodes_' + str(assertive_index) + ".png"),
-                              assertive_nodes)
+            self.annotate_assertive_nodes(assertive_index, assertive_nodes)
         ineffective_node = []
         if ad_type == "Interstitial":
             ad_close_node = None
@@ -156,6 +163,8 @@ class AnalyzeSnapshotIssuesTask(SnapshotTask):
             screenshot_to_visited_nodes = defaultdict(list)
             last_screenshot = self.snapshot.initial_screenshot.resolve()
             screenshots = [last_screenshot]
+            live_layout = LiveLayout.from_layout(self.snapshot.initial_layout) if self.incremental else None
+            patched_count = 0
             await controller.setup()
             unlocatable_issues = []
             unvisited_nodes = []
@@ -165,7 +174,16 @@ class AnalyzeSnapshotIssuesTask(SnapshotTask):
                 # focus_command = FocusCommand(node)
                 log_message_map, navigate_response = await padb_logger.execute_async_with_log(
                     controller.execute(node, remove_after_read=False), tags=tags)
-                if is_window_changed(log_message_map):
+                patched_nodes = None
+                if self.incremental and live_layout is not None and is_window_changed(log_message_map):
+                    patched_nodes = live_layout.apply_changes(
+                        get_window_content_changes(log_message_map[BLIND_MONKEY_EVENTS_TAG]))
+                if patched_nodes is not None:
+                    patched_count += 1
+                    assertive_nodes, assertive_index, assertive_num = self.update_assertive_nodes(
+                        live_layout.nodes, assertive_nodes, assertive_index, assertive_num,
+                        changed=any(node.live_region == 'ASSERTIVE' for node in patched_nodes))
+                elif is_window_changed(log_message_map):
                     # logger.info("Window Content Has Changed")
                     await capture_current_state(self.snapshot.address_book,
                                                 self.snapshot.device,
@@ -183,17 +201,10 @@ class AnalyzeSnapshotIssuesTask(SnapshotTask):
                         .with_xpath_pass() \
                         .with_ad_detection() \
                         .build()
-                    newly_assertive_nodes = [node for node in last_nodes if node.live_region == 'ASSERTIVE']
-                    if newly_assertive_nodes != assertive_nodes:
-                        assertive_index += 1
-                        if len(newly_assertive_nodes) != 0:
-                            assertive_num += len(assertive_nodes)
-                            annotate_elements(self.snapshot.initial_screenshot,
-                                              self.snapshot.address_book.audit_path_map[
-                                                  AddressBook.UNLOCATABLE].joinpath(
-                                                  'assertive_nodes_' + str(assertive_index) + ".png"),
-                                              newly_assertive_nodes)
-                        assertive_nodes = newly_assertive_nodes
+                    if self.incremental:
+                        live_layout = LiveLayout(last_nodes)
+                    assertive_nodes, assertive_index, assertive_num = self.update_assertive_nodes(
+                        last_nodes, assertive_nodes, assertive_index, assertive_num)
                     ###############################################
                     last_screenshot = self.snapshot.address_book.get_screenshot_path(AddressBook.UNLOCATABLE_MODE,
                                                                                      len(screenshots))
@@ -220,6 +231,8 @@ class AnalyzeSnapshotIssuesTask(SnapshotTask):
                 else:
                     screenshot_to_visited_nodes[last_screenshot].append(node)
 
+            if self.incremental:
+                logger.info(f"{patched_count} window changes are patched without capturing the state")
             if not snapshot.address_book.audit_path_map[AddressBook.UNLOCATABLE].exists():
                 os.makedirs(snapshot.address_book.audit_path_map[AddressBook.UNLOCATABLE])
 
@@ -375,6 +388,31 @@ class AnalyzeSnapshotIssuesTask(SnapshotTask):
             f.write(f"{json.dumps(error_dict)}\n")
         await disable_talkback()
 
+    def annotate_assertive_nodes(self, assertive_index: int, assertive_nodes: List[Node]):
+        annotate_elements(self.snapshot.initial_screenshot,
+                          self.snapshot.address_book.audit_path_map[AddressBook.UNLOCATABLE].joinpath(
+                              'assertive_nodes_' + str(assertive_index) + ".png"),
+                          assertive_nodes)
+
+    def update_assertive_nodes(self, nodes: List[Node], assertive_nodes: List[Node], assertive_index: int,
+                               assertive_num: int, changed: bool = False) -> Tuple[List[Node], int, int]:
+        """
+        Annotates the assertive nodes of the current screen if they are different from the previous ones
+
+        :param nodes: The nodes of the current screen, either captured or patched
+        :param changed: If True, the assertive nodes are annotated even if they are equal to the previous ones
+        :return: The assertive nodes of the current screen, the index of their annotation, and the updated number
+                 of assertive nodes
+        """
+        newly_assertive_nodes = [node for node in nodes if node.live_region == 'ASSERTIVE']
+        if not changed and newly_assertive_nodes == assertive_nodes:
+            return assertive_nodes, assertive_index, assertive_num
+        assertive_index += 1
+        if len(newly_assertive_nodes) != 0:
+            assertive_num += len(assertive_nodes)
+            self.annotate_assertive_nodes(assertive_index, newly_assertive_nodes)
+        return newly_assertive_nodes, assertive_index, assertive_num
+
     async def write_ATF_issues(self):
         atf_issues = await report_atf_issues()
         logger.info(f"There are {len(atf_issues)} ATF issues in this screen!")
@@ -386,15 +424,14 @@ class AnalyzeSnapshotIssuesTask(SnapshotTask):
                           atf_issues)
 
     async def count_ad_elements(self, node_xpaths: list):
+        # The elements of the ad are the nodes under the common part of the xpaths of its nodes
         longest_substr = long_substr(node_xpaths)
-        all_nodes = self.snapshot.nodes
-        class_set = set()
-        element_num = 0
-        for all_node in all_nodes:
-            if longest_substr in all_node.xpath:
-                class_set.add(all_node.class_name)
-                element_num += 1
-        return element_num, class_set
+        if all(xpath.startswith(longest_substr) for xpath in node_xpaths):
+            ad_nodes = self.snapshot.indexes.get_nodes_with_xpath_prefix(longest_substr)
+        else:
+            ad_nodes = [node for node in self.snapshot.nodes if longest_substr in node.xpath]
+        class_set = set(node.class_name for node in ad_nodes)
+        return len(ad_nodes), class_set
 
     async def xml_to_str(self, xml_path: Path):
         tree = ET.parse(xml_path)
@@ -408,37 +445,25 @@ class AnalyzeSnapshotIssuesTask(SnapshotTask):
         # Convert string representations to tuples
         rectangles = []
         for rect_str in rectangle_strings:
-            # Convert string to tuple
-            rect = tuple(map(int, rect_str.strip("[]").split(',')))
+            if isinstance(rect_str, str):
+                rect = tuple(map(int, rect_str.strip("[]").split(',')))
+            else:
+                rect = tuple(rect_str)
             rectangles.append(rect)
 
-        # Function to calculate the area of a rectangle
-        def area(rect):
-            x, y, width, height = rect
-            return width * height
-
-        # Find the rectangle with the maximum area
-        largest_rectangle = max(rectangles, key=area)
-
-        return largest_rectangle
+        # Find the rectangle with the maximum area, represented as (x, y, width, height)
+        largest_index = geometry_utils.find_largest_rectangle(rectangles)
+        if largest_index is None:
+            return None
+        return rectangles[largest_index]
 
-    async def is_rectangle_outside(self,largest_rect, other_rect):
+    def is_rectangle_outside(self, largest_rect, other_rect):
         """
         Check if other_rect is completely outside largest_rect.
         Rectangles are represented as (x, y, width, height).
         """
-
-        # Calculate the right and bottom edges of the rectangles
-        largest_right = largest_rect[0] + largest_rect[2]
-        largest_bottom = largest_rect[1] + largest_rect[3]
-        other_right = other_rect[0] + other_rect[2]
-        other_bottom = other_rect[1] + other_rect[3]
-
-        # Check if other_rect is outside largest_rect
-        if other_rect[0] > largest_right or other_rect[1] > largest_bottom \
-                or other_right < largest_rect[0] or other_bottom < largest_rect[1]:
+        if largest_rect is None:
             return True
-        else:
-            return False
+        return bool(geometry_utils.outside_mask(largest_rect, np.array([other_rect]))[0])
 
 
@@ -1,13 +1,18 @@
-import asyncio
+import hashlib
+import json
 import logging
 from pathlib import Path
 from typing import Union
 
 from ppadb.device_async import DeviceAsync
 
+from ad_detection_utils import get_default_ad_rule_pack
 from adb_utils import save_snapshot
+from consts import SAVE_SNAPSHOT_DELAY
+from fingerprint_utils import FingerprintConfig, StateFingerprintIndex
 from results_utils import AddressBook
 from snapshot import DeviceSnapshot, Snapshot
+from ui_idle_utils import screenshot_hash_signal, wait_for_ui_idle
 
 logger = logging.getLogger(__name__)
 
@@ -46,20 +51,58 @@ class TakeSnapshotTask(AppTask):
 
 
 class StoatSaveSnapshotTask(AppTask):
+    FINGERPRINT_INDEX_NAME = "fingerprints.json"
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
+    @staticmethod
+    def get_state_fingerprint(snapshot: Snapshot, config: FingerprintConfig) -> Union[str, None]:
+        """
+        The state fingerprint used for deduplication, snapshots without layout or nodes are not in the same
+        state as any snapshot (see `Snapshot.is_in_same_state_as`)
+        """
+        if not snapshot.initial_layout or not snapshot.nodes:
+            return None
+        return snapshot.state_fingerprint(config)
+
+    async def load_fingerprint_index(self, existing_snapshot_paths: dict, config: FingerprintConfig) \
+            -> StateFingerprintIndex:
+        """
+        Loads the fingerprint index of the app's snapshots. The index is rebuilt if it's missing or computed with
+        another configuration, and it's updated with the snapshots that are added or removed since it's saved.
+        """
+        index_path = self.app_path.joinpath(StoatSaveSnapshotTask.FINGERPRINT_INDEX_NAME)
+        key_content = json.dumps([config.key(), get_default_ad_rule_pack().key()])
+        key = hashlib.blake2b(key_content.encode('utf-8'), digest_size=16).hexdigest()
+        index = StateFingerprintIndex.load(index_path, key)
+        if index is None:
+            logger.info(f"Building the fingerprint index of {len(existing_snapshot_paths)} snapshots")
+            index = StateFingerprintIndex(index_path, key)
+        changed = False
+        for snapshot_name, snapshot_path in existing_snapshot_paths.items():
+            if snapshot_name not in index:
+                existing_snapshot = Snapshot(AddressBook(snapshot_path))
+                await existing_snapshot.setup()
+                index.add(snapshot_name, self.get_state_fingerprint(existing_snapshot, config))
+                changed = True
+        for snapshot_name in list(index.fingerprints):
+            if snapshot_name not in existing_snapshot_paths:
+                index.remove(snapshot_name)
+                changed = True
+        if changed:
+            index.save()
+        return index
+
     async def execute(self):
         last_index = 0
-        existing_snapshots = []
+        existing_snapshot_paths = {}
         for subdir in self.app_path.iterdir():
             if subdir.is_dir() and subdir.name.startswith(f"{self.app_name()}.S_"):
                 s_index = subdir.name[len(f"{self.app_name()}.S_"):]
                 if s_index.isdigit():
                     last_index = max(last_index, int(s_index))
-                    existing_snapshot = Snapshot(AddressBook(subdir))
-                    await existing_snapshot.setup()
-                    existing_snapshots.append(existing_snapshot)
+                    existing_snapshot_paths[subdir.name] = subdir
 
         tmp_snapshot = Snapshot(address_book=AddressBook(self.app_path.joinpath("tmp")))
         await tmp_snapshot.setup()
@@ -69,18 +112,20 @@ class StoatSaveSnapshotTask(AppTask):
             logger.info("The app is crashed, no snapshot will be taken!")
             return
 
-        should_be_saved = True
-        for existing_snapshot in existing_snapshots:
-            if tmp_snapshot.is_in_same_state_as(existing_snapshot):
-                logger.info(f"There is an existing snapshot in the same state: "
-                            f"{existing_snapshot.address_book.snapshot_name()}")
-                should_be_saved = False
-                break
-        if should_be_saved:
+        config = tmp_snapshot.state_comparison_config()
+        fingerprint_index = await self.load_fingerprint_index(existing_snapshot_paths, config)
+        fingerprint = self.get_state_fingerprint(tmp_snapshot, config)
+        existing_snapshot_name = fingerprint_index.find(fingerprint)
+        if existing_snapshot_name is not None:
+            logger.info(f"There is an existing snapshot in the same state: {existing_snapshot_name}")
+        else:
             snapshot_name = f"{self.app_name()}.S_{last_index+1}"
             address_book = AddressBook(self.app_path.joinpath(snapshot_name))
             snapshot = tmp_snapshot.clone(address_book)
-            await asyncio.sleep(5)
+            await wait_for_ui_idle(SAVE_SNAPSHOT_DELAY, signals=[screenshot_hash_signal(self.device)],
+                                   name="save_snapshot")
             await save_snapshot(snapshot_name, device_name=self.device.serial)
+            fingerprint_index.add(snapshot_name, fingerprint)
+            fingerprint_index.save()
             logger.info(f"The new snapshot is saved in {snapshot_name}!")
-        await asyncio.sleep(1)
+        await wait_for_ui_idle(1, signals=[screenshot_hash_signal(self.device)], name="save_snapshot_task")
@@ -55,12 +55,11 @@ class ExtractActionsTask(SnapshotTask):
                     if tb_reachable_node.xpath in self.snapshot.xpath_to_node:
                         corresponding_node = self.snapshot.xpath_to_node[tb_reachable_node.xpath]
                     elif tb_reachable_node.text or tb_reachable_node.content_desc or tb_reachable_node.resource_id:
-                        similar_nodes = self.snapshot.get_nodes(
-                            filter_query=lambda node: node.class_name == tb_reachable_node.class_name and
-                                                      node.resource_id == tb_reachable_node.resource_id and
-                                                      node.content_desc == tb_reachable_node.content_desc and
-                                                      node.text == tb_reachable_node.text
-                        )
+                        similar_nodes = self.snapshot.indexes.get_nodes_by_identifiers(
+                            class_name=tb_reachable_node.class_name,
+                            resource_id=tb_reachable_node.resource_id,
+                            content_desc=tb_reachable_node.content_desc,
+                            text=tb_reachable_node.text)
                         if len(similar_nodes) == 1:
                             corresponding_node = similar_nodes[0]
                     if corresponding_node is None:
@@ -6,6 +6,7 @@ from typing import Tuple
 from PIL import Image
 import imagehash
 from GUI_utils import Node
+from layout_patch_utils import LiveLayout, get_window_content_changes
 from adb_utils import disable_talkback
 from command import InfoCommand, InfoCommandResponse, JumpNextCommand, JumpPreviousCommand, PreviousCommand, \
     NextCommand, NavigateCommandResponse
@@ -36,13 +37,19 @@ class AnalyzeSnapshotActionTask(SnapshotTask):
     def __init__(self, snapshot: DeviceSnapshot,
                  check_both_directions: bool = False,
                  target_node: Node = None,
-                 jump_mode: bool = False):
+                 jump_mode: bool = False,
+                 incremental: bool = False):
+        """
+        :param incremental: If True, the nodes of the current screen are patched with the changed elements of
+                            WindowContentChange events, and the state is captured only if they cannot be patched
+        """
         if not isinstance(snapshot, DeviceSnapshot):
             raise Exception("TalkBack exploration requires a DeviceSnapshot!")
         super().__init__(snapshot)
         self.check_both_directions = check_both_directions
         self.target_node = target_node
         self.jump_mode = jump_mode
+        self.incremental = incremental
 
     async def is_target_node_found(self, padb_logger, focused_node: Node, controller: Controller, tags) -> Tuple[bool, str, str]:
         if self.target_node is None:
@@ -95,6 +102,7 @@ class AnalyzeSnapshotActionTask(SnapshotTask):
         none_node_count = 0
         last_screenshot = self.snapshot.initial_screenshot.resolve()
         screenshots = [last_screenshot]
+        live_layout = LiveLayout.from_layout(self.snapshot.initial_layout) if self.incremental else None
         android_logs = ""
         android_event_logs = ""
         tags = [BLIND_MONKEY_TAG, BLIND_MONKEY_EVENTS_TAG]
@@ -145,15 +153,23 @@ class AnalyzeSnapshotActionTask(SnapshotTask):
                 # Check if the UI has changed
                 if is_window_changed(log_message_map):
                     logger.info("Window Content Has Changed")
-                    await capture_current_state(self.snapshot.address_book,
-                                                                 self.snapshot.device,
-                                                                 mode=AddressBook.FAROFF_MODE,
-                                                                 index=len(screenshots),
-                                                                 dumpsys=True,
-                                                                 has_layout=True)
-                    last_screenshot = self.snapshot.address_book.get_screenshot_path(AddressBook.FAROFF_MODE, len(screenshots))
-                    last_screenshot = last_screenshot.resolve()
-                    screenshots.append(last_screenshot)
+                    if live_layout is not None and live_layout.apply_changes(
+                            get_window_content_changes(log_message_map[BLIND_MONKEY_EVENTS_TAG])) is not None:
+                        logger.info("The changes are patched without capturing the state")
+                    else:
+                        await capture_current_state(self.snapshot.address_book,
+                                                    self.snapshot.device,
+                                                    mode=AddressBook.FAROFF_MODE,
+                                                    index=len(screenshots),
+                                                    dumpsys=True,
+                                                    has_layout=True)
+                        if live_layout is not None:
+                            live_layout = LiveLayout.from_layout_path(
+                                self.snapshot.address_book.get_layout_path(AddressBook.FAROFF_MODE, len(screenshots)))
+                        last_screenshot = self.snapshot.address_book.get_screenshot_path(AddressBook.FAROFF_MODE,
+                                                                                         len(screenshots))
+                        last_screenshot = last_screenshot.resolve()
+                        screenshots.append(last_screenshot)
                 if navigate_response is None or not isinstance(navigate_response, NavigateCommandResponse):
                     logger.error("Terminate the exploration: Problem with navigation")
                     successful_result = False
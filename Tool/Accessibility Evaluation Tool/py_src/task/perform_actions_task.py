@@ -1,10 +1,15 @@
+import asyncio
 import json
 import logging
+from collections import defaultdict
+from typing import Dict, List, Tuple, Union
 
 from GUI_utils import Node
+from action_schedule_utils import ActionOutcomes, ActionScheduler
 from command import ClickCommand, CommandResponse, LocatableCommandResponse
-from consts import BLIND_MONKEY_TAG, BLIND_MONKEY_EVENTS_TAG
+from consts import BLIND_MONKEY_TAG, BLIND_MONKEY_EVENTS_TAG, CONTROLLER_MODES
 from controller import TalkBackTouchController, TouchController, A11yAPIController, TalkBackAPIController
+from device_pool import DevicePool
 from latte_executor_utils import report_atf_issues
 from padb_utils import ParallelADBLogger
 from results_utils import AddressBook, Actionables, capture_current_state, ActionResult
@@ -15,90 +20,221 @@ from utils import annotate_elements, annotate_rectangle
 logger = logging.getLogger(__name__)
 
 
-class PerformActionsTask(SnapshotTask):
+class DeviceWorker:
+    """
+    The snapshot, controllers, and logger of a device of the pool that performs the actions
+    """
+
     def __init__(self, snapshot: EmulatorSnapshot):
+        self.snapshot = snapshot
+        device = snapshot.device
+        self.controllers = {
+            'tb_touch': TalkBackTouchController(device=device),
+            'tb_api': TalkBackAPIController(device=device),
+            'a11y_api': A11yAPIController(device=device),
+            'touch': TouchController(device=device)
+        }
+        self.padb_logger = ParallelADBLogger(device)
+        # The controller mode of the last action if it kept the device in the initial state of the snapshot. The next
+        # action of the same controller does not need a reload, since the controllers leave different side effects
+        # (e.g., TalkBack's focus) that are not in the layout.
+        self.initial_state_mode: Union[str, None] = None
+        self.reload_count = 0
+
+
+class PerformActionsTask(SnapshotTask):
+    def __init__(self, snapshot: EmulatorSnapshot, device_pool: DevicePool = None, resume: bool = False,
+                 strict_reload: bool = False):
+        """
+        :param device_pool: The emulators of the same AVD that perform the actions in parallel, the snapshot's
+                            device is used if it is not provided
+        :param resume: If True, continues from the first incomplete action of the previous execution
+        :param strict_reload: If True, the snapshot is reloaded before every action in the file order. Otherwise,
+                              the actions are ordered by `ActionScheduler`, and the reload is skipped if the
+                              device is still in the initial state, i.e., the previous action was performed by
+                              the same controller and it did not change the activity or the layout.
+        """
         if not isinstance(snapshot, EmulatorSnapshot):
             raise Exception("Perform Actions task requires a EmulatorSnapshot!")
         super().__init__(snapshot)
+        self.device_pool = device_pool if device_pool is not None else DevicePool([snapshot.device])
+        self.resume = resume
+        self.strict_reload = strict_reload
+        self.initial_fingerprint = None
+        self.skipped_reload_count = 0
+        self.action_outcomes = None
+
+    async def create_workers(self) -> Dict[str, DeviceWorker]:
+        snapshot: EmulatorSnapshot = self.snapshot
+        other_devices = [device for device in self.device_pool.devices if device.serial != snapshot.device.serial]
+        if len(other_devices) != len(self.device_pool) - 1:
+            raise Exception(f"The snapshot's device {snapshot.device.serial} is not in the device pool!")
+        replicas = await asyncio.gather(*[snapshot.replicate(device) for device in other_devices])
+        return {x.device.serial: DeviceWorker(x) for x in [snapshot] + list(replicas)}
 
     async def execute(self):
         snapshot: EmulatorSnapshot = self.snapshot
-        device = snapshot.device
         if not snapshot.address_book.audit_path_map[AddressBook.EXTRACT_ACTIONS].exists():
             logger.error("The actions should be extracted first!")
             return
-        snapshot.address_book.initiate_perform_actions_task()
-        controllers = {
-            'tb_touch': TalkBackTouchController(device=device),
-            'tb_api': TalkBackAPIController(device=device),
-            'a11y_api': A11yAPIController(device=device),
-            'touch': TouchController(device=device)
-        }
-        padb_logger = ParallelADBLogger(device)
-        await self.write_ATF_issues()
+        first_index = snapshot.address_book.initiate_perform_actions_task(resume=self.resume)
+        if first_index == 0 or not snapshot.address_book.perform_actions_atf_issues_path.exists():
+            await self.write_ATF_issues()
         selected_actionable_nodes = []
         with open(snapshot.address_book.extract_actions_nodes[Actionables.Selected]) as f:
             for line in f.readlines():
                 node = Node.createNodeFromDict(json.loads(line.strip()))
                 selected_actionable_nodes.append(node)
         logger.info(f"There are {len(selected_actionable_nodes)} actionable nodes!")
+        snapshot.address_book.write_perform_actions_progress(first_index, len(selected_actionable_nodes))
+        if first_index >= len(selected_actionable_nodes):
+            logger.info("All actions are already performed!")
+            return
+        self.initial_fingerprint = snapshot.address_book.get_state_fingerprint(AddressBook.BASE_MODE,
+                                                                               AddressBook.INITIAL)
+        # The results of the controllers are collected, then each action is written in the order of indices. The
+        # results of the controllers of the incomplete actions of the previous execution are reused.
+        action_results = defaultdict(dict)
+        for index, mode_results in snapshot.address_book.read_mode_results(first_index).items():
+            for mode_result in mode_results.values():
+                action_results[index].update(self.load_mode_result(mode_result))
+        next_index = first_index
+
+        def write_completed_actions():
+            nonlocal next_index
+            while next_index < len(selected_actionable_nodes) and \
+                    all(mode in action_results[next_index] for mode in CONTROLLER_MODES):
+                self.write_action_result(next_index, selected_actionable_nodes[next_index],
+                                         action_results.pop(next_index))
+                next_index += 1
+                snapshot.address_book.write_perform_actions_progress(next_index, len(selected_actionable_nodes))
+
+        write_completed_actions()
+        jobs = [(index, controller_mode)
+                for index in range(next_index, len(selected_actionable_nodes))
+                for controller_mode in CONTROLLER_MODES
+                if controller_mode not in action_results[index]]
+        if len(jobs) == 0:
+            return
+        workers = await self.create_workers()
+        logger.info(f"Performing the actions on {', '.join(self.device_pool.serials)}")
+
+        async def perform(device, batch: List[Tuple[int, str]]) -> None:
+            # A batch starts with a reload and its actions are performed on one device (see ActionPlan)
+            worker = workers[device.serial]
+            worker.initial_state_mode = None
+            for index, controller_mode in batch:
+                result = await self.perform_action(worker, index, selected_actionable_nodes[index], controller_mode)
+                snapshot.address_book.write_mode_result(index, controller_mode, self.dump_mode_result(result))
+                action_results[index].update(result)
+                write_completed_actions()
+
+        if self.strict_reload:
+            await self.device_pool.run(perform, [[job] for job in jobs])
+            return
+        self.action_outcomes = ActionOutcomes.load(snapshot.address_book.action_outcomes_path)
+        action_plan = ActionScheduler(self.action_outcomes).plan(selected_actionable_nodes, jobs,
+                                                                 worker_count=len(self.device_pool))
+        action_plan.write(snapshot.address_book.perform_actions_plan_path)
+        logger.info(f"The action plan has {action_plan.planned_reload_count} reloads, "
+                    f"{action_plan.naive_reload_count - action_plan.planned_reload_count} less than the file order")
+        try:
+            await self.device_pool.run(perform, action_plan.batches)
+        finally:
+            self.action_outcomes.save()
+        reload_counts = ', '.join(f"{serial}: {worker.reload_count}" for serial, worker in workers.items())
+        logger.info(f"{sum(worker.reload_count for worker in workers.values())} reloads are performed ({reload_counts})"
+                    f", {self.skipped_reload_count} reloads are skipped!")
+
+    @staticmethod
+    def dump_mode_result(result: Dict[str, LocatableCommandResponse]) -> dict:
+        return {key: value.toJSON() if isinstance(value, CommandResponse) else value for key, value in result.items()}
+
+    @staticmethod
+    def load_mode_result(mode_result: dict) -> Dict[str, LocatableCommandResponse]:
+        return {key: LocatableCommandResponse.create_from_response(value) if key in CONTROLLER_MODES else value
+                for key, value in mode_result.items()}
+
+    async def perform_action(self, worker: DeviceWorker, index: int, node: Node, controller_mode: str) \
+            -> Dict[str, LocatableCommandResponse]:
+        """
+        Reloads the snapshot on the worker's device and performs the action of the node with the controller
+
+        :return: The response of the controller, and the failed response of TalkBack Touch controller if any
+        """
+        command = ClickCommand(node)
+        serial = worker.snapshot.device.serial
         tags = [BLIND_MONKEY_TAG, BLIND_MONKEY_EVENTS_TAG]
-        for index, node in enumerate(selected_actionable_nodes):
-            command = ClickCommand(node)
-            logger.info(f"Action {index}/({len(selected_actionable_nodes) - 1}): Clicking on node {node.xpath}!")
-            action_results = {}
-            for controller_mode in ['tb_touch', 'a11y_api', 'touch']:
-                logger.info(f"Reloading the snapshot for controller {controller_mode}")
-                await snapshot.reload()
-                controller = controllers[controller_mode]
-                await controller.setup()
-                logger.info(f"Executing the command with controller {controller_mode}")
-                result = await padb_logger.execute_async_with_log(
-                    controller.execute(command),
-                    tags=tags)
-                log_message_map: dict = result[0]
-                action_response: LocatableCommandResponse = result[1]
-                if controller_mode == 'tb_touch' and action_response.state != 'COMPLETED':
-                    action_results['tb_touch_failed'] = action_response.toJSON()
-                    logger.info(f"The TalkBack Touch Controller could not locate the element! {node.xpath}")
-                    controller = controllers['tb_api']
-                    await controller.setup()
-                    result = await padb_logger.execute_async_with_log(
-                        controller.execute(command),
-                        tags=tags)
-                    log_message_map: dict = result[0]
-                    action_response: LocatableCommandResponse = result[1]
-                logger.info(f"The action is performed in {action_response.duration}ms! State: {action_response.state} ")
-                action_results[controller_mode] = action_response
-                await capture_current_state(snapshot.address_book,
-                                            snapshot.device,
-                                            mode=controller_mode,
-                                            index=index,
-                                            log_message_map=log_message_map,
-                                            dumpsys=True,
-                                            has_layout=True)
-            action_result = ActionResult(index=index,
-                                         node=node,
-                                         tb_action_result=action_results['tb_touch'],
-                                         touch_action_result=action_results['touch'],
-                                         a11y_api_action_result=action_results['a11y_api'],
-                                         tb_touch_failed=action_results.get('tb_touch_failed', None))
-            with open(snapshot.address_book.perform_actions_results_path, "a") as f:
-                f.write(f"{action_result.toJSONStr()}\n")
-            # Post process
-            annotate_rectangle(snapshot.initial_screenshot,
-                               snapshot.address_book.audit_path_map[AddressBook.PERFORM_ACTIONS].joinpath(
-                                   f"{index}.png"),
-                               bounds=[node.bounds,
-                                       action_results['tb_touch'].acted_node.bounds,
-                                       action_results['touch'].acted_node.bounds,
-                                       action_results['a11y_api'].acted_node.bounds, ],
-                               outline=[(244, 164, 96), (144, 238, 144), (220, 20, 60), (0, 139, 139)],
-                               width=[5, 15, 5, 5],
-                               scale=[1, 20, 7, 13])
+        action_results = {}
+        logger.info(f"Action {index}: Clicking on node {node.xpath} with {controller_mode} on {serial}!")
+        if self.strict_reload or worker.initial_state_mode != controller_mode:
+            logger.info(f"Reloading the snapshot for controller {controller_mode}")
+            worker.initial_state_mode = None
+            worker.reload_count += 1
+            await worker.snapshot.reload()
+        else:
+            self.skipped_reload_count += 1
+            logger.info(f"The device is in the initial state, the reload for controller {controller_mode} is "
+                        f"skipped! Skipped reloads: {self.skipped_reload_count}")
+        controller = worker.controllers[controller_mode]
+        await controller.setup()
+        logger.info(f"Executing the command with controller {controller_mode}")
+        result = await worker.padb_logger.execute_async_with_log(
+            controller.execute(command),
+            tags=tags)
+        log_message_map: dict = result[0]
+        action_response: LocatableCommandResponse = result[1]
+        if controller_mode == 'tb_touch' and action_response.state != 'COMPLETED':
+            action_results['tb_touch_failed'] = action_response.toJSON()
+            logger.info(f"The TalkBack Touch Controller could not locate the element! {node.xpath}")
+            controller = worker.controllers['tb_api']
+            await controller.setup()
+            result = await worker.padb_logger.execute_async_with_log(
+                controller.execute(command),
+                tags=tags)
+            log_message_map: dict = result[0]
+            action_response: LocatableCommandResponse = result[1]
+        logger.info(f"The action is performed in {action_response.duration}ms! State: {action_response.state} ")
+        action_results[controller_mode] = action_response
+        await capture_current_state(worker.snapshot.address_book,
+                                    worker.snapshot.device,
+                                    mode=controller_mode,
+                                    index=index,
+                                    log_message_map=log_message_map,
+                                    dumpsys=True,
+                                    has_layout=True)
+        if not self.strict_reload:
+            fingerprint = worker.snapshot.address_book.get_state_fingerprint(controller_mode, index)
+            in_initial_state = fingerprint is not None and fingerprint == self.initial_fingerprint
+            worker.initial_state_mode = controller_mode if in_initial_state else None
+            if self.action_outcomes is not None:
+                self.action_outcomes.record(node, controller_mode, in_initial_state)
+        return action_results
+
+    def write_action_result(self, index: int, node: Node, action_results: Dict[str, LocatableCommandResponse]):
+        snapshot: EmulatorSnapshot = self.snapshot
+        action_result = ActionResult(index=index,
+                                     node=node,
+                                     tb_action_result=action_results['tb_touch'],
+                                     touch_action_result=action_results['touch'],
+                                     a11y_api_action_result=action_results['a11y_api'],
+                                     tb_touch_failed=action_results.get('tb_touch_failed', None))
+        with open(snapshot.address_book.perform_actions_results_path, "a") as f:
+            f.write(f"{action_result.toJSONStr()}\n")
+        # Post process
+        annotate_rectangle(snapshot.initial_screenshot,
+                           snapshot.address_book.audit_path_map[AddressBook.PERFORM_ACTIONS].joinpath(
+                               f"{index}.png"),
+                           bounds=[node.bounds,
+                                   action_results['tb_touch'].acted_node.bounds,
+                                   action_results['touch'].acted_node.bounds,
+                                   action_results['a11y_api'].acted_node.bounds, ],
+                           outline=[(244, 164, 96), (144, 238, 144), (220, 20, 60), (0, 139, 139)],
+                           width=[5, 15, 5, 5],
+                           scale=[1, 20, 7, 13])
 
     async def write_ATF_issues(self):
-        atf_issues = await report_atf_issues()
+        atf_issues = await report_atf_issues(device_name=self.snapshot.device.serial)
         logger.info(f"There are {len(atf_issues)} ATF issues in this screen!")
         with open(self.snapshot.address_book.perform_actions_atf_issues_path, "w") as f:
             for issue in atf_issues:
@@ -0,0 +1,48 @@
+import os
+import tempfile
+import unittest
+
+from GUI_utils import Node
+from action_schedule_utils import ActionOutcomes, ActionScheduler
+
+
+class TestActionSchedule(unittest.TestCase):
+    def setUp(self):
+        self.nodes = [Node(class_name="android.widget.Button", text="Open", clickable=True),
+                      Node(class_name="android.widget.TextView", text="Title", focusable=True),
+                      Node(class_name="android.widget.CheckBox", text="Agree", checkable=True),
+                      Node(class_name="android.widget.TextView", text="Subtitle", focusable=True)]
+        self.actions = [(index, mode) for index in range(len(self.nodes)) for mode in ['tb_touch', 'touch']]
+
+    def test_plan(self):
+        plan = ActionScheduler().plan(self.nodes, self.actions)
+        self.assertListEqual([[(1, 'tb_touch'), (3, 'tb_touch'), (0, 'tb_touch')],
+                              [(1, 'touch'), (3, 'touch'), (0, 'touch')],
+                              [(2, 'tb_touch')],
+                              [(2, 'touch')]],
+                             plan.batches)
+        self.assertSetEqual(set(self.actions), set(plan.actions))
+        self.assertEqual((8, 4), (plan.naive_reload_count, plan.planned_reload_count))
+
+    def test_plan_for_workers(self):
+        plan = ActionScheduler().plan(self.nodes, self.actions, worker_count=2)
+        self.assertListEqual([[(1, 'tb_touch'), (0, 'tb_touch')],
+                              [(1, 'touch'), (0, 'touch')],
+                              [(3, 'tb_touch'), (2, 'tb_touch')],
+                              [(3, 'touch'), (2, 'touch')]],
+                             plan.batches)
+        self.assertTrue(all(len(set(mode for _, mode in batch)) == 1 for batch in plan.batches))
+        self.assertEqual((8, 4), (plan.naive_reload_count, plan.planned_reload_count))
+
+    def test_learned_outcomes(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "action_outcomes.json")
+            outcomes = ActionOutcomes.load(path)
+            outcomes.record(self.nodes[0], 'touch', True)
+            outcomes.record(self.nodes[1], 'touch', False)
+            outcomes.save()
+            scheduler = ActionScheduler(ActionOutcomes.load(path))
+        self.assertTrue(scheduler.predict_state_preserving(self.nodes[0], 'touch'))
+        self.assertFalse(scheduler.predict_state_preserving(self.nodes[0], 'tb_touch'))
+        self.assertFalse(scheduler.predict_state_preserving(self.nodes[1], 'touch'))
+        self.assertTrue(scheduler.predict_state_preserving(self.nodes[1], 'tb_touch'))
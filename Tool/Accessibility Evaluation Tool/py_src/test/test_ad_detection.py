@@ -0,0 +1,53 @@
+import json
+import os
+import random
+import tempfile
+import unittest
+
+from ad_detection_utils import AdRulePack, CONTAINS_RULE, DEFAULT_AD_EXCLUSION_RULES, DEFAULT_AD_RULES
+
+
+def is_ad_resource_id_reference(resource_id: str) -> bool:
+    # The conditions of NodesFactory.with_ad_detection before the rules were compiled
+    remaining = "/".join(resource_id.split("/")[1:])
+    return (resource_id.endswith("_ad")
+            or resource_id.endswith("_ads")
+            or resource_id.lower() in ['ad', 'abgc', 'cbb']
+            or 'fbAd' in resource_id
+            or 'ad-container' in resource_id
+            or any(x in resource_id.lower() for x in ['mrec', 'native', '_ad_', '_ad', 'ad_', '_ads_', '_ads',
+                                                      'ads_', 'banner', 'af'])
+            or 'Ad frame' in resource_id
+            or resource_id.endswith("Ads")
+            or remaining.startswith('ad_')
+            or remaining.startswith('ads')) and 'add' not in resource_id.lower()
+
+
+class TestAdDetection(unittest.TestCase):
+    def test_default_rules(self):
+        rule_pack = AdRulePack(DEFAULT_AD_RULES, DEFAULT_AD_EXCLUSION_RULES)
+        resource_ids = ["", "ad", "AD", "abgc", "Cbb", "com.example:id/banner_ad", "com.example:id/title",
+                        "com.example:id/ad_view", "com.example:id/ads", "com.example:id/my_ads", "fbAdView",
+                        "com.example:id/add_button", "com.example:id/mRec", "com.example:id/Ad frame",
+                        "com.example:id/Ad_view", "com.example:id/topAds", "com.example:id/AD_VIEW", "a/b/ad_x",
+                        "com.example:id/header", "com.example:id/nativeContainer", "safe", "x\n_ad"]
+        rnd = random.Random(0)
+        alphabet = "adsfADS_/-ex"
+        resource_ids += ["".join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 8))) for _ in range(2000)]
+        for resource_id in resource_ids:
+            self.assertEqual(is_ad_resource_id_reference(resource_id), rule_pack.is_ad_resource_id(resource_id),
+                             resource_id)
+            # The memoized verdict
+            self.assertEqual(is_ad_resource_id_reference(resource_id), rule_pack.is_ad_resource_id(resource_id))
+
+    def test_extra_rules(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            rules_path = os.path.join(tmp_dir, "ad_rules.json")
+            with open(rules_path, "w") as f:
+                json.dump({"rules": [{"type": CONTAINS_RULE, "pattern": "sponsor", "ignore_case": True}],
+                           "exclusion_rules": [{"type": CONTAINS_RULE, "pattern": "header"}]}, f)
+            rule_pack = AdRulePack.create_default(rules_path)
+        self.assertTrue(rule_pack.is_ad_resource_id("com.example:id/Sponsored"))
+        self.assertTrue(rule_pack.is_ad_resource_id("com.example:id/banner_ad"))
+        self.assertFalse(rule_pack.is_ad_resource_id("com.example:id/banner_header"))
+        self.assertTrue(AdRulePack.create_default("missing_rules.json").is_ad_resource_id("banner"))
@@ -0,0 +1,80 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from consts import CONTROLLER_MODES
+from results_utils import AddressBook
+
+
+class TestPerformActionsProgress(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.address_book = AddressBook(Path(self.tmp_dir.name).joinpath("S_1"))
+        self.address_book.initiate()
+        self.assertEqual(0, self.address_book.initiate_perform_actions_task())
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def capture_states(self, index: int, modes=None):
+        for mode in (modes if modes is not None else CONTROLLER_MODES):
+            self.address_book.get_screenshot_path(mode, index).touch()
+            self.address_book.get_layout_path(mode, index).touch()
+
+    def write_results(self, lines):
+        with open(self.address_book.perform_actions_results_path, "w") as f:
+            f.writelines(lines)
+
+    def read_results(self) -> list:
+        with open(self.address_book.perform_actions_results_path) as f:
+            return [json.loads(line)['index'] for line in f.readlines()]
+
+    def test_truncate_partial_results(self):
+        for index in range(3):
+            self.capture_states(index)
+        self.write_results([json.dumps({'index': 0}) + "\n",
+                            json.dumps({'index': 1}) + "\n",
+                            json.dumps({'index': 2})[:5]])
+        self.assertEqual(2, self.address_book.get_completed_action_count())
+        self.assertEqual([0, 1], self.read_results())
+        self.assertFalse(self.address_book.perform_actions_results_path.with_suffix(".tmp").exists())
+
+    def test_truncate_out_of_order_results(self):
+        for index in range(3):
+            self.capture_states(index)
+        self.write_results([json.dumps({'index': 0}) + "\n",
+                            json.dumps({'index': 2}) + "\n",
+                            json.dumps({'index': 1}) + "\n"])
+        self.assertEqual(1, self.address_book.get_completed_action_count())
+        self.assertEqual([0], self.read_results())
+
+    def test_truncate_incomplete_states(self):
+        self.capture_states(0)
+        self.capture_states(1, modes=CONTROLLER_MODES[:-1])
+        self.write_results([json.dumps({'index': 0}) + "\n",
+                            json.dumps({'index': 1}) + "\n"])
+        self.assertEqual(1, self.address_book.initiate_perform_actions_task(resume=True))
+        self.assertEqual([0], self.read_results())
+        self.assertEqual(0, self.address_book.initiate_perform_actions_task(resume=False))
+        self.assertEqual([], self.read_results())
+        self.assertIsNone(self.address_book.get_screenshot_path(CONTROLLER_MODES[0], 0, should_exists=True))
+
+    def test_mode_results(self):
+        self.capture_states(0, modes=['touch'])
+        self.address_book.write_mode_result(0, 'touch', {'touch': {'state': 'COMPLETED'}})
+        self.address_book.write_mode_result(1, 'touch', {'touch': {'state': 'COMPLETED'}})
+        with open(self.address_book.perform_actions_mode_results_path, "a") as f:
+            f.write('{"index": 0, "mo')
+        self.assertEqual({0: {'touch': {'touch': {'state': 'COMPLETED'}}}}, self.address_book.read_mode_results())
+        self.assertEqual({}, self.address_book.read_mode_results(first_index=1))
+
+    def test_progress(self):
+        self.assertIsNone(self.address_book.read_perform_actions_progress())
+        self.address_book.write_perform_actions_progress(2, 5)
+        progress = self.address_book.read_perform_actions_progress()
+        self.assertEqual(2, progress['completed'])
+        self.assertEqual(5, progress['total'])
+        self.assertFalse(progress['finished'])
+        self.address_book.write_perform_actions_progress(5, 5)
+        self.assertTrue(self.address_book.read_perform_actions_progress()['finished'])
@@ -0,0 +1,44 @@
+import asyncio
+import tempfile
+import unittest
+from collections import namedtuple
+from pathlib import Path
+from unittest import mock
+
+from GUI_utils import Node
+from results_utils import AddressBook
+from snapshot import EmulatorSnapshot
+from task.analyze_snapshot import AnalyzeSnapshotIssuesTask
+
+FakeDevice = namedtuple('FakeDevice', ['serial'])
+
+
+class TestAnalyzeSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        address_book = AddressBook(Path(self.tmp_dir.name).joinpath("S_1"))
+        self.task = AnalyzeSnapshotIssuesTask(EmulatorSnapshot(address_book, device=FakeDevice("emulator-5554")))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_find_largest_rectangle(self):
+        rectangles = ["0,0,10,10", "[5,5,20,6]", (0, 0, 6, 20)]
+        self.assertEqual((5, 5, 20, 6), asyncio.run(self.task.find_largest_rectangle(rectangles)))
+        self.assertIsNone(asyncio.run(self.task.find_largest_rectangle([])))
+        self.assertIsNone(asyncio.run(self.task.find_largest_rectangle(None)))
+        self.assertTrue(self.task.is_rectangle_outside(None, (0, 0, 10, 10)))
+
+    def test_update_assertive_nodes(self):
+        assertive_node = Node(live_region='ASSERTIVE')
+        nodes = [Node(), assertive_node]
+        with mock.patch.object(self.task, 'annotate_assertive_nodes') as annotate:
+            self.assertEqual(([assertive_node], 1, 0), self.task.update_assertive_nodes(nodes, [], 0, 0))
+            annotate.assert_called_once_with(1, [assertive_node])
+            self.assertEqual(([assertive_node], 1, 3), self.task.update_assertive_nodes(
+                nodes, [assertive_node], 1, 3))
+            # The patched assertive nodes are annotated even if the assertive nodes are the same
+            self.assertEqual(([assertive_node], 2, 4), self.task.update_assertive_nodes(
+                nodes, [assertive_node], 1, 3, changed=True))
+            self.assertEqual(([], 3, 4), self.task.update_assertive_nodes([Node()], [assertive_node], 2, 4))
+            self.assertEqual(2, annotate.call_count)
@@ -0,0 +1,65 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from app import App
+from results_utils import AddressBook
+from snapshot import Snapshot
+
+
+class TestApp(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.result_path = Path(self.tmp_dir.name)
+        self.app_path = self.result_path.joinpath("com.example(E1)")
+        self.app_path.mkdir()
+        for name in ["S_1", "S_2"]:
+            AddressBook(self.app_path.joinpath(name)).initiate()
+        AddressBook(self.app_path.joinpath("S_1")).finished_path.touch()
+        for name in ["TMP_S_3", "REPLAY_S_1", "SERVER"]:
+            self.app_path.joinpath(name).mkdir()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def read_manifest(self) -> dict:
+        with open(self.app_path.joinpath(App.MANIFEST_NAME)) as f:
+            return {x['name']: x for x in json.load(f)}
+
+    def test_manifest(self):
+        app = App("com.example(E1)", self.result_path)
+        self.assertEqual({"S_1", "S_2"}, set(app.snapshot_paths))
+        self.assertTrue(app.snapshot_metadata["S_1"].finished)
+        self.assertFalse(app.snapshot_metadata["S_2"].finished)
+        manifest = self.read_manifest()
+        self.assertEqual({"S_1", "S_2"}, set(manifest))
+        self.assertEqual(self.app_path.joinpath("S_2").stat().st_mtime_ns, manifest["S_2"]['mtime_ns'])
+
+    def test_refresh_manifest(self):
+        App("com.example(E1)", self.result_path)
+        # The metadata of an unmodified snapshot is read from the manifest
+        manifest = self.read_manifest()
+        manifest["S_1"]['finished'] = False
+        with open(self.app_path.joinpath(App.MANIFEST_NAME), "w") as f:
+            json.dump(list(manifest.values()), f)
+        # The metadata of a modified snapshot is recomputed
+        s2_path = self.app_path.joinpath("S_2")
+        AddressBook(s2_path).finished_path.touch()
+        mtime_ns = manifest["S_2"]['mtime_ns'] + 1_000_000_000
+        os.utime(s2_path, ns=(mtime_ns, mtime_ns))
+        app = App("com.example(E1)", self.result_path)
+        self.assertFalse(app.snapshot_metadata["S_1"].finished)
+        self.assertTrue(app.snapshot_metadata["S_2"].finished)
+        self.assertEqual(mtime_ns, self.read_manifest()["S_2"]['mtime_ns'])
+
+    def test_lazy_snapshots(self):
+        app = App("com.example(E1)", self.result_path)
+        self.assertEqual({}, app.snapshot_map)
+        snapshot = app._get_or_create_snapshot("S_2")
+        self.assertIsInstance(snapshot, Snapshot)
+        self.assertEqual("S_2", snapshot.name)
+        self.assertEqual(["S_2"], list(app.snapshot_map))
+        self.assertIs(snapshot, app._get_or_create_snapshot("S_2"))
+        self.assertIsNone(app._get_or_create_snapshot("TMP_S_3"))
@@ -0,0 +1,31 @@
+import asyncio
+import unittest
+
+from results_utils import gather_or_cancel
+
+
+class TestCaptureState(unittest.TestCase):
+    def test_gather_or_cancel(self):
+        async def value(x, delay):
+            await asyncio.sleep(delay)
+            return x
+
+        self.assertEqual({'a': 1, 'b': 2}, asyncio.run(gather_or_cancel({'a': value(1, 0.02), 'b': value(2, 0)})))
+
+    def test_cancel_on_failure(self):
+        cancelled = []
+
+        async def capture_layout():
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append('layout')
+                raise
+
+        async def get_windows():
+            await asyncio.sleep(0.01)
+            raise ValueError("dumpsys failed")
+
+        with self.assertRaises(ValueError):
+            asyncio.run(gather_or_cancel({'layout': capture_layout(), 'windows': get_windows()}))
+        self.assertListEqual(['layout'], cancelled)
@@ -0,0 +1,37 @@
+import asyncio
+import unittest
+from collections import namedtuple
+
+from device_pool import DevicePool
+
+FakeDevice = namedtuple('FakeDevice', ['serial'])
+
+
+class TestDevicePool(unittest.TestCase):
+    def setUp(self):
+        self.device_pool = DevicePool([FakeDevice("emulator-5554"), FakeDevice("emulator-5556")])
+
+    def test_run(self):
+        executed_jobs = {}
+        finished_positions = []
+
+        async def function(device, job):
+            await asyncio.sleep(0.01 * (job % 3))
+            executed_jobs[job] = device.serial
+            return job * 2
+
+        results = asyncio.run(self.device_pool.run(function, list(range(10)),
+                                                   on_result=lambda position, _: finished_positions.append(position)))
+        self.assertListEqual([job * 2 for job in range(10)], results)
+        self.assertSetEqual(set(range(10)), set(finished_positions))
+        self.assertSetEqual({"emulator-5554", "emulator-5556"}, set(executed_jobs.values()))
+
+    def test_failed_job(self):
+        async def function(device, job):
+            if job == 1:
+                raise ValueError("Failed")
+            await asyncio.sleep(0.01)
+            return job
+
+        with self.assertRaises(ValueError):
+            asyncio.run(self.device_pool.run(function, list(range(10))))
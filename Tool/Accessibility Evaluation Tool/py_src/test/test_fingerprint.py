@@ -0,0 +1,108 @@
+import os
+import tempfile
+import unittest
+
+from GUI_utils import NodesFactory, is_in_same_state_layout
+from fingerprint_utils import FingerprintConfig, StateFingerprintIndex, compute_state_fingerprint, \
+    find_different_subtrees
+from node_table import NodeTable
+
+layout_template = '''<hierarchy rotation="0">
+  <node index="0" class="android.widget.FrameLayout" package="com.example" visible="true" bounds="[0,0][1080,2220]">
+    <node index="0" text="{title}" class="android.widget.TextView" package="com.example" focused="{focused}"
+          visible="true" bounds="{title_bounds}" />
+    <node index="1" class="android.widget.LinearLayout" package="com.example" visible="true"
+          bounds="[0,200][1080,400]">
+      <node index="0" text="First" class="android.widget.TextView" package="com.example" visible="true"
+            bounds="[0,200][1080,300]" />
+      <node index="1" text="{second}" class="android.widget.TextView" package="com.example" visible="true"
+            bounds="[0,300][1080,400]" />
+    </node>
+    <node index="2" resource-id="com.example:id/banner_ad" class="android.widget.FrameLayout" package="com.ads"
+          visible="true" bounds="[0,400][1080,600]">
+      <node index="0" text="{ad}" class="android.widget.TextView" package="com.ads" visible="true"
+            bounds="[0,400][1080,600]" />
+    </node>
+  </node>
+</hierarchy>
+'''
+
+
+def create_layout(title="Title", focused="false", title_bounds="[0,0][1080,200]", second="Second", ad="Ad 1"):
+    return layout_template.format(title=title, focused=focused, title_bounds=title_bounds, second=second, ad=ad)
+
+
+def build(layout: str, config: FingerprintConfig = None):
+    return NodesFactory() \
+        .with_layout(layout) \
+        .with_xpath_pass() \
+        .with_ad_detection() \
+        .with_fingerprint_pass(config) \
+        .build()
+
+
+class TestFingerprint(unittest.TestCase):
+    def test_same_state(self):
+        layout = create_layout()
+        self.assertTrue(is_in_same_state_layout(layout, layout))
+        self.assertTrue(is_in_same_state_layout(layout, create_layout(focused="true", title_bounds="[0,0][10,10]")))
+        self.assertTrue(is_in_same_state_layout(layout, create_layout(ad="Ad 2")))
+        self.assertFalse(is_in_same_state_layout(layout, create_layout(second="Third")))
+        self.assertTrue(is_in_same_state_layout(layout, create_layout(second="Third"),
+                                                extra_excluded_attributes=['text']))
+        self.assertFalse(is_in_same_state_layout(layout, "PROBLEM_WITH_XML"))
+
+    def test_state_fingerprint_of_table(self):
+        config = FingerprintConfig.for_state_comparison(package_name="com.example")
+        nodes = build(create_layout(), config)
+        table = NodeTable.from_nodes(nodes)
+        self.assertEqual(compute_state_fingerprint(nodes, config), compute_state_fingerprint(table, config))
+        self.assertNotEqual(compute_state_fingerprint(nodes, FingerprintConfig.for_state_comparison()),
+                            compute_state_fingerprint(nodes, FingerprintConfig()))
+        self.assertIsNone(compute_state_fingerprint(nodes, FingerprintConfig.for_state_comparison(
+            package_name="com.other")))
+
+    def test_exact_state_fingerprint(self):
+        config = FingerprintConfig.for_exact_state()
+        fingerprint = compute_state_fingerprint(build(create_layout(), config), config)
+        self.assertEqual(fingerprint, compute_state_fingerprint(build(create_layout(), config), config))
+        for layout in [create_layout(title_bounds="[0,0][10,10]"), create_layout(ad="Ad 2"),
+                       create_layout(focused="true")]:
+            self.assertNotEqual(fingerprint, compute_state_fingerprint(build(layout, config), config))
+
+    def test_find_different_subtrees(self):
+        config = FingerprintConfig.for_state_comparison()
+        nodes1 = build(create_layout())
+        self.assertListEqual([], find_different_subtrees(nodes1, build(create_layout(ad="Ad 2")), config))
+        nodes2 = build(create_layout(second="Third"))
+        diff = find_different_subtrees(nodes1, nodes2, config)
+        self.assertEqual(1, len(diff))
+        self.assertEqual("Second", diff[0][0].text)
+        self.assertEqual("Third", diff[0][1].text)
+        diff = find_different_subtrees(NodeTable.from_nodes(nodes1), NodeTable.from_nodes(nodes2), config)
+        self.assertListEqual([(nodes1[4].xpath, nodes2[4].xpath)], [(x.xpath, y.xpath) for x, y in diff])
+        nodes3 = build(create_layout().replace('class="android.widget.LinearLayout"', 'class="android.view.View"'))
+        diff = find_different_subtrees(nodes1, nodes3, config)
+        self.assertListEqual([(nodes1[2], None), (None, nodes3[2])], diff)
+
+    def test_state_fingerprint_index(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "fingerprints.json")
+            self.assertIsNone(StateFingerprintIndex.load(path, "key"))
+            index = StateFingerprintIndex(path, "key")
+            index.add("S_2", "a")
+            index.add("S_1", "a")
+            index.add("S_3", None)
+            index.add("S_4", "b")
+            index.add("S_4", "c")
+            index.save()
+            loaded_index = StateFingerprintIndex.load(path, "key")
+            self.assertIsNone(StateFingerprintIndex.load(path, "another key"))
+        for x in [index, loaded_index]:
+            self.assertEqual("S_1", x.find("a"))
+            self.assertIsNone(x.find("b"))
+            self.assertEqual("S_4", x.find("c"))
+            self.assertIsNone(x.find(None))
+            self.assertIn("S_3", x)
+        loaded_index.remove("S_1")
+        self.assertEqual("S_2", loaded_index.find("a"))
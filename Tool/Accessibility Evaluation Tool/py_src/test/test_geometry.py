@@ -0,0 +1,54 @@
+import random
+import unittest
+
+import geometry_utils
+from GUI_utils import Node, NodesFactory, bounds_included, calculate_overlap
+from node_table import NodeTable
+
+SCREEN_BOUNDS = (0, 0, 1080, 2220)
+
+
+class TestGeometry(unittest.TestCase):
+    def setUp(self):
+        rnd = random.Random(0)
+        self.bounds_list = [(0, 0, 0, 0), (0, 0, 1080, 2220), (100, 100, 100, 300)]
+        for _ in range(100):
+            left, top = rnd.randint(-200, 1200), rnd.randint(-200, 2400)
+            self.bounds_list.append((left, top, left + rnd.randint(-10, 600), top + rnd.randint(-10, 600)))
+        self.nodes = [Node(bounds=bounds) for bounds in self.bounds_list]
+        self.bounds = geometry_utils.to_bounds_array(self.nodes)
+
+    def test_pairwise(self):
+        containment = geometry_utils.containment_matrix(self.bounds, self.bounds)
+        overlaps, overlap_mask = geometry_utils.overlap_matrix(self.bounds, self.bounds)
+        for i, bounds1 in enumerate(self.bounds_list):
+            for j, bounds2 in enumerate(self.bounds_list):
+                self.assertEqual(bounds_included(bounds1, bounds2), containment[i, j])
+                overlap = calculate_overlap(bounds1, bounds2)
+                self.assertEqual(overlap is not None, overlap_mask[i, j])
+                if overlap is not None:
+                    self.assertEqual(overlap, tuple(overlaps[i, j].tolist()))
+
+    def test_node_methods(self):
+        self.assertListEqual([node.area() for node in self.nodes], Node.get_areas(self.nodes))
+        self.assertListEqual([node.is_valid_bounds() for node in self.nodes],
+                             geometry_utils.valid_bounds_mask(self.bounds).tolist())
+        self.assertListEqual([node.is_out_of_bounds(SCREEN_BOUNDS) for node in self.nodes],
+                             Node.get_out_of_bounds_list(self.nodes, SCREEN_BOUNDS))
+        self.assertListEqual([node.get_normalized_bounds(SCREEN_BOUNDS) for node in self.nodes],
+                             Node.get_normalized_bounds_list(self.nodes, SCREEN_BOUNDS))
+        self.assertListEqual([], Node.get_areas([]))
+
+    def test_node_table(self):
+        layout = '<hierarchy><node class="A" bounds="[0,0][100,200]"><node class="B" bounds="[10,10][5000,20]" />' \
+                 '</node></hierarchy>'
+        table = NodeTable.from_nodes(NodesFactory().with_layout(layout).with_xpath_pass().build())
+        self.assertListEqual([20000, 49900], Node.get_areas(table))
+        self.assertListEqual([False, True], Node.get_out_of_bounds_list(table, SCREEN_BOUNDS))
+
+    def test_rectangles(self):
+        rectangles = [(0, 0, 10, 10), (5, 5, 20, 6), (0, 0, 6, 20), (100, 100, 1, 1)]
+        self.assertEqual(1, geometry_utils.find_largest_rectangle(rectangles))
+        self.assertIsNone(geometry_utils.find_largest_rectangle([]))
+        outside = geometry_utils.outside_mask((0, 0, 50, 50), geometry_utils.to_bounds_array(rectangles))
+        self.assertListEqual([False, False, False, True], outside.tolist())
@@ -0,0 +1,118 @@
+import os
+import tempfile
+import unittest
+
+from GUI_utils import is_in_same_state_layout
+from fingerprint_utils import FingerprintConfig
+from layout_diff_utils import LayoutDiff, diff_layout_paths, diff_layouts
+
+layout_str = '''<hierarchy rotation="0">
+  <node index="0" class="android.widget.FrameLayout" package="com.example" visible="true" bounds="[0,0][1080,2220]">
+    <node index="0" text="Title" resource-id="com.example:id/title" class="android.widget.TextView"
+          package="com.example" visible="true" bounds="[0,0][1080,200]" />
+    <node index="1" class="android.widget.LinearLayout" package="com.example" visible="true"
+          bounds="[0,200][1080,400]">
+      <node index="0" text="OK" class="android.widget.Button" package="com.example" visible="true"
+            bounds="[0,200][500,400]" />
+    </node>
+    <node index="2" resource-id="com.example:id/banner_ad" class="android.widget.ImageView"
+          package="com.example" visible="true" bounds="[0,400][1080,600]" />
+  </node>
+</hierarchy>
+'''
+
+changed_layout_str = '''<hierarchy rotation="0">
+  <node index="0" class="android.widget.FrameLayout" package="com.example" visible="true" bounds="[0,0][1080,2220]">
+    <node index="0" text="New Title" resource-id="com.example:id/title" class="android.widget.TextView"
+          package="com.example" visible="true" bounds="[0,0][1080,200]" />
+    <node index="1" class="android.widget.RelativeLayout" package="com.example" visible="true"
+          bounds="[0,200][1080,400]">
+      <node index="0" text="OK" class="android.widget.Button" package="com.example" visible="true"
+            bounds="[0,200][500,400]" />
+      <node index="1" class="android.view.View" package="com.example" visible="true"
+            bounds="[500,200][1080,400]" />
+    </node>
+    <node index="2" resource-id="com.example:id/banner_ad" class="android.widget.ImageView"
+          package="com.example" visible="true" bounds="[0,400][1080,700]" />
+  </node>
+</hierarchy>
+'''
+
+swapped_layout_str = '''<hierarchy rotation="0">
+  <node index="0" class="android.widget.FrameLayout" package="com.example" visible="true" bounds="[0,0][1080,2220]">
+    <node index="0" class="android.widget.LinearLayout" package="com.example" visible="true"
+          bounds="[0,200][1080,400]">
+      <node index="0" text="OK" class="android.widget.Button" package="com.example" visible="true"
+            bounds="[0,200][500,400]" />
+    </node>
+    <node index="1" text="Title" resource-id="com.example:id/title" class="android.widget.TextView"
+          package="com.example" visible="true" bounds="[0,0][1080,200]" />
+    <node index="2" resource-id="com.example:id/banner_ad" class="android.widget.ImageView"
+          package="com.example" visible="true" bounds="[0,400][1080,600]" />
+  </node>
+</hierarchy>
+'''
+
+ad_layout_str = '''<hierarchy rotation="0">
+  <node index="0" resource-id="com.example:id/banner_ad" class="android.widget.ImageView"
+        package="com.example" visible="true" bounds="[0,400][1080,600]" />
+</hierarchy>
+'''
+
+
+class TestLayoutDiff(unittest.TestCase):
+    def test_same_layout(self):
+        self.assertTrue(diff_layouts(layout_str, layout_str).is_empty())
+
+    def test_diff(self):
+        layout_diff = diff_layouts(layout_str, changed_layout_str)
+        self.assertListEqual([{'xpath': '/android.widget.FrameLayout/android.widget.TextView',
+                               'changed_attributes': {'text': ['Title', 'New Title']}},
+                              {'xpath': '/android.widget.FrameLayout/android.widget.ImageView',
+                               'changed_attributes': {'bounds': [[0, 400, 1080, 600], [0, 400, 1080, 700]]}}],
+                             layout_diff.changed)
+        self.assertListEqual([{'from_xpath': '/android.widget.FrameLayout/android.widget.LinearLayout/'
+                                             'android.widget.Button',
+                               'to_xpath': '/android.widget.FrameLayout/android.widget.RelativeLayout/'
+                                           'android.widget.Button',
+                               'changed_attributes': {}}],
+                             layout_diff.moved)
+        self.assertListEqual(['android.widget.RelativeLayout', 'android.view.View'],
+                             [x['class_name'] for x in layout_diff.inserted])
+        self.assertListEqual(['android.widget.LinearLayout'], [x['class_name'] for x in layout_diff.removed])
+
+    def test_ignored_ads_and_attributes(self):
+        config = FingerprintConfig.for_state_comparison(extra_excluded_attributes=['text'])
+        layout_diff = diff_layouts(layout_str, changed_layout_str, config)
+        self.assertListEqual([], layout_diff.changed)
+        self.assertEqual({'inserted': 2, 'removed': 1, 'moved': 1, 'changed': 0, 'reordered': 0},
+                         layout_diff.change_count())
+
+    def test_agrees_with_same_state(self):
+        config = FingerprintConfig.for_state_comparison()
+        for layout1, layout2 in [(layout_str, layout_str),
+                                 (layout_str, changed_layout_str),
+                                 (layout_str, swapped_layout_str),
+                                 (ad_layout_str, ad_layout_str),
+                                 (layout_str, ad_layout_str)]:
+            layout_diff = diff_layouts(layout1, layout2, config)
+            self.assertEqual(is_in_same_state_layout(layout1, layout2), layout_diff.is_empty())
+        layout_diff = diff_layouts(layout_str, swapped_layout_str, config)
+        self.assertEqual(1, len(layout_diff.reordered))
+        self.assertEqual('/android.widget.FrameLayout', layout_diff.reordered[0]['xpath'])
+        self.assertTrue(diff_layouts(ad_layout_str, ad_layout_str, config).no_state)
+
+    def test_cached_diff(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            layout_paths = [os.path.join(tmp_dir, "1.xml"), os.path.join(tmp_dir, "2.xml")]
+            for path, layout in zip(layout_paths, [layout_str, changed_layout_str]):
+                with open(path, "w") as f:
+                    f.write(layout)
+            cache_dir = os.path.join(tmp_dir, "diffs")
+            layout_diff = diff_layout_paths(layout_paths[0], layout_paths[1], cache_dir=cache_dir)
+            self.assertEqual(1, len(os.listdir(cache_dir)))
+            cached_diff = diff_layout_paths(layout_paths[0], layout_paths[1], cache_dir=cache_dir)
+            self.assertEqual(layout_diff.toJSON(), cached_diff.toJSON())
+            self.assertEqual(layout_diff.toJSON(), LayoutDiff.createFromDict(layout_diff.toJSON()).toJSON())
+            diff_layout_paths(layout_paths[1], layout_paths[0], cache_dir=cache_dir)
+            self.assertEqual(2, len(os.listdir(cache_dir)))
@@ -0,0 +1,66 @@
+import json
+import unittest
+
+from layout_patch_utils import LiveLayout, get_window_content_changes
+
+layout_str = '''<?xml version="1.0" encoding="UTF-8"?>
+<hierarchy rotation="0">
+  <node index="0" text="" resource-id="" class="android.widget.FrameLayout" package="com.example" content-desc=""
+        visible="true" bounds="[0,0][1080,2220]">
+    <node index="0" text="Slide 1" resource-id="com.example:id/slide" class="android.widget.TextView"
+          package="com.example" content-desc="" visible="true" live-region="2" bounds="[0,0][1080,200]" />
+    <node index="1" text="" resource-id="com.example:id/carousel" class="android.widget.FrameLayout"
+          package="com.example" content-desc="" visible="true" bounds="[0,200][1080,400]">
+      <node index="0" text="Ad" resource-id="" class="android.widget.TextView" package="com.example"
+            content-desc="" visible="true" bounds="[0,200][1080,400]" />
+    </node>
+  </node>
+</hierarchy>
+'''
+
+
+def event_line(element: dict = None, changed_window: int = 1) -> str:
+    change = {'changedWindowId': changed_window, 'activeWindowId': 1}
+    if element is not None:
+        change['Element'] = element
+    return f"12:00:00 WindowContentChange: {json.dumps(change)}"
+
+
+class TestLayoutPatch(unittest.TestCase):
+    def test_get_window_content_changes(self):
+        element = {'xpath': '/a', 'text': 'b'}
+        log = "\n".join([event_line(element), event_line(None, changed_window=2), "Other event"])
+        self.assertListEqual([element], get_window_content_changes(log))
+        self.assertListEqual([], get_window_content_changes("Other event"))
+        self.assertIsNone(get_window_content_changes(event_line(None)))
+        self.assertIsNone(get_window_content_changes("WindowContentChange: {"))
+
+    def test_apply_changes(self):
+        live_layout = LiveLayout.from_layout(layout_str)
+        slide = live_layout.nodes[1]
+        patched_nodes = live_layout.apply_changes([{'xpath': slide.xpath,
+                                                    'class_name': slide.class_name,
+                                                    'resource_id': slide.resource_id,
+                                                    'text': 'Slide 2',
+                                                    'bounds': '[0,10][1080,210]'}])
+        self.assertListEqual([slide], patched_nodes)
+        self.assertEqual(('Slide 2', (0, 10, 1080, 210), 'ASSERTIVE'),
+                         (slide.text, slide.bounds, slide.live_region))
+        self.assertEqual(1, live_layout.patch_count)
+
+        carousel = live_layout.nodes[2]
+        unpatchable_changes = [
+            [],
+            [{'xpath': slide.xpath, 'class_name': 'android.widget.Button', 'resource_id': slide.resource_id}],
+            [{'xpath': carousel.xpath, 'class_name': carousel.class_name, 'resource_id': carousel.resource_id}],
+            [{'xpath': '/android.widget.FrameLayout/android.widget.Button', 'class_name': 'android.widget.Button'}],
+        ]
+        for changes in unpatchable_changes:
+            self.assertIsNone(live_layout.apply_changes(changes))
+        self.assertIsNone(live_layout.apply_changes(None))
+        # A partially applicable list of changes is not applied
+        self.assertIsNone(live_layout.apply_changes(
+            [{'xpath': slide.xpath, 'class_name': slide.class_name, 'resource_id': slide.resource_id, 'text': 'X'},
+             unpatchable_changes[1][0]]))
+        self.assertEqual('Slide 2', slide.text)
+        self.assertEqual(1, live_layout.patch_count)
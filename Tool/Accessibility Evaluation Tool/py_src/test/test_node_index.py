@@ -0,0 +1,45 @@
+import unittest
+
+from GUI_utils import NodesFactory
+from node_index_utils import NodeIndexes, get_identifiers
+from node_table import NodeTable
+
+layout_str = '''<hierarchy rotation="0">
+  <node index="0" class="android.widget.FrameLayout" bounds="[0,0][1080,2220]">
+    <node index="0" class="android.widget.LinearLayout" resource-id="com.example:id/item" bounds="[0,0][1080,200]">
+      <node index="0" class="android.widget.TextView" text="First" bounds="[0,0][1080,100]" />
+      <node index="1" class="android.widget.TextView" text="Same" bounds="[0,100][1080,200]" />
+    </node>
+    <node index="1" class="android.widget.LinearLayout" resource-id="com.example:id/item" bounds="[0,200][1080,400]">
+      <node index="0" class="android.widget.TextView" text="Same" bounds="[0,200][1080,300]" />
+    </node>
+    <node index="2" class="android.widget.LinearLayoutCompat" bounds="[0,400][1080,600]" />
+  </node>
+</hierarchy>
+'''
+
+
+class TestNodeIndex(unittest.TestCase):
+    def setUp(self):
+        self.nodes = NodeTable.from_nodes(NodesFactory().with_layout(layout_str).with_xpath_pass().build())
+        self.indexes = NodeIndexes(self.nodes)
+
+    def test_attribute_indexes(self):
+        for node in self.nodes:
+            self.assertListEqual([x for x in self.nodes if get_identifiers(x) == get_identifiers(node)],
+                                 self.indexes.get_nodes_by_identifiers(*get_identifiers(node)))
+            self.assertListEqual([x for x in self.nodes if x.resource_id == node.resource_id],
+                                 self.indexes.get_nodes_by_resource_id(node.resource_id))
+            self.assertListEqual([x for x in self.nodes if node.almost_same_xpath(x)],
+                                 self.indexes.get_similar_nodes(node))
+        self.assertEqual(2, len(self.indexes.get_nodes_by_identifiers("android.widget.TextView", "", "", "Same")))
+        self.assertListEqual([], self.indexes.get_nodes_by_resource_id("com.example:id/missing"))
+
+    def test_xpath_prefix(self):
+        xpaths = [node.xpath for node in self.nodes]
+        prefixes = ["", "/", "/android.widget.FrameLayout", "/android.widget.FrameLayout/android.widget.LinearLayout",
+                    "/android.widget.FrameLayout/android.widget.LinearLayout[", "/android.widget.Frame",
+                    xpaths[2], xpaths[2] + "/", "/android.widget.Button"]
+        for prefix in prefixes:
+            self.assertListEqual([x for x in self.nodes if x.xpath.startswith(prefix)],
+                                 self.indexes.get_nodes_with_xpath_prefix(prefix))
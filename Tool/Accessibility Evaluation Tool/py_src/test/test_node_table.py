@@ -0,0 +1,123 @@
+import gc
+import os
+import tempfile
+import unittest
+
+from GUI_utils import NodesFactory
+from node_table import NodeTable
+
+layout_str = '''<hierarchy rotation="0">
+  <node index="0" class="android.widget.FrameLayout" package="com.example" visible="true" drawingOrder="0"
+        bounds="[0,0][1080,2220]">
+    <node index="0" text="Title" resource-id="com.example:id/title" class="android.widget.TextView"
+          package="com.example" visible="true" clickable="true" drawingOrder="1" actionList="4-8-16"
+          live-region="1" bounds="[0,0][1080,200]" />
+    <node index="1" resource-id="com.example:id/banner_ad" class="android.widget.LinearLayout"
+          package="com.example" visible="true" drawingOrder="2" bounds="[0,200][1080,400]">
+      <node index="0" class="android.widget.ImageView" content-desc="Ad" package="com.example" visible="false"
+            drawingOrder="1" bounds="[0,200][1080,400]" />
+    </node>
+    <node index="2" class="android.widget.TextView" package="com.example" text="Covered" visible="true"
+          drawingOrder="1" bounds="[0,0][1080,200]" />
+  </node>
+</hierarchy>
+'''
+
+
+class TestNodeTable(unittest.TestCase):
+    def setUp(self):
+        self.nodes = NodesFactory() \
+            .with_layout(layout_str) \
+            .with_xpath_pass() \
+            .with_ad_detection() \
+            .with_covered_pass() \
+            .build()
+        self.table = NodeTable.from_nodes(self.nodes)
+
+    def test_views(self):
+        self.assertEqual(len(self.nodes), len(self.table))
+        for node, view in zip(self.nodes, self.table):
+            self.assertEqual(node.toJSONStr(), view.toJSONStr())
+            self.assertEqual(str(node), str(view))
+            self.assertEqual(node.is_practically_invisible(), view.is_practically_invisible())
+            self.assertListEqual([x.xpath for x in node.children_nodes], [x.xpath for x in view.children_nodes])
+        self.assertIsNone(self.table[0].parent_node)
+        self.assertIs(self.table[2], self.table[3].parent_node)
+        self.assertIs(self.table[1], self.table[1])
+        self.assertEqual(self.table[-1], self.table[4])
+        self.assertListEqual([4, 8, 16], self.table[1].a11y_actions)
+        self.assertEqual((0, 200, 1080, 400), self.table[2].bounds)
+        self.assertTrue(self.table[3].is_practically_invisible())
+
+    def test_xpath_to_node(self):
+        xpath_to_node = self.table.xpath_to_node
+        for node in self.nodes:
+            self.assertIn(node.xpath, xpath_to_node)
+            self.assertEqual(node.xpath, xpath_to_node[node.xpath].xpath)
+        self.assertNotIn("/android.widget.FrameLayout/android.widget.TextView", xpath_to_node)
+        self.assertNotIn("", xpath_to_node)
+        self.assertListEqual([node.xpath for node in self.nodes], list(xpath_to_node))
+        new_xpath = "/android.widget.FrameLayout/android.widget.Button"
+        xpath_to_node[new_xpath] = self.nodes[1]
+        del xpath_to_node[self.nodes[4].xpath]
+        self.assertIs(self.nodes[1], self.table.xpath_to_node[new_xpath])
+        self.assertNotIn(self.nodes[4].xpath, self.table.xpath_to_node)
+        self.assertListEqual([node.xpath for node in self.nodes[:4]] + [new_xpath], list(xpath_to_node))
+
+    def test_writable_command_attributes(self):
+        view = self.table[1]
+        view.action = 'focus'
+        self.assertEqual('focus', self.table[1].action)
+        del view
+        gc.collect()
+        self.assertEqual(('focus', 'xpath', False), (self.table[1].action, self.table[1].located_by,
+                                                     self.table[1].skip))
+        self.assertEqual('click', self.table[2].action)
+        with self.assertRaises(AttributeError):
+            self.table[1].text = "Another title"
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "nodes.bin")
+            self.table.save(path, b"0" * 16)
+            loaded_table = NodeTable.load(path, b"0" * 16)
+            self.assertIsNone(NodeTable.load(path, b"1" * 16))
+            self.assertIsNone(NodeTable.load(os.path.join(tmp_dir, "missing.bin"), b"0" * 16))
+            with open(path, "rb") as f:
+                content = f.read()
+            with open(path, "wb") as f:
+                f.write(content[:-10])
+            self.assertIsNone(NodeTable.load(path, b"0" * 16))
+        self.assertEqual(len(self.table), len(loaded_table))
+        for view, loaded_view in zip(self.table, loaded_table):
+            self.assertEqual(view.toJSONStr(), loaded_view.toJSONStr())
+            self.assertEqual(view.is_practically_invisible(), loaded_view.is_practically_invisible())
+            self.assertEqual(view.parent_node is None, loaded_view.parent_node is None)
+            self.assertListEqual(self.table.get_text_description(view.position),
+                                 loaded_table.get_text_description(loaded_view.position))
+        self.assertListEqual(list(self.table.xpath_to_node), list(loaded_table.xpath_to_node))
+
+    def test_text_descriptions(self):
+        def get_text_description_reference(node, depth, excluded_xpaths):
+            # The recursive definition of Snapshot.get_text_description
+            if depth <= 0:
+                return []
+            if node.content_desc:
+                return [node.content_desc]
+            if node.text:
+                return [node.text]
+            text_description = []
+            for child in node.children_nodes:
+                if child.xpath in excluded_xpaths:
+                    continue
+                text_description.extend(get_text_description_reference(child, depth - 1, excluded_xpaths))
+            return [x.strip() for x in text_description if len(x.strip()) > 0]
+
+        self.assertListEqual([2, 0, 1, 0, 0], list(self.table.heights))
+        for excluded_xpaths in [[], [self.nodes[3].xpath], [self.nodes[1].xpath, self.nodes[4].xpath]]:
+            for depth in [0, 1, 2, 3, 1000]:
+                for node, view in zip(self.nodes, self.table):
+                    self.assertListEqual(get_text_description_reference(node, depth, excluded_xpaths),
+                                         self.table.get_text_description(view.position, depth, excluded_xpaths))
+        self.assertListEqual(["Title", "Ad", "Covered"], self.table.get_text_description(0))
+        self.assertListEqual(["Title", "Covered"], self.table.get_text_description(0, 2))
@@ -0,0 +1,238 @@
+from collections import Counter, defaultdict
+import os
+import random
+import tempfile
+import unittest
+
+from lxml import etree
+
+from GUI_utils import Node, NodesFactory, ParsedLayoutCache, RectangleIndex, XPathIndex, bounds_included, \
+    calculate_overlap, get_element_from_xpath, get_xpath_from_xml_element, longest_subsequence_substring, \
+    simplify_xpath
+
+layout_str = '''<?xml version="1.0" encoding="UTF-8"?>
+<hierarchy rotation="0">
+  <node index="0" text="" resource-id="" class="android.widget.FrameLayout" package="com.example" content-desc=""
+        visible="true" clickable="false" drawingOrder="0" actionList="" bounds="[0,0][1080,2220]">
+    <node index="0" text="Title" resource-id="com.example:id/title" class="android.widget.TextView"
+          package="com.example" content-desc="null" visible="true" clickable="true" drawingOrder="1"
+          actionList="4-8-16" live-region="2" bounds="[0,0][1080,200]" />
+    <node index="1" text="null" resource-id="com.example:id/banner_ad" class="android.widget.FrameLayout"
+          package="com.example" content-desc="" visible="true" drawingOrder="2" bounds="[0,200][1080,400]">
+      <node index="0" text="Test Ad" resource-id="" class="android.widget.TextView" package="com.example"
+            content-desc="" visible="true" drawingOrder="1" bounds="[0,200][1080,400]" />
+    </node>
+    <node index="2" text="" resource-id="" class="android.widget.TextView" package="com.example"
+          content-desc="Hidden" visible="true" drawingOrder="1" bounds="[0,0][1080,200]" />
+    <extra>
+      <node index="0" text="Not a child" class="android.widget.Button" bounds="[0,0][10,10]" />
+    </extra>
+  </node>
+</hierarchy>
+'''
+
+
+class TestNodesFactory(unittest.TestCase):
+    def test_create_node_from_xml_element(self):
+        root = etree.fromstring(layout_str.encode('utf-8'))
+        for element in root.iter('node'):
+            node = Node.createNodeFromXmlElement(element)
+            expected_node = Node(**element.attrib)
+            self.assertEqual(expected_node.toJSONStr(), node.toJSONStr())
+            self.assertListEqual(list(expected_node.__dict__.keys()), list(node.__dict__.keys()))
+            self.assertIs(element, node.xml_element)
+
+    def test_build(self):
+        nodes = NodesFactory() \
+            .with_layout(layout_str) \
+            .with_xpath_pass() \
+            .with_ad_detection() \
+            .with_covered_pass() \
+            .build()
+        self.assertListEqual(["/android.widget.FrameLayout",
+                              "/android.widget.FrameLayout/android.widget.TextView[1]",
+                              "/android.widget.FrameLayout/android.widget.FrameLayout",
+                              "/android.widget.FrameLayout/android.widget.FrameLayout/android.widget.TextView",
+                              "/android.widget.FrameLayout/android.widget.TextView[2]"],
+                             [node.xpath for node in nodes])
+        self.assertListEqual([False, False, True, True, False], [node.is_ad for node in nodes])
+        self.assertListEqual([False, False, False, False, True], [node.covered for node in nodes])
+        self.assertIsNone(nodes[0].parent_node.parent_node)
+        self.assertListEqual(nodes[1:3] + nodes[4:], nodes[0].children_nodes)
+        self.assertIs(nodes[0], nodes[3].parent_node.parent_node)
+        self.assertEqual("ASSERTIVE", nodes[1].live_region)
+        self.assertEqual("", nodes[2].text)
+
+    def test_covered_descendant(self):
+        # The overlay covers the button of the container, but not the container itself
+        layout = '''<hierarchy rotation="0">
+  <node index="0" class="android.widget.FrameLayout" visible="true" drawingOrder="0" bounds="[0,0][1080,2220]">
+    <node index="0" class="android.widget.LinearLayout" visible="true" drawingOrder="1" bounds="[0,0][1080,400]">
+      <node index="0" class="android.widget.Button" visible="true" drawingOrder="1" bounds="[0,0][500,200]" />
+      <node index="1" class="android.widget.Button" visible="true" drawingOrder="2" bounds="[0,200][500,400]" />
+    </node>
+    <node index="1" class="android.view.View" visible="true" drawingOrder="2" bounds="[0,0][1080,200]" />
+  </node>
+</hierarchy>
+'''
+        nodes = NodesFactory().with_layout(layout).with_covered_pass().build()
+        self.assertListEqual([False, False, True, False, False], [node.covered for node in nodes])
+        # The pass does not depend on whether the children of the children are already attached
+        calculate_covered = NodesFactory().with_covered_pass().passes[0]
+        children = [Node(bounds=" ".join(map(str, node.bounds)), drawing_order=node.drawing_order)
+                    for node in nodes[0].children_nodes]
+        child_to_extras_map = defaultdict(dict)
+        calculate_covered(Node(bounds="0 0 1080 2220"), {}, children, child_to_extras_map)
+        self.assertListEqual([[(0, 0, 1080, 200)], []], [list(child_to_extras_map[child].values())[0]
+                                                         for child in children])
+
+    def test_build_deep_layout(self):
+        depth = 200
+        layout = '<hierarchy>' + '<node class="android.widget.FrameLayout" bounds="[0,0][10,10]">' * depth + \
+                 '</node>' * depth + '</hierarchy>'
+        nodes = NodesFactory().with_layout(layout).with_xpath_pass().build()
+        self.assertEqual(depth, len(nodes))
+        self.assertEqual("/android.widget.FrameLayout" * depth, nodes[-1].xpath)
+
+    def test_build_malformed_layout(self):
+        self.assertListEqual([], NodesFactory().with_layout("PROBLEM_WITH_XML").build())
+        self.assertListEqual([], NodesFactory().with_layout("").build())
+
+    def test_visible_descendant_count(self):
+        nodes = NodesFactory().with_layout(layout_str).with_xpath_pass().with_covered_pass().build()
+        self.assertEqual(4, nodes[0].visible_descendant_count)
+        self.assertNotIn('visible_descendant_count', nodes[0].toJSON())
+        for node in nodes:
+            self.assertEqual(len(node.xml_element.findall('.//node[@visible="true"]')),
+                             node.visible_descendant_count)
+            practically_invisible = node.is_practically_invisible()
+            node.visible_descendant_count = None
+            self.assertEqual(practically_invisible, node.is_practically_invisible())
+
+    def test_rectangle_index(self):
+        rnd = random.Random(0)
+
+        def random_rectangle():
+            left, top = rnd.randint(-100, 1000), rnd.randint(-100, 2000)
+            return left, top, left + rnd.randint(1, 600), top + rnd.randint(1, 600)
+
+        rectangles = [random_rectangle() for _ in range(120)] + [(-5000, -5000, 5000, 5000)]
+        index = RectangleIndex(cell_size=64)
+        for i, rectangle in enumerate(rectangles):
+            for query in [random_rectangle() for _ in range(5)] + [rectangle]:
+                expected_overlaps = [calculate_overlap(x, query) for x in rectangles[:i]]
+                self.assertListEqual([x for x in expected_overlaps if x], index.overlaps(query))
+                self.assertEqual(any(bounds_included(x, query) for x in rectangles[:i]), index.covers(query))
+            index.add(rectangle)
+
+    def test_xpath_index(self):
+        def get_xpath_reference(element):
+            # The recursive definition of the xpaths of NodesFactory.with_xpath_pass
+            parent = element.getparent()
+            if parent is None:
+                return ""
+            class_name = element.get('class', '')
+            siblings = [x for x in parent if x.tag == "node" and x.get('class', '') == class_name]
+            if len(siblings) > 1:
+                class_name = f"{class_name}[{siblings.index(element) + 1}]"
+            return get_xpath_reference(parent) + '/' + class_name
+
+        root = etree.fromstring(layout_str.encode('utf-8'))
+        for element in root.iter("node"):
+            if all(x.tag == "node" for x in element.iterancestors() if x is not root):
+                self.assertEqual(get_xpath_reference(element), get_xpath_from_xml_element(element))
+            else:
+                self.assertIsNone(get_xpath_from_xml_element(element))
+        self.assertIs(XPathIndex.of(root), XPathIndex.of(root[0]))
+
+        nodes = NodesFactory().with_layout(layout_str).with_xpath_pass().build()
+        for node in nodes:
+            element = get_element_from_xpath(layout_str, node.xpath)
+            self.assertEqual(node.xml_element.attrib, element.attrib)
+        self.assertIsNone(get_element_from_xpath(layout_str, "/android.widget.FrameLayout/android.widget.Button"))
+        self.assertIsNone(get_element_from_xpath("PROBLEM_WITH_XML", "/android.widget.FrameLayout"))
+
+    def test_element_from_xpath_with_mixed_siblings(self):
+        mixed_layout = '''<hierarchy rotation="0">
+          <node index="0" class="android.widget.FrameLayout" bounds="[0,0][1080,2220]">
+            <node index="0" class="android.widget.TextView" text="A" bounds="[0,0][1080,100]" />
+            <node index="1" text="No class" bounds="[0,100][1080,200]">
+              <node index="0" class="android.widget.TextView" text="B" bounds="[0,100][1080,200]" />
+            </node>
+            <node index="2" class="android.widget.Button" text="C" bounds="[0,200][1080,300]" />
+            <node index="3" class="android.widget.TextView" text="D" bounds="[0,300][1080,400]" />
+          </node>
+        </hierarchy>'''
+        nodes = NodesFactory().with_layout(mixed_layout).with_xpath_pass().build()
+        xpath_counts = Counter(node.xpath for node in nodes)
+        for node in nodes:
+            element = get_element_from_xpath(mixed_layout, node.xpath)
+            if xpath_counts[node.xpath] == 1:
+                self.assertEqual(node.xml_element.attrib, element.attrib)
+            else:
+                self.assertIsNone(element)
+
+    def test_parsed_layout_cache(self):
+        cache = ParsedLayoutCache(max_size=100)
+        nodes = NodesFactory().with_layout(layout_str).with_xpath_pass().with_cache(cache).build()
+        cached_nodes = NodesFactory().with_layout(layout_str).with_xpath_pass().with_cache(cache).build()
+        self.assertListEqual([node.toJSONStr() for node in nodes], [node.toJSONStr() for node in cached_nodes])
+        # The callers get copies, so changing a node does not change the cached nodes
+        for node in cached_nodes:
+            self.assertNotIn(id(node), [id(x) for x in nodes])
+            if node.parent_node in cached_nodes:
+                self.assertIn(node, node.parent_node.children_nodes)
+        cached_nodes[1].action = 'focus'
+        cached_nodes[1].xml_element.set('text', 'Changed')
+        self.assertEqual('click', nodes[1].action)
+        uncached_nodes = NodesFactory().with_layout(layout_str).with_xpath_pass().with_cache(cache).build()
+        self.assertEqual(('click', nodes[1].xml_element.get('text')),
+                         (uncached_nodes[1].action, uncached_nodes[1].xml_element.get('text')))
+        other_nodes = NodesFactory().with_layout(layout_str).with_xpath_pass().with_ad_detection() \
+            .with_cache(cache).build()
+        self.assertIsNot(nodes[0], other_nodes[0])
+        self.assertEqual((2, 2), (cache.hits, cache.misses))
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            layout_path = os.path.join(tmp_dir, "layout.xml")
+            with open(layout_path, "w") as f:
+                f.write(layout_str)
+            path_nodes = NodesFactory().with_layout_path(layout_path).with_xpath_pass().with_cache(cache).build()
+            self.assertEqual(nodes[0].toJSONStr(), path_nodes[0].toJSONStr())
+            self.assertEqual(3, cache.hits)
+            with open(layout_path, "w") as f:
+                f.write(layout_str.replace("Title", "Another title"))
+            os.utime(layout_path, ns=(0, 0))
+            changed_nodes = NodesFactory().with_layout_path(layout_path).with_xpath_pass().with_cache(cache).build()
+            self.assertEqual("Another title", changed_nodes[1].text)
+            cache.entries.clear()
+            rebuilt_nodes = NodesFactory().with_layout_path(layout_path).with_xpath_pass().with_cache(cache).build()
+            self.assertEqual(len(changed_nodes), len(rebuilt_nodes))
+
+    def test_shared_parsed_layout_cache(self):
+        cache = ParsedLayoutCache(max_size=100)
+        nodes = NodesFactory().with_layout(layout_str).with_xpath_pass().with_cache(cache, shared=True).build()
+        shared_nodes = NodesFactory().with_layout(layout_str).with_xpath_pass().with_cache(cache, shared=True).build()
+        # The read-only callers share the cached nodes, the other callers get copies of them
+        self.assertListEqual([id(node) for node in nodes], [id(node) for node in shared_nodes])
+        self.assertIsNot(nodes, shared_nodes)
+        copied_nodes = NodesFactory().with_layout(layout_str).with_xpath_pass().with_cache(cache).build()
+        self.assertNotIn(id(copied_nodes[0]), [id(node) for node in nodes])
+        self.assertEqual((2, 1), (cache.hits, cache.misses))
+
+    def test_longest_subsequence_substring(self):
+        def reference(string_1, string_2):
+            # The full dynamic programming table of the previous implementation in Snapshot.get_text_description
+            n, m = len(string_1), len(string_2)
+            dp = [[0] * (n + 1) for _ in range(m + 1)]
+            for i in range(1, m + 1):
+                for j in range(1, n + 1):
+                    dp[i][j] = 1 + dp[i - 1][j - 1] if string_1[j - 1] == string_2[i - 1] else dp[i][j - 1]
+            return max([0] + [dp[i][n] for i in range(1, m + 1)])
+
+        rnd = random.Random(0)
+        for _ in range(200):
+            string_1 = "".join(rnd.choice("AB/[1]") for _ in range(rnd.randint(0, 30)))
+            string_2 = "".join(rnd.choice("AB/[1]") for _ in range(rnd.randint(0, 30)))
+            self.assertEqual(reference(string_1, string_2), longest_subsequence_substring(string_1, string_2))
+        self.assertEqual("/A/B/C", simplify_xpath("/A/B[2]/C[10]"))
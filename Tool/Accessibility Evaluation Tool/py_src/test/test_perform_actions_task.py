@@ -0,0 +1,107 @@
+import asyncio
+import tempfile
+import unittest
+from collections import namedtuple
+from pathlib import Path
+from unittest import mock
+
+from GUI_utils import NodesFactory
+from command import LocatableCommandResponse
+from results_utils import AddressBook
+from snapshot import EmulatorSnapshot
+from task.perform_actions_task import DeviceWorker, PerformActionsTask
+
+FakeDevice = namedtuple('FakeDevice', ['serial'])
+
+layout_template = '''<hierarchy rotation="0">
+  <node index="0" class="android.widget.FrameLayout" package="com.example" visible="true" bounds="[0,0][1080,2220]">
+    <node index="0" text="{title}" class="android.widget.TextView" package="com.example" visible="true"
+          bounds="[0,0][1080,200]" />
+  </node>
+</hierarchy>
+'''
+
+
+class FakeController:
+    def __init__(self, node):
+        self.node = node
+
+    async def setup(self):
+        pass
+
+    def execute(self, command):
+        return LocatableCommandResponse(target_node=self.node, acted_node=self.node, command_type='click',
+                                        state='COMPLETED', duration=1)
+
+
+class FakeADBLogger:
+    async def execute_async_with_log(self, response, tags=None):
+        return {}, response
+
+
+class TestPerformAction(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.address_book = AddressBook(Path(self.tmp_dir.name).joinpath("S_1"))
+        self.snapshot = EmulatorSnapshot(self.address_book, device=FakeDevice("emulator-5554"))
+        self.address_book.initiate_perform_actions_task()
+        self.write_state(AddressBook.BASE_MODE, AddressBook.INITIAL, "Title")
+        self.node = NodesFactory().with_layout(layout_template.format(title="Title")).with_xpath_pass().build()[1]
+        self.task = PerformActionsTask(self.snapshot)
+        self.task.initial_fingerprint = self.address_book.get_state_fingerprint(AddressBook.BASE_MODE,
+                                                                                AddressBook.INITIAL)
+        self.worker = DeviceWorker(self.snapshot)
+        self.worker.controllers = {mode: FakeController(self.node) for mode in self.worker.controllers}
+        self.worker.padb_logger = FakeADBLogger()
+        self.reload_count = 0
+
+        async def reload():
+            self.reload_count += 1
+
+        self.snapshot.reload = reload
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_state(self, mode: str, index, title: str):
+        with open(self.address_book.get_layout_path(mode, index), "w") as f:
+            f.write(layout_template.format(title=title))
+        with open(self.address_book.get_activity_name_path(mode, index), "w") as f:
+            f.write("com.example.MainActivity")
+
+    def perform(self, index: int, mode: str, title: str = "Title"):
+        async def capture_current_state(address_book, device, mode, index, **kwargs):
+            self.write_state(mode, index, title)
+
+        with mock.patch('task.perform_actions_task.capture_current_state', capture_current_state):
+            return asyncio.run(self.task.perform_action(self.worker, index, self.node, mode))
+
+    def test_skip_reload(self):
+        results = self.perform(0, 'touch')
+        self.assertEqual('COMPLETED', results['touch'].state)
+        self.assertEqual(1, self.reload_count)
+        self.assertEqual('touch', self.worker.initial_state_mode)
+        self.perform(1, 'touch')
+        self.assertEqual(1, self.reload_count)
+        self.assertEqual(1, self.task.skipped_reload_count)
+
+    def test_mode_result(self):
+        results = self.perform(0, 'touch')
+        results['tb_touch_failed'] = {'state': 'FAILED_LOCATE'}
+        loaded_results = PerformActionsTask.load_mode_result(PerformActionsTask.dump_mode_result(results))
+        self.assertEqual({'state': 'FAILED_LOCATE'}, loaded_results['tb_touch_failed'])
+        self.assertEqual(results['touch'].toJSON(), loaded_results['touch'].toJSON())
+
+    def test_reload(self):
+        self.perform(0, 'touch')
+        # The previous action was performed by another controller
+        self.perform(1, 'a11y_api', title="Changed")
+        self.assertEqual(2, self.reload_count)
+        self.assertIsNone(self.worker.initial_state_mode)
+        # The previous action changed the state
+        self.perform(2, 'a11y_api')
+        self.assertEqual(3, self.reload_count)
+        self.task.strict_reload = True
+        self.perform(3, 'a11y_api')
+        self.assertEqual(4, self.reload_count)
+        self.assertEqual(0, self.task.skipped_reload_count)
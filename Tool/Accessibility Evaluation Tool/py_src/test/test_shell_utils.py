@@ -0,0 +1,124 @@
+import asyncio
+import os
+import shlex
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+
+import adb_utils
+from adb_utils import MISSING_FILE_MARKER, create_read_local_android_file_script, get_activity_name_from_windows
+from consts import LATTE_FILE_MAX_WAIT_TIME, LATTE_FILE_POLL_INTERVAL
+import shell_utils
+from shell_utils import ADBShellClient
+
+
+class LocalShellConnection:
+    """
+    Executes the shell command sent through it on the host instead of a device
+    """
+
+    def __init__(self):
+        self.output = b""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def send(self, msg: str):
+        cmd = msg[len("shell:"):]
+        self.output = subprocess.run(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT).stdout
+
+    async def read_all(self) -> bytes:
+        return self.output
+
+
+class LocalShellClient(ADBShellClient):
+    async def connect(self, serial: str):
+        return LocalShellConnection()
+
+
+class TestShellUtils(unittest.TestCase):
+    def test_shell_client(self):
+        client = LocalShellClient()
+        self.assertEqual((0, "a\nb\n", ""), asyncio.run(client.shell("printf 'a\\nb\\n'", "emulator-5554")))
+        self.assertEqual((0, "1\n", ""), asyncio.run(client.shell("printf 'x\\ny\\n' | grep -c x", "emulator-5554")))
+        self.assertEqual((3, "no newline", ""),
+                         asyncio.run(client.shell("printf 'no newline'; (exit 3)", "emulator-5554")))
+        self.assertEqual((0, "a\ufffdb", ""), asyncio.run(client.shell("printf 'a\\377b'", "emulator-5554")))
+
+    def test_run_adb_shell(self):
+        client = LocalShellClient()
+        adb_commands = []
+
+        async def run_bash(cmd):
+            adb_commands.append(cmd)
+            return 0, "adb", ""
+
+        async def fail(*args):
+            raise OSError("reset")
+
+        with mock.patch.object(shell_utils, '_shell_client', client), \
+                mock.patch.object(shell_utils, 'run_bash', run_bash):
+            self.assertEqual((0, "ok\n", ""), asyncio.run(shell_utils.run_adb_shell("echo ok")))
+            # A command that was sent is not executed again by adb
+            with mock.patch.object(client, 'execute', fail):
+                self.assertEqual((-1, "", "reset"), asyncio.run(shell_utils.run_adb_shell("echo ok")))
+            self.assertEqual([], adb_commands)
+            # The command is executed by adb if the ADB server cannot be reached
+            with mock.patch.object(client, 'connect', fail):
+                self.assertEqual((0, "adb", ""), asyncio.run(shell_utils.run_adb_shell("echo ok")))
+            self.assertEqual(1, len(adb_commands))
+
+    def test_read_local_android_file_script(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.mkdir(os.path.join(tmp_dir, "files"))
+            with open(os.path.join(tmp_dir, "files", "result.txt"), "w") as f:
+                f.write("RESULT")
+            client = LocalShellClient()
+
+            def read(wait_time, remove_after_read):
+                script = create_read_local_android_file_script("result.txt", wait_time, remove_after_read)
+                return asyncio.run(client.shell(f"cd {tmp_dir} && sh -c {shlex.quote(script)}", "emulator-5554"))
+
+            self.assertEqual((0, "RESULT", ""), read(0.2, remove_after_read=False))
+            self.assertEqual((0, "RESULT", ""), read(0, remove_after_read=False))
+            # The device does not wait forever without a limit
+            max_polls = round(LATTE_FILE_MAX_WAIT_TIME / LATTE_FILE_POLL_INTERVAL)
+            self.assertIn(f"-ge {max_polls}", create_read_local_android_file_script("result.txt", 0))
+            self.assertEqual((0, "RESULT", ""), read(-1, remove_after_read=True))
+            self.assertFalse(os.path.exists(os.path.join(tmp_dir, "files", "result.txt")))
+            r_code, content, _ = read(0.2, remove_after_read=True)
+            self.assertEqual((1, MISSING_FILE_MARKER), (r_code, content.strip()))
+
+    def test_read_local_android_file(self):
+        commands = []
+
+        def run_adb_shell(result, delay=0):
+            async def run(cmd, device_name):
+                commands.append(cmd)
+                await asyncio.sleep(delay)
+                return result
+            return run
+
+        with mock.patch.object(adb_utils, 'run_adb_shell', run_adb_shell((0, "RESULT", ""))):
+            self.assertEqual("RESULT", asyncio.run(adb_utils.read_local_android_file("result.txt")))
+        with mock.patch.object(adb_utils, 'run_adb_shell', run_adb_shell((1, MISSING_FILE_MARKER, ""))):
+            self.assertIsNone(asyncio.run(adb_utils.read_local_android_file("result.txt", wait_time=1)))
+        # The file may have been removed by the failed command, so it is not read again
+        with mock.patch.object(adb_utils, 'run_adb_shell', run_adb_shell((-1, "", "reset"))):
+            self.assertIsNone(asyncio.run(adb_utils.read_local_android_file("result.txt")))
+        self.assertEqual(3, len(commands))
+        with mock.patch.object(adb_utils, 'run_adb_shell', run_adb_shell((0, "RESULT", ""), delay=1)), \
+                mock.patch.object(adb_utils, 'LATTE_FILE_READ_TIMEOUT_MARGIN', 0):
+            self.assertIsNone(asyncio.run(adb_utils.read_local_android_file("result.txt", wait_time=0.1)))
+
+    def test_activity_name_from_windows(self):
+        windows = "WINDOW MANAGER WINDOWS\n  mCurrentFocus=Window{1 u0 com.example/.Main}\n" \
+                  "  mObscuringWindow=Window{2 u0 com.example/com.example.MainActivity}\n  mFocusedApp=null"
+        client = LocalShellClient()
+        _, expected, _ = asyncio.run(client.shell(f"printf {shlex.quote(windows)} | grep 'mObscuringWindow'", ""))
+        self.assertEqual(expected, get_activity_name_from_windows(windows))
+        self.assertEqual("", get_activity_name_from_windows("mCurrentFocus=null"))
@@ -0,0 +1,31 @@
+import asyncio
+import unittest
+
+from ui_idle_utils import wait_for_ui_idle, get_wait_report, reset_wait_report
+
+
+def sequence_signal(values: list):
+    values = list(values)
+
+    async def signal():
+        return values.pop(0) if len(values) > 1 else values[0]
+
+    return signal
+
+
+class TestUIIdle(unittest.TestCase):
+    def setUp(self):
+        reset_wait_report()
+
+    def test_stable_signal(self):
+        wait_time = asyncio.run(wait_for_ui_idle(5, signals=[sequence_signal([1, 2, 3, 3])], name="stable"))
+        self.assertLess(wait_time, 5)
+        self.assertEqual(1, get_wait_report()['stable']['count'])
+
+    def test_timeout(self):
+        changing_signal = sequence_signal(list(range(100)))
+        wait_time = asyncio.run(wait_for_ui_idle(0.5, signals=[changing_signal], name="changing"))
+        self.assertGreaterEqual(wait_time, 0.5)
+        wait_time = asyncio.run(wait_for_ui_idle(0.1, name="fixed"))
+        self.assertGreaterEqual(wait_time, 0.1)
+        self.assertSetEqual({"changing", "fixed"}, set(get_wait_report().keys()))
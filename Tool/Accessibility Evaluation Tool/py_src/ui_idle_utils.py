@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from io import BytesIO
+from typing import Awaitable, Callable, Dict, List
+
+from adb_utils import get_current_activity_name
+from consts import ADAPTIVE_WAIT, UI_IDLE_POLL_INTERVAL, UI_IDLE_STABLE_POLLS, UI_IDLE_HASH_DISTANCE
+
+logger = logging.getLogger(__name__)
+
+# A signal is polled while waiting, the UI is idle when the values of all signals do not change
+Signal = Callable[[], Awaitable[object]]
+
+_wait_times: Dict[str, List[float]] = defaultdict(list)
+
+
+class _PerceptualHash:
+    """
+    The perceptual hash of a screenshot, two hashes are equal if the screenshots are almost the same
+    """
+
+    def __init__(self, image_hash):
+        self.image_hash = image_hash
+
+    def __eq__(self, other):
+        return isinstance(other, _PerceptualHash) and self.image_hash - other.image_hash <= UI_IDLE_HASH_DISTANCE
+
+
+def screenshot_hash_signal(device) -> Signal:
+    async def signal() -> _PerceptualHash:
+        # Only needed for this signal
+        import imagehash
+        from PIL import Image
+        return _PerceptualHash(imagehash.average_hash(Image.open(BytesIO(await device.screencap()))))
+
+    return signal
+
+
+def activity_signal(device) -> Signal:
+    """
+    The name of the focused activity, it detects the transitions between activities but not the changes of
+    their content
+    """
+
+    async def signal() -> str:
+        return await get_current_activity_name(device_name=device.serial)
+
+    return signal
+
+
+def log_signal(get_log: Callable[[], str]) -> Signal:
+    """
+    The length of a log which is being collected, e.g., the accessibility events and window changes collected by
+    ParallelADBLogger. It does not change when the stream is quiet.
+    """
+
+    async def signal() -> int:
+        return len(get_log())
+
+    return signal
+
+
+async def wait_for_ui_idle(timeout: float, signals: List[Signal] = None, name: str = "wait") -> float:
+    """
+    Waits until the values of the signals do not change in UI_IDLE_STABLE_POLLS consecutive polls, or the timeout.
+    Without signals, or if ADAPTIVE_WAIT is disabled, it waits for the whole timeout.
+
+    :param timeout: The maximum waiting time in seconds, i.e., the previous fixed delay
+    :param signals: The signals that are polled
+    :param name: The name of the wait in the report (see `get_wait_report`)
+    :return: The waiting time in seconds
+    """
+    start = time.monotonic()
+    if not ADAPTIVE_WAIT or not signals:
+        await asyncio.sleep(timeout)
+    else:
+        previous_values = None
+        stable_polls = 0
+        while True:
+            try:
+                values = list(await asyncio.gather(*[signal() for signal in signals]))
+            except Exception as e:
+                logger.warning(f"The UI signals could not be polled for '{name}', waiting for the timeout: {e}")
+                await asyncio.sleep(max(0.0, timeout - (time.monotonic() - start)))
+                break
+            stable_polls = stable_polls + 1 if values == previous_values else 0
+            if stable_polls >= UI_IDLE_STABLE_POLLS:
+                break
+            previous_values = values
+            remaining_time = timeout - (time.monotonic() - start)
+            if remaining_time <= 0:
+                break
+            await asyncio.sleep(min(UI_IDLE_POLL_INTERVAL, remaining_time))
+    wait_time = time.monotonic() - start
+    _wait_times[name].append(wait_time)
+    logger.debug(f"Waited {wait_time:.2f}s for '{name}' (timeout: {timeout}s)")
+    return wait_time
+
+
+def get_wait_report() -> Dict[str, dict]:
+    """
+    The statistics of the waiting times of each wait name in seconds
+    """
+    return {name: {'count': len(times),
+                   'total': round(sum(times), 3),
+                   'mean': round(sum(times) / len(times), 3),
+                   'max': round(max(times), 3)}
+            for name, times in _wait_times.items() if len(times) > 0}
+
+
+def reset_wait_report() -> None:
+    _wait_times.clear()
@@ -13,7 +13,7 @@ from ansi2html import Ansi2HTMLConverter
 from flask import Flask, request, jsonify, send_from_directory, render_template, make_response
 from json2html import json2html
 
-from app import App
+from app import App, SnapshotMetadata
 from command import create_command_from_dict, LocatableCommand
 from consts import BLIND_MONKEY_EVENTS_TAG
 from data_utils import RecordDataManager, A11yReportManager
@@ -40,12 +40,15 @@ def fix_path(path: str) -> str:
     return f"../{path}"
 
 
-def create_snapshot_info(snapshot_path: pathlib.Path) -> Union[dict, None]:
-    if not snapshot_path.is_dir():
+def create_snapshot_info(snapshot_path: pathlib.Path, metadata: SnapshotMetadata = None) -> Union[dict, None]:
+    """
+    :param metadata: The metadata of the snapshot from its app's manifest, if it's given, the snapshot's files
+                     are not accessed
+    """
+    if metadata is None and not snapshot_path.is_dir():
         return None
     result_path = snapshot_path.parent.parent
     snapshot_name = snapshot_path.name
-    address_book = AddressBook(snapshot_path)
     snapshot_info = {}
     count_map = {
         'actions': 0,
@@ -70,15 +73,20 @@ def create_snapshot_info(snapshot_path: pathlib.Path) -> Union[dict, None]:
 
     snapshot_info['id'] = snapshot_name
     snapshot_info['log_path'] = str(snapshot_path.relative_to(result_path.parent)) + ".log"
+    if metadata is None:
+        address_book = AddressBook(snapshot_path)
+        metadata = SnapshotMetadata(name=snapshot_name,
+                                    mtime_ns=address_book.snapshot_result_path.stat().st_mtime_ns,
+                                    finished=address_book.finished_path.exists())
     if analysis_count == 0:
-        snapshot_info['state'] = "Pending" if not address_book.finished_path.exists() else "Unprocessed"
+        snapshot_info['state'] = "Pending" if not metadata.finished else "Unprocessed"
         for key in count_map:
             snapshot_info[key] = f"({snapshot_info['state']})"
     else:
         snapshot_info['state'] = "Processed"
         for key in count_map:
             snapshot_info[key] = math.floor(count_map[key] / analysis_count)
-    snapshot_info['last_update'] = datetime.datetime.fromtimestamp(address_book.snapshot_result_path.stat().st_mtime)
+    snapshot_info['last_update'] = metadata.last_update
     return snapshot_info
 
 
@@ -88,8 +96,8 @@ def create_app_info(app_path: pathlib.Path) -> Union[dict, None]:
     app_name = app_path.name
     snapshots_info = []
     app = App(app_name=app_name, result_path=app_path.parent, recreate=False)
-    for snapshot in app.snapshots:
-        snapshot_info = create_snapshot_info(snapshot.address_book.snapshot_result_path)
+    for snapshot_name, metadata in app.snapshot_metadata.items():
+        snapshot_info = create_snapshot_info(app.snapshot_paths[snapshot_name], metadata)
         if snapshot_info is not None:
             snapshots_info.append(snapshot_info)
     snapshots_info.sort(key=lambda s: s['last_update'], reverse=True)
@@ -465,6 +473,10 @@ def xml_diff_v2(result_path, app_name, snapshot_name, index, sighted_str, left_m
     flask_app.logger.info(f"Xml Diff for Snapshot_path: {snapshot_path}, index: {index}, is_sighted: {is_sighted}")
     address_book = AddressBook(snapshot_path)
     prefix = "s_" if is_sighted else ""
+    if request.args.get('format', None) == 'json':
+        layout_diff = address_book.whelper.get_layout_diff(f'{prefix}{left_mode}', index,
+                                                           f'{prefix}{right_mode}', index)
+        return jsonify(layout_diff.toJSON())
     left_xml_path = address_book.get_layout_path(f'{prefix}{left_mode}', index)
     right_xml_path = address_book.get_layout_path(f'{prefix}{right_mode}', index)
     cmd = f"diff --unified {left_xml_path} {right_xml_path}"